@@ -3,6 +3,27 @@ import axios from 'axios';
 import { useTranslation } from 'react-i18next';
 import { useToast } from '../context/ToastContext';
 
+// Async moderation (AI_MODERATION_ASYNC): the API answers 202 and the AI verdict
+// arrives later on /api/moderation-jobs/{id}/. Poll until it is decided.
+const MODERATION_POLL_MS = 2000;
+const MODERATION_MAX_POLLS = 60;
+
+const waitForModeration = async (jobId) => {
+    for (let i = 0; i < MODERATION_MAX_POLLS; i++) {
+        await new Promise(resolve => setTimeout(resolve, MODERATION_POLL_MS));
+        let data;
+        try {
+            ({ data } = await axios.get(`/api/moderation-jobs/${jobId}/`));
+        } catch (err) {
+            // The complaint is submitted either way; stop polling rather than report an error
+            if (err.response?.status === 429) return null;
+            throw err;
+        }
+        if (data.state !== 'QUEUED' && data.state !== 'RUNNING') return data;
+    }
+    return null; // Still queued; it will show up on the dashboard once reviewed
+};
+
 const ComplaintForm = ({ onSuccess }) => {
     const { t } = useTranslation();
     const { showToast } = useToast();
@@ -139,10 +160,23 @@ const ComplaintForm = ({ onSuccess }) => {
         }
 
         try {
-            await axios.post('/api/complaints/', data, {
+            const response = await axios.post('/api/complaints/', data, {
                 headers: { 'Content-Type': 'multipart/form-data' }
             });
-            showToast("Complaint Verified & Submitted Successfully!", 'success');
+
+            if (response.status === 202) {
+                const job = await waitForModeration(response.data.moderation_job);
+                if (job?.state === 'REJECTED') {
+                    throw { response: { data: { error: `Complaint rejected by AI: ${job.reason}` } } };
+                }
+                if (job?.state === 'ACCEPTED') {
+                    showToast("Complaint Verified & Submitted Successfully!", 'success');
+                } else {
+                    showToast("Complaint Submitted! It will appear once our AI has reviewed it.", 'success');
+                }
+            } else {
+                showToast("Complaint Verified & Submitted Successfully!", 'success');
+            }
             if (onSuccess) onSuccess(); // Callback to refresh the list
 
             // Reset form
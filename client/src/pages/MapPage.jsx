@@ -1,5 +1,5 @@
-import React, { useState, useEffect } from 'react';
-import { MapContainer, TileLayer, Marker, Popup } from 'react-leaflet';
+import React, { useState, useEffect, useCallback } from 'react';
+import { MapContainer, TileLayer, Marker, Popup, useMap, useMapEvents } from 'react-leaflet';
 import axios from 'axios';
 import 'leaflet/dist/leaflet.css';
 import L from 'leaflet';
@@ -19,52 +19,164 @@ let DefaultIcon = L.icon({
 
 L.Marker.prototype.options.icon = DefaultIcon;
 
+// Helper to create colored pin icon
+const createCustomIcon = (color) => {
+    const svg = `
+        <svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 24 24" fill="${color}" width="36" height="36" stroke="white" stroke-width="1.5">
+            <path d="M12 2C8.13 2 5 5.13 5 9c0 5.25 7 13 7 13s7-7.75 7-13c0-3.87-3.13-7-7-7zm0 9.5c-1.38 0-2.5-1.12-2.5-2.5s1.12-2.5 2.5-2.5 2.5 1.12 2.5 2.5-1.12 2.5-2.5 2.5z"/>
+        </svg>
+    `;
+    return L.divIcon({
+        className: 'custom-pin-icon',
+        html: svg,
+        iconSize: [36, 36],
+        iconAnchor: [18, 36], // Bottom center
+        popupAnchor: [0, -36]
+    });
+};
+
+// Bubble showing how many complaints a server-side cluster holds
+const createClusterIcon = (count) => {
+    const size = count < 10 ? 32 : count < 100 ? 40 : 48;
+    return L.divIcon({
+        className: 'complaint-cluster-icon',
+        html: `<div style="width:${size}px;height:${size}px;line-height:${size}px" class="rounded-full bg-blue-600/80 text-white text-sm font-bold text-center border-2 border-white shadow-md">${count}</div>`,
+        iconSize: [size, size],
+        iconAnchor: [size / 2, size / 2]
+    });
+};
+
+// Slippy-map tile maths (same scheme as the OSM base layer and /api/complaints/tiles/)
+const MAX_TILE_ZOOM = 20;
+const lngToTileX = (lng, z) => Math.floor((lng + 180) / 360 * 2 ** z);
+const latToTileY = (lat, z) => {
+    const rad = lat * Math.PI / 180;
+    return Math.floor((1 - Math.log(Math.tan(rad) + 1 / Math.cos(rad)) / Math.PI) / 2 * 2 ** z);
+};
+
+// Tiles already fetched during this visit, keyed by "z/x/y"
+const tileCache = new Map();
+
+// Loads only the complaint tiles covering the visible map. The server sends
+// cluster counts at low zoom and individual complaints at high zoom, so the
+// payload stays small however many complaints the city has.
+const ComplaintTiles = ({ refreshKey }) => {
+    const map = useMap();
+    const [tiles, setTiles] = useState([]);
+
+    const loadTiles = useCallback(async () => {
+        const z = Math.min(Math.round(map.getZoom()), MAX_TILE_ZOOM);
+        const bounds = map.getBounds();
+        const maxIndex = 2 ** z - 1;
+        const clamp = (v) => Math.max(0, Math.min(maxIndex, v));
+
+        const requests = [];
+        for (let x = clamp(lngToTileX(bounds.getWest(), z)); x <= clamp(lngToTileX(bounds.getEast(), z)); x++) {
+            for (let y = clamp(latToTileY(bounds.getNorth(), z)); y <= clamp(latToTileY(bounds.getSouth(), z)); y++) {
+                const key = `${z}/${x}/${y}`;
+                if (tileCache.has(key)) {
+                    requests.push(Promise.resolve(tileCache.get(key)));
+                } else {
+                    requests.push(axios.get(`/api/complaints/tiles/${key}/`).then(res => {
+                        tileCache.set(key, res.data);
+                        return res.data;
+                    }));
+                }
+            }
+        }
+
+        const results = await Promise.allSettled(requests);
+        results.filter(r => r.status === 'rejected').forEach(r => console.error("Failed to fetch map tile", r.reason));
+        setTiles(results.filter(r => r.status === 'fulfilled').map(r => r.value));
+    }, [map]);
+
+    useMapEvents({ moveend: loadTiles });
+
+    useEffect(() => {
+        // A complaint was added/changed: drop cached tiles and reload
+        tileCache.clear();
+        loadTiles();
+    }, [refreshKey, loadTiles]);
+
+    return (
+        <>
+            {tiles.flatMap(tile => tile.clusters.map(cluster => (
+                <Marker
+                    key={`${tile.z}-${cluster.geohash}`}
+                    position={[cluster.lat, cluster.lng]}
+                    icon={createClusterIcon(cluster.count)}
+                    eventHandlers={{
+                        click: () => map.setView([cluster.lat, cluster.lng], Math.min(map.getZoom() + 2, map.getMaxZoom()))
+                    }}
+                >
+                    <Popup>
+                        <div className="p-1 text-xs">
+                            <h3 className="font-bold text-sm mb-1">{cluster.count} complaints</h3>
+                            {Object.entries(cluster.categories).map(([category, count]) => (
+                                <p key={category} className="text-gray-600">{category}: {count}</p>
+                            ))}
+                        </div>
+                    </Popup>
+                </Marker>
+            )))}
+
+            {tiles.flatMap(tile => tile.points).map((feature) => {
+                const [lng, lat] = feature.geometry.coordinates;
+                const { title, category, status, urgency_score, ward_name } = feature.properties;
+
+                // Determine Color based on Urgency
+                let color = '#10B981'; // Green (Tailwind emerald-500)
+                if (urgency_score >= 8) color = '#EF4444'; // Red (Tailwind red-500)
+                else if (urgency_score >= 4) color = '#F59E0B'; // Orange (Tailwind amber-500)
+
+                return (
+                    <Marker
+                        key={feature.properties.id}
+                        position={[lat, lng]}
+                    >
+                        <Popup>
+                            <div className="p-1">
+                                {feature.properties.image && (
+                                    <img
+                                        src={getMediaUrl(feature.properties.image)}
+                                        alt={title}
+                                        className="w-full h-32 object-cover rounded-md mt-2 mb-2"
+                                    />
+                                )}
+                                <h3 className="font-bold text-sm">{title}</h3>
+                                <p className="text-xs text-gray-600">{category} • {ward_name}</p>
+                                <div className="mt-1 flex items-center gap-2">
+                                    <span className={`text-xs px-2 py-0.5 rounded-full font-medium ${status === 'RESOLVED' ? 'bg-green-100 text-green-800' : 'bg-yellow-100 text-yellow-800'
+                                        }`}>
+                                        {status}
+                                    </span>
+                                    {urgency_score > 0 && (
+                                        <span className={`text-xs font-bold ${urgency_score >= 8 ? 'text-red-600' : 'text-orange-600'}`}>
+                                            Urgency: {urgency_score}/10
+                                        </span>
+                                    )}
+                                </div>
+                            </div>
+                        </Popup>
+                    </Marker>
+                );
+            })}
+        </>
+    );
+};
+
 const MapPage = () => {
-    const [geoData, setGeoData] = useState(null);
-    const [loading, setLoading] = useState(true);
     const { complaintUpdateTrigger } = useComplaint();
 
     // Center on Mumbai (Dadar)
     const position = [19.0178, 72.8478];
 
-    useEffect(() => {
-        const fetchGeoJSON = async () => {
-            try {
-                const res = await axios.get('/api/complaints/geojson/');
-                setGeoData(res.data);
-            } catch (err) {
-                console.error("Failed to fetch map data", err);
-            } finally {
-                setLoading(false);
-            }
-        };
-        fetchGeoJSON();
-    }, [complaintUpdateTrigger]);
-
-    if (loading) return <div className="text-center py-20">Loading Map...</div>;
-
     // Mumbai Bounds (Expanded for Mira Road/Thane)
     const mumbaiBounds = [
         [18.89, 72.70], // Southwest coordinates
         [19.50, 73.10]  // Northeast coordinates
     ];
 
-    // Helper to create colored pin icon
-    const createCustomIcon = (color) => {
-        const svg = `
-            <svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 24 24" fill="${color}" width="36" height="36" stroke="white" stroke-width="1.5">
-                <path d="M12 2C8.13 2 5 5.13 5 9c0 5.25 7 13 7 13s7-7.75 7-13c0-3.87-3.13-7-7-7zm0 9.5c-1.38 0-2.5-1.12-2.5-2.5s1.12-2.5 2.5-2.5 2.5 1.12 2.5 2.5-1.12 2.5-2.5 2.5z"/>
-            </svg>
-        `;
-        return L.divIcon({
-            className: 'custom-pin-icon',
-            html: svg,
-            iconSize: [36, 36],
-            iconAnchor: [18, 36], // Bottom center
-            popupAnchor: [0, -36]
-        });
-    };
-
     return (
         <div className="h-[calc(100vh-64px)] w-full">
             <MapContainer
@@ -80,47 +192,7 @@ const MapPage = () => {
                     url="https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png"
                 />
 
-                {geoData && geoData.features.map((feature) => {
-                    const [lng, lat] = feature.geometry.coordinates;
-                    const { title, category, status, urgency_score, ward_name } = feature.properties;
-
-                    // Determine Color based on Urgency
-                    let color = '#10B981'; // Green (Tailwind emerald-500)
-                    if (urgency_score >= 8) color = '#EF4444'; // Red (Tailwind red-500)
-                    else if (urgency_score >= 4) color = '#F59E0B'; // Orange (Tailwind amber-500)
-
-                    return (
-                        <Marker
-                            key={feature.properties.id}
-                            position={[lat, lng]}
-                        >
-                            <Popup>
-                                <div className="p-1">
-                                    {feature.properties.image && (
-                                        <img
-                                            src={getMediaUrl(feature.properties.image)}
-                                            alt={title}
-                                            className="w-full h-32 object-cover rounded-md mt-2 mb-2"
-                                        />
-                                    )}
-                                    <h3 className="font-bold text-sm">{title}</h3>
-                                    <p className="text-xs text-gray-600">{category} • {ward_name}</p>
-                                    <div className="mt-1 flex items-center gap-2">
-                                        <span className={`text-xs px-2 py-0.5 rounded-full font-medium ${status === 'RESOLVED' ? 'bg-green-100 text-green-800' : 'bg-yellow-100 text-yellow-800'
-                                            }`}>
-                                            {status}
-                                        </span>
-                                        {urgency_score > 0 && (
-                                            <span className={`text-xs font-bold ${urgency_score >= 8 ? 'text-red-600' : 'text-orange-600'}`}>
-                                                Urgency: {urgency_score}/10
-                                            </span>
-                                        )}
-                                    </div>
-                                </div>
-                            </Popup>
-                        </Marker>
-                    );
-                })}
+                <ComplaintTiles refreshKey={complaintUpdateTrigger} />
             </MapContainer>
         </div>
     );
@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import Complaint, Ward, Verification, UserProfile
+from django.utils import timezone
+from .geo import invalidate_map
+from .models import Complaint, Ward, Verification, UserProfile, ModerationJob, OutboundEmail, SideEffect, AIMetricCounter
 
 @admin.register(Complaint)
 class ComplaintAdmin(admin.ModelAdmin):
@@ -10,7 +12,9 @@ class ComplaintAdmin(admin.ModelAdmin):
     actions = ['mark_as_resolved']
 
     def mark_as_resolved(self, request, queryset):
-        updated = queryset.update(status='RESOLVED')
+        # update() skips auto_now and sends no post_save
+        updated = queryset.update(status='RESOLVED', updated_at=timezone.now())
+        invalidate_map()
         self.message_user(request, f"{updated} complaints marked as RESOLVED.")
     mark_as_resolved.short_description = "Mark selected complaints as Resolved"
 
@@ -26,3 +30,27 @@ class VerificationAdmin(admin.ModelAdmin):
 @admin.register(UserProfile)
 class UserProfileAdmin(admin.ModelAdmin):
     list_display = ('user', 'points', 'badges')
+
+@admin.register(ModerationJob)
+class ModerationJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'complaint', 'reporter', 'state', 'attempts', 'run_after', 'created_at')
+    list_filter = ('state',)
+    readonly_fields = ('created_at', 'updated_at')
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ('id', 'subject', 'complaint', 'state', 'attempts', 'run_after', 'sent_at')
+    list_filter = ('state',)
+    search_fields = ('subject',)
+    readonly_fields = ('created_at', 'sent_at')
+
+@admin.register(SideEffect)
+class SideEffectAdmin(admin.ModelAdmin):
+    list_display = ('id', 'complaint', 'effect', 'occurrence', 'created_at')
+    list_filter = ('effect',)
+    readonly_fields = ('created_at',)
+
+@admin.register(AIMetricCounter)
+class AIMetricCounterAdmin(admin.ModelAdmin):
+    list_display = ('scope', 'name', 'value')
+    list_filter = ('scope',)
@@ -4,7 +4,8 @@ from langgraph.graph import StateGraph, END
 from langchain_core.messages import HumanMessage, SystemMessage
 from langchain_google_genai import ChatGoogleGenerativeAI
 from django.conf import settings
-from django.core.mail import send_mail
+from complaints import mailer
+from complaints.mailer import send_mail
 from django.utils import timezone
 from datetime import timedelta
 from complaints.models import Complaint
@@ -129,3 +130,8 @@ app = workflow.compile()
 def run_escalation_agent(complaint_id):
     result = app.invoke({"complaint_id": complaint_id})
     return result
+
+def run_escalation_agent_batch(complaint_ids):
+    # All send_email nodes of the batch share one SMTP session (see complaints/mailer.py)
+    with mailer.batch():
+        return {complaint_id: run_escalation_agent(complaint_id) for complaint_id in complaint_ids}
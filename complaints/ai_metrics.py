@@ -0,0 +1,249 @@
+"""
+Instrumentation of AI provider calls.
+
+Every provider call (see ai_service._call_provider) is timed and counted per
+provider: outcome, a latency histogram, image bytes sent, prompt/completion
+tokens when the SDK reports them, and unparseable responses. Providers add
+details to the call in progress with note_usage(), note_image_bytes() and
+note_parse_failure(); the call runs in a single thread, so a thread-local
+holds it.
+
+Counters are AIMetricCounter rows, bumped with one UPDATE ... SET value =
+value + CASE ... per scope, so web workers, run_moderation_worker and
+rescore_complaints all add to the same numbers, `ai_latency_report` reads
+them from any process, and no cache eviction can drop them. The verdict
+cache and the pre-filter (see ai_service) count their decisions here too.
+Percentiles are estimated from the histogram like Prometheus does.
+
+Provider calls run in ai_service's pool threads, which must not touch the
+database (each would hold its own connection open, and on SQLite add a
+concurrent writer). record() only adds the call to an in-process buffer;
+the caller's thread writes it with flush() once the failover returns.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from django.db import transaction
+from django.db.models import BigIntegerField, Case, F, Value, When
+
+# Upper bounds of the latency buckets in milliseconds; the last bucket is everything slower
+LATENCY_BUCKETS_MS = (100, 250, 500, 1000, 2000, 3000, 5000, 8000, 13000, 20000, 30000, 60000)
+
+OUTCOMES = ("accepted", "rejected", "unavailable", "parse_error", "not_configured", "exception")
+SUMS = ("calls", "latency_ms", "image_bytes", "image_calls", "prompt_tokens", "completion_tokens", "parse_failures")
+
+_current = threading.local()
+
+# {scope: {name: delta}} recorded by pool threads, not yet written
+_pending = {}
+_pending_lock = threading.Lock()
+
+
+def add(scope, deltas):
+    """Adds each {name: delta} to the counters of `scope`; never raises."""
+    from .models import AIMetricCounter
+
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    increment = F('value') + Case(
+        *(When(name=name, then=Value(delta)) for name, delta in deltas.items()),
+        default=Value(0), output_field=BigIntegerField(),
+    )
+    try:
+        rows = AIMetricCounter.objects.filter(scope=scope, name__in=deltas)
+        with transaction.atomic():
+            complete = rows.update(value=increment) == len(deltas)
+            if not complete:
+                # First time some of these are counted: undo, create them at 0, count again
+                transaction.set_rollback(True)
+        if not complete:
+            AIMetricCounter.objects.bulk_create([AIMetricCounter(scope=scope, name=name) for name in deltas], ignore_conflicts=True)
+            rows.update(value=increment)
+    except Exception as e:
+        # Metrics must never fail a moderation
+        print(f"AI metrics for {scope} not recorded: {e}")
+
+
+def buffer(scope, deltas):
+    """Like add(), but only in memory until the next flush(); safe from any thread."""
+    with _pending_lock:
+        pending = _pending.setdefault(scope, {})
+        for name, delta in deltas.items():
+            pending[name] = pending.get(name, 0) + delta
+
+
+def flush():
+    """Writes the buffered counters (one UPDATE per scope); call it from a request or command thread."""
+    with _pending_lock:
+        pending = dict(_pending)
+        _pending.clear()
+    for scope, deltas in pending.items():
+        add(scope, deltas)
+
+
+def counters(scope, names=None):
+    """{name: value} of the given counters of `scope` (0 when never counted), or all of them."""
+    from .models import AIMetricCounter
+
+    flush()
+    rows = AIMetricCounter.objects.filter(scope=scope)
+    if names is None:
+        return dict(rows.values_list('name', 'value'))
+    values = dict(rows.filter(name__in=names).values_list('name', 'value'))
+    return {name: values.get(name, 0) for name in names}
+
+
+class CallRecord:
+    def __init__(self, provider, model):
+        self.provider = provider
+        self.model = model
+        self.result = None
+        self.latency = 0.0
+        self.image_bytes = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.parse_failures = 0
+
+    @property
+    def outcome(self):
+        from .ai_service import RESPONSE_ERROR, SERVICE_UNAVAILABLE
+
+        if self.result is None:
+            return "exception"
+        is_valid, reason = self.result[0], self.result[1]
+        if is_valid:
+            return "accepted"
+        if reason == RESPONSE_ERROR:
+            return "parse_error"
+        if reason == SERVICE_UNAVAILABLE:
+            return "unavailable"
+        if str(reason).endswith("Not Configured"):
+            return "not_configured"
+        return "rejected"
+
+
+def note_usage(prompt_tokens=None, completion_tokens=None):
+    call = getattr(_current, "call", None)
+    if call is not None:
+        # SDKs leave these unset (None) for some models and responses
+        if isinstance(prompt_tokens, int):
+            call.prompt_tokens += prompt_tokens
+        if isinstance(completion_tokens, int):
+            call.completion_tokens += completion_tokens
+
+
+def note_image_bytes(size):
+    call = getattr(_current, "call", None)
+    if call is not None:
+        call.image_bytes += size
+
+
+def note_parse_failure():
+    call = getattr(_current, "call", None)
+    if call is not None:
+        call.parse_failures += 1
+
+
+@contextmanager
+def instrument_call(provider, model):
+    """Times the provider call in the block; set `.result` on the yielded record."""
+    call = CallRecord(provider, model)
+    _current.call = call
+    start = time.monotonic()
+    try:
+        yield call
+    finally:
+        call.latency = time.monotonic() - start
+        _current.call = None
+        record(call)
+
+
+def record(call):
+    latency_ms = round(call.latency * 1000)
+    bucket = next((i for i, bound in enumerate(LATENCY_BUCKETS_MS) if latency_ms <= bound), len(LATENCY_BUCKETS_MS))
+    buffer(call.provider, {
+        "calls": 1,
+        f"outcome:{call.outcome}": 1,
+        f"bucket:{bucket}": 1,
+        "latency_ms": latency_ms,
+        "image_bytes": call.image_bytes,
+        "image_calls": 1 if call.image_bytes else 0,
+        "prompt_tokens": call.prompt_tokens,
+        "completion_tokens": call.completion_tokens,
+        "parse_failures": call.parse_failures,
+        **({f"model:{call.model}"[:64]: 1} if call.model else {}),
+    })
+
+
+def percentile(buckets, q):
+    """Estimates the q-quantile (0-1) in ms from non-cumulative bucket counts."""
+    total = sum(buckets)
+    if not total:
+        return None
+    rank = q * total
+    seen = 0
+    for i, count in enumerate(buckets):
+        if count and seen + count >= rank:
+            if i == len(LATENCY_BUCKETS_MS):
+                return float(LATENCY_BUCKETS_MS[-1])  # slower than the last bound
+            lower = LATENCY_BUCKETS_MS[i - 1] if i else 0
+            return lower + (LATENCY_BUCKETS_MS[i] - lower) * (rank - seen) / count
+        seen += count
+    return float(LATENCY_BUCKETS_MS[-1])
+
+
+def provider_metrics(provider, model=None):
+    values = counters(provider)
+
+    def get(name):
+        return values.get(name, 0)
+
+    calls = get("calls")
+    buckets = [get(f"bucket:{i}") for i in range(len(LATENCY_BUCKETS_MS) + 1)]
+    cumulative, histogram = 0, {}
+    for bound, count in zip([*map(str, LATENCY_BUCKETS_MS), "+Inf"], buckets):
+        cumulative += count
+        histogram[bound] = cumulative
+
+    return {
+        "provider": provider,
+        "model": model,
+        # Calls per model actually sent (MODEL_NAME may have changed since)
+        "models": {name[len("model:"):]: count for name, count in sorted(values.items()) if name.startswith("model:")},
+        "calls": calls,
+        "outcomes": {outcome: get(f"outcome:{outcome}") for outcome in OUTCOMES},
+        "parse_failures": get("parse_failures"),
+        "latency_ms": {
+            "avg": get("latency_ms") / calls if calls else None,
+            "p50": percentile(buckets, 0.50),
+            "p95": percentile(buckets, 0.95),
+            "p99": percentile(buckets, 0.99),
+            "histogram": histogram,  # cumulative counts per upper bound (ms)
+        },
+        "image_bytes": {
+            "total": get("image_bytes"),
+            "avg": get("image_bytes") / get("image_calls") if get("image_calls") else None,
+        },
+        "tokens": {"prompt": get("prompt_tokens"), "completion": get("completion_tokens")},
+    }
+
+
+def all_metrics():
+    from .ai_service import PROVIDER_CLASSES, prefilter_stats, verdict_cache_stats
+
+    return {
+        "providers": [
+            provider_metrics(name, getattr(cls, "MODEL_NAME", None))
+            for name, cls in PROVIDER_CLASSES.items()
+        ],
+        "verdict_cache": verdict_cache_stats(),
+        "prefilter": prefilter_stats(),
+    }
+
+
+def reset():
+    from .models import AIMetricCounter
+    with _pending_lock:
+        _pending.clear()
+    AIMetricCounter.objects.all().delete()
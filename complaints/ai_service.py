@@ -1,14 +1,105 @@
+import hashlib
+import io
 import os
 import json
+import math
+import random
+import re
+import threading
+import unicodedata
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 import google.generativeai as genai
 from django.conf import settings
+import httpx
 import openai
+from . import ai_metrics
+
+# Connection pool of the OpenAI-compatible clients. Providers are cached per
+# process (see get_provider), so these connections stay open between complaints
+# and only the first call pays for DNS + TCP + TLS.
+HTTP_POOL_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=120)
+
+# Deadline of a single provider call, and of a whole analyze_complaint() including failover (seconds)
+AI_CALL_DEADLINE = float(os.environ.get("AI_CALL_DEADLINE", 20))
+AI_TOTAL_DEADLINE = float(os.environ.get("AI_TOTAL_DEADLINE", 45))
+AI_REQUEST_TIMEOUT = AI_CALL_DEADLINE
+
+def build_openai_client(api_key, base_url=None):
+    return openai.OpenAI(
+        api_key=api_key,
+        base_url=base_url,
+        timeout=AI_REQUEST_TIMEOUT,
+        http_client=openai.DefaultHttpxClient(limits=HTTP_POOL_LIMITS),
+    )
+
+# Failure reasons that say nothing about the complaint itself (never cached)
+SERVICE_UNAVAILABLE = "AI Service Unavailable. Please try again later."
+RESPONSE_ERROR = "AI Response Error. Please try again."
+
+# Images are sent to the providers at this size: enough for the model to judge
+# a pothole or a garbage pile, a fraction of the bytes of a phone photo.
+AI_IMAGE_MAX_SIDE = 1024
+AI_IMAGE_QUALITY = 80
+
+def has_image(image):
+    """`image` is a file path, or the bytes of an upload that is not in storage yet."""
+    if isinstance(image, (bytes, bytearray)):
+        return bool(image)
+    return bool(image) and os.path.exists(image)
+
+def open_image(image):
+    if isinstance(image, (bytes, bytearray)):
+        return io.BytesIO(image)
+    return open(image, "rb")
+
+def prepare_image(image_path, max_side=AI_IMAGE_MAX_SIDE):
+    """
+    Downscales and re-encodes an uploaded image for the AI providers.
+    `image_path` may also be the image bytes (see has_image).
+
+    JPEGs are decoded with draft() straight at 1/2, 1/4 or 1/8 scale, so a 12MP
+    photo never exists in memory at full resolution. Returns (jpeg_bytes,
+    mime_type), or None if there is no image or it can't be decoded.
+    """
+    from PIL import Image, ImageOps
+
+    if not has_image(image_path):
+        return None
+    try:
+        with open_image(image_path) as image_file, Image.open(image_file) as img:
+            img.draft('RGB', (max_side, max_side))
+            img = ImageOps.exif_transpose(img)  # phones store rotation in EXIF
+            img.thumbnail((max_side, max_side), Image.Resampling.LANCZOS, reducing_gap=2.0)
+            if img.mode != 'RGB':
+                img = img.convert('RGB')
+
+            buffer = io.BytesIO()
+            img.save(buffer, 'JPEG', quality=AI_IMAGE_QUALITY, optimize=True)
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        print(f"Error preparing image for AI: {e}")
+        return None
+
+    data = buffer.getvalue()
+    # Bytes sent per call are in the AI metrics (see ai_latency_report)
+    ai_metrics.note_image_bytes(len(data))
+    return data, 'image/jpeg'
 
 class AIProvider:
     def analyze(self, image_path, description, category):
         raise NotImplementedError
 
 class GeminiProvider(AIProvider):
+    MODEL_NAME = 'gemini-2.0-flash'
+
+    def __init__(self):
+        # genai.configure() replaces the SDK's global client (and its channel),
+        # so it is called once here instead of on every analyze()
+        self.model = None
+        if self.configure():
+            self.model = genai.GenerativeModel(self.MODEL_NAME)
+
     def configure(self):
         api_key = os.environ.get("GEMINI_API_KEY")
         if not api_key:
@@ -18,23 +109,31 @@ class GeminiProvider(AIProvider):
         return True
 
     def analyze(self, image_path, description, category):
-        if not self.configure():
+        if self.model is None:
             return False, "Gemini Not Configured", 0, False
 
-        model = genai.GenerativeModel('gemini-2.0-flash')
+        model = self.model
         prompt = self._get_prompt(description, category)
 
         try:
-            if image_path and os.path.exists(image_path):
-                sample_file = genai.upload_file(path=image_path, display_name="Complaint Image")
-                response = model.generate_content([sample_file, prompt])
+            image = prepare_image(image_path)
+            if image:
+                # Sent inline with the prompt: no separate upload_file() round trip
+                data, mime_type = image
+                response = model.generate_content(
+                    [{"mime_type": mime_type, "data": data}, prompt],
+                    request_options={"timeout": AI_REQUEST_TIMEOUT},
+                )
             else:
-                response = model.generate_content(prompt)
+                response = model.generate_content(prompt, request_options={"timeout": AI_REQUEST_TIMEOUT})
             
+            usage = getattr(response, "usage_metadata", None)
+            if usage is not None:
+                ai_metrics.note_usage(usage.prompt_token_count, usage.candidates_token_count)
             return self._parse_response(response.text)
         except Exception as e:
             print(f"Gemini Error: {e}")
-            return False, "AI Service Unavailable. Please try again later.", 0, False
+            return False, SERVICE_UNAVAILABLE, 0, False
 
     def _get_prompt(self, description, category):
         return f"""
@@ -82,17 +181,17 @@ class GeminiProvider(AIProvider):
             return is_valid, rejection_reason, urgency_score, category_matches
         except json.JSONDecodeError:
             print("Failed to parse AI JSON response")
-            return False, "AI Response Error. Please try again.", 0, False
+            ai_metrics.note_parse_failure()
+            return False, RESPONSE_ERROR, 0, False
 
 class GrokProvider(AIProvider):
+    MODEL_NAME = "grok-beta"
+
     def __init__(self):
         self.api_key = os.environ.get("GROK_API_KEY")
         self.client = None
         if self.api_key:
-            self.client = openai.OpenAI(
-                api_key=self.api_key,
-                base_url="https://api.x.ai/v1",
-            )
+            self.client = build_openai_client(self.api_key, base_url="https://api.x.ai/v1")
 
     def analyze(self, image_path, description, category):
         if not self.client:
@@ -119,18 +218,20 @@ class GrokProvider(AIProvider):
             # Grok currently supports text-only via OpenAI SDK compatibility
             # Future: Add image support if Grok Vision is available via API
             response = self.client.chat.completions.create(
-                model="grok-beta",
+                model=self.MODEL_NAME,
                 messages=[
                     {"role": "system", "content": "You are a helpful civic assistant. Output valid JSON only."},
                     {"role": "user", "content": prompt}
                 ]
             )
             content = response.choices[0].message.content
+            if response.usage is not None:
+                ai_metrics.note_usage(response.usage.prompt_tokens, response.usage.completion_tokens)
             print(f"DEBUG: Grok Response: {content}")
             return self._parse_response(content)
         except Exception as e:
             print(f"Grok Error: {e}")
-            return False, "AI Service Unavailable. Please try again later.", 0, False
+            return False, SERVICE_UNAVAILABLE, 0, False
 
     def _parse_response(self, text):
         # Reuse parsing logic or duplicate if needed. 
@@ -155,14 +256,17 @@ class GrokProvider(AIProvider):
                 
             return is_valid, rejection_reason, urgency_score, category_matches
         except json.JSONDecodeError:
-            return False, "AI Response Error. Please try again.", 0, False
+            ai_metrics.note_parse_failure()
+            return False, RESPONSE_ERROR, 0, False
 
 class OpenAIProvider(AIProvider):
+    MODEL_NAME = "gpt-4o-mini"
+
     def __init__(self):
         self.api_key = os.environ.get("OPENAI_API_KEY")
         self.client = None
         if self.api_key:
-            self.client = openai.OpenAI(api_key=self.api_key)
+            self.client = build_openai_client(self.api_key)
 
     def analyze(self, image_path, description, category):
         if not self.client:
@@ -205,41 +309,37 @@ class OpenAIProvider(AIProvider):
             """}
         ]
 
-        # Add image if exists
-        if image_path and os.path.exists(image_path):
-            try:
-                file_size = os.path.getsize(image_path)
-                print(f"DEBUG: Image found at {image_path}, Size: {file_size} bytes")
-                
-                with open(image_path, "rb") as image_file:
-                    base64_image = base64.b64encode(image_file.read()).decode('utf-8')
-                    print(f"DEBUG: Base64 Image Length: {len(base64_image)}")
-                    
-                    user_content.append({
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:image/jpeg;base64,{base64_image}"
-                        }
-                    })
-            except Exception as e:
-                print(f"Error reading image for OpenAI: {e}")
+        # Add image if exists (downscaled, see prepare_image)
+        image = prepare_image(image_path)
+        if image:
+            data, mime_type = image
+            base64_image = base64.b64encode(data).decode('utf-8')
+            print(f"DEBUG: Base64 Image Length: {len(base64_image)}")
+            user_content.append({
+                "type": "image_url",
+                "image_url": {
+                    "url": f"data:{mime_type};base64,{base64_image}"
+                }
+            })
         else:
-            print(f"DEBUG: No image found at {image_path}")
+            print("DEBUG: No usable image attached")
 
         messages.append({"role": "user", "content": user_content})
 
         try:
             response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
+                model=self.MODEL_NAME,
                 messages=messages,
                 response_format={"type": "json_object"}
             )
             content = response.choices[0].message.content
+            if response.usage is not None:
+                ai_metrics.note_usage(response.usage.prompt_tokens, response.usage.completion_tokens)
             print(f"DEBUG: OpenAI Raw Response: {content}")
             return self._parse_response(content)
         except Exception as e:
             print(f"OpenAI Error: {e}")
-            return False, "AI Service Unavailable. Please try again later.", 0, False
+            return False, SERVICE_UNAVAILABLE, 0, False
 
     def _parse_response(self, text):
         # Reuse parsing logic
@@ -257,17 +357,676 @@ class OpenAIProvider(AIProvider):
                 
             return is_valid, rejection_reason, urgency_score, category_matches
         except json.JSONDecodeError:
-            return False, "AI Response Error. Please try again.", 0, False
+            ai_metrics.note_parse_failure()
+            return False, RESPONSE_ERROR, 0, False
+
+class ReplayProvider(AIProvider):
+    """
+    AI_PROVIDER=replay: answers from a cassette recorded from the real providers
+    (see RecordingProvider), for load tests without API keys or API bills.
+
+    AI_REPLAY_CASSETTE   path of the JSONL cassette
+    AI_REPLAY_LATENCY    recorded | none | fixed:MS | uniform:MIN_MS,MAX_MS | lognormal:MEDIAN_MS,SIGMA
+    AI_REPLAY_SLOWDOWN   multiplies every latency (e.g. 3 to reproduce a degraded vendor)
+    AI_REPLAY_ERROR_RATE share of calls answering "AI Service Unavailable" (0-1)
+    AI_REPLAY_TIMEOUT_RATE share of calls that hang past AI_CALL_DEADLINE (0-1)
+    AI_REPLAY_SEED       makes the latency/error sequence reproducible
+    """
+    MODEL_NAME = "replay"
+
+    def __init__(self, cassette=None):
+        self.cassette = cassette or os.environ.get("AI_REPLAY_CASSETTE") or default_cassette_path()
+        self.latency = parse_latency_spec(os.environ.get("AI_REPLAY_LATENCY", "recorded"))
+        self.slowdown = float(os.environ.get("AI_REPLAY_SLOWDOWN", 1))
+        self.error_rate = float(os.environ.get("AI_REPLAY_ERROR_RATE", 0))
+        self.timeout_rate = float(os.environ.get("AI_REPLAY_TIMEOUT_RATE", 0))
+        seed = os.environ.get("AI_REPLAY_SEED")
+        self.random = random.Random(int(seed) if seed else None)
+        self.lock = threading.Lock()  # random.Random is shared by request threads
+
+        self.entries = []
+        if os.path.exists(self.cassette):
+            with open(self.cassette, encoding="utf-8") as f:
+                self.entries = [json.loads(line) for line in f if line.strip()]
+        self.by_key = {entry["key"]: entry for entry in self.entries}
+        print(f"Replay provider: {len(self.entries)} recorded verdicts from {self.cassette}")
+
+    def analyze(self, image_path, description, category):
+        if not self.entries:
+            print(f"Warning: replay cassette {self.cassette} is empty.")
+            return False, "Replay Not Configured", 0, False
+
+        key = cassette_key(image_path, description, category)
+        entry = self.by_key.get(key)
+        if entry is None:
+            # Unknown content: a recorded verdict picked by hash, so a given input always gets the same answer
+            entry = self.entries[int(key[:8], 16) % len(self.entries)]
+
+        with self.lock:
+            roll = self.random.random()
+            delay = self.latency(entry, self.random) * self.slowdown
 
-def get_provider():
+        if roll < self.timeout_rate:
+            time.sleep(AI_CALL_DEADLINE * 2)
+            return False, SERVICE_UNAVAILABLE, 0, False
+        time.sleep(delay)
+        if roll < self.timeout_rate + self.error_rate:
+            return False, SERVICE_UNAVAILABLE, 0, False
+        return tuple(entry["verdict"])
+
+def default_cassette_path():
+    return os.path.join(settings.BASE_DIR, "ai_cassette.jsonl")
+
+def cassette_key(image_path, description, category):
+    # Same content hash as the verdict cache, independent of the provider
+    return verdict_cache_key(image_path, description, category, "cassette").rsplit(":", 1)[-1]
+
+def parse_latency_spec(spec):
+    """Returns f(entry, rng) -> seconds for an AI_REPLAY_LATENCY value."""
+    kind, _, args = spec.strip().lower().partition(":")
+    try:
+        values = [float(value) for value in args.split(",") if value]
+    except ValueError:
+        values = None
+
+    if kind == "recorded":
+        return lambda entry, rng: entry.get("latency_ms", 0) / 1000
+    if kind in ("none", "0"):
+        return lambda entry, rng: 0.0
+    if kind == "fixed" and values and len(values) == 1:
+        return lambda entry, rng: values[0] / 1000
+    if kind == "uniform" and values and len(values) == 2:
+        return lambda entry, rng: rng.uniform(values[0], values[1]) / 1000
+    if kind == "lognormal" and values and len(values) == 2:
+        # Long right tail, like real LLM latencies
+        median_ms, sigma = values
+        return lambda entry, rng: median_ms * math.exp(rng.gauss(0, sigma)) / 1000
+    raise ValueError(f"Invalid AI_REPLAY_LATENCY: {spec!r}")
+
+class RecordingProvider(AIProvider):
+    """
+    Wraps a real provider and appends every verdict (with its latency) to a
+    cassette for ReplayProvider. Enabled with AI_RECORD_CASSETTE=path.
+    Provider outages are not recorded; use AI_REPLAY_ERROR_RATE instead.
+    """
+    _write_lock = threading.Lock()
+
+    def __init__(self, provider, name, cassette):
+        self.provider = provider
+        self.name = name
+        self.cassette = cassette
+
+    def __getattr__(self, attr):
+        return getattr(self.provider, attr)
+
+    def analyze(self, image_path, description, category):
+        start = time.monotonic()
+        result = tuple(self.provider.analyze(image_path, description, category))
+        latency_ms = round((time.monotonic() - start) * 1000)
+        if not is_transient_failure(result):
+            entry = {
+                "key": cassette_key(image_path, description, category),
+                "provider": self.name,
+                "category": category,
+                "description": description,
+                "verdict": list(result),
+                "latency_ms": latency_ms,
+            }
+            with self._write_lock, open(self.cassette, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        return result
+
+PROVIDER_CLASSES = {
+    "gemini": GeminiProvider,
+    "grok": GrokProvider,
+    "openai": OpenAIProvider,
+    "replay": ReplayProvider,
+}
+
+# Process-wide provider registry: one client (and one connection pool) per
+# provider, shared by all requests and threads of this process.
+_providers = {}
+_providers_lock = threading.Lock()
+
+def _reset_after_fork():
+    # A forked worker (gunicorn --preload, multiprocessing) must not share the
+    # parent's sockets, and the parent may have forked while holding the lock.
+    global _providers_lock, _executor, _health_lock
+    _providers_lock = threading.Lock()
+    _providers.clear()
+    # Threads don't survive fork(); the pool and its lock are rebuilt on first use
+    _executor = None
+    _health_lock = threading.Lock()
+    _health.clear()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+def provider_name_from_env():
     provider_name = os.environ.get("AI_PROVIDER", "gemini").lower()
-    print(f"Using AI Provider: {provider_name}")
-    if provider_name == "grok":
-        return GrokProvider()
-    elif provider_name == "openai":
-        return OpenAIProvider()
-    return GeminiProvider()
-
-def analyze_complaint(image_path, description, category):
-    provider = get_provider()
-    return provider.analyze(image_path, description, category)
+    return provider_name if provider_name in PROVIDER_CLASSES else "gemini"
+
+def get_provider(name=None):
+    provider_name = name or provider_name_from_env()
+
+    provider = _providers.get(provider_name)
+    if provider is None:
+        with _providers_lock:
+            # Another thread may have built it while we waited for the lock
+            provider = _providers.get(provider_name)
+            if provider is None:
+                print(f"Using AI Provider: {provider_name}")
+                provider = PROVIDER_CLASSES[provider_name]()
+                record_to = os.environ.get("AI_RECORD_CASSETTE")
+                if record_to and provider_name != "replay":
+                    provider = RecordingProvider(provider, provider_name, record_to)
+                _providers[provider_name] = provider
+    return provider
+
+def reset_providers():
+    """Closes and forgets the cached providers, e.g. after rotating API keys."""
+    with _providers_lock:
+        for provider in _providers.values():
+            client = getattr(provider, "client", None)
+            if client is not None:
+                client.close()
+        _providers.clear()
+
+# --- Failover chain ------------------------------------------------------------
+# AI_PROVIDER_CHAIN=gemini,openai,grok tries the providers in order. Every call
+# runs in a worker thread with a deadline; if it is still running after the
+# provider's observed p95 latency, a hedged request goes to the next provider
+# and whichever answers first wins. A provider that keeps failing is skipped by
+# its circuit breaker until it has had time to recover.
+
+# Hedge after this long until a provider has enough samples for a p95
+AI_HEDGE_DELAY = float(os.environ.get("AI_HEDGE_DELAY", 8))
+HEDGE_MIN_SAMPLES = 20
+HEDGE_MIN_DELAY = 1.0
+LATENCY_WINDOW = 200
+
+# Consecutive failures that open the circuit, and how long it stays open (seconds)
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_RESET_TIMEOUT = 30
+
+AI_MAX_CONCURRENT_CALLS = 16
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_timeout=BREAKER_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self):
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and not self.trial_running:
+            # Let a single trial call through to see whether the provider is back
+            self.trial_running = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.trial_running = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+class ProviderHealth:
+    """Circuit breaker plus a window of recent successful latencies."""
+
+    def __init__(self):
+        self.breaker = CircuitBreaker()
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def hedge_delay(self):
+        if len(self.latencies) < HEDGE_MIN_SAMPLES:
+            return AI_HEDGE_DELAY
+        ordered = sorted(self.latencies)
+        return max(HEDGE_MIN_DELAY, ordered[int(len(ordered) * 0.95) - 1])
+
+_health = {}
+_health_lock = threading.Lock()
+_executor = None
+
+def provider_health(name):
+    with _health_lock:
+        if name not in _health:
+            _health[name] = ProviderHealth()
+        return _health[name]
+
+def _get_executor():
+    global _executor
+    with _providers_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=AI_MAX_CONCURRENT_CALLS, thread_name_prefix="ai-provider")
+        return _executor
+
+def provider_chain():
+    names = os.environ.get("AI_PROVIDER_CHAIN", "").lower().split(",")
+    chain = []
+    for name in (n.strip() for n in names):
+        if name in PROVIDER_CLASSES and name not in chain:
+            chain.append(name)
+    return chain or [provider_name_from_env()]
+
+class RateLimiter:
+    """Token bucket: at most `rpm` calls per minute, bursts up to `rpm / 6` (10s worth)."""
+
+    def __init__(self, rpm):
+        self.rate = rpm / 60.0
+        self.capacity = max(1.0, rpm / 6.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, timeout=None):
+        give_up_at = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait_for = (1 - self.tokens) / self.rate
+            if give_up_at is not None and now + wait_for > give_up_at:
+                return False
+            time.sleep(wait_for)
+
+# Optional per-provider limits (set by batch jobs such as rescore_complaints)
+_rate_limiters = {}
+
+def set_rate_limit(name, rpm):
+    if rpm:
+        _rate_limiters[name] = RateLimiter(rpm)
+    else:
+        _rate_limiters.pop(name, None)
+
+def _acquire_rate_limit(name, timeout):
+    """True once `name` may be called, False if it has no capacity within `timeout` seconds."""
+    limiter = _rate_limiters.get(name)
+    return limiter is None or limiter.acquire(timeout=max(0, timeout))
+
+def _call_provider(name, image_path, description, category):
+    provider = get_provider(name)
+    with ai_metrics.instrument_call(name, getattr(provider, "MODEL_NAME", None)) as call:
+        call.result = tuple(provider.analyze(image_path, description, category))
+    return call.result, call.latency
+
+def _record_outcome(name, ok, latency=None):
+    health = provider_health(name)
+    with _health_lock:
+        if ok:
+            health.breaker.record_success()
+            health.latencies.append(latency)
+        else:
+            health.breaker.record_failure()
+
+def _record_late(name, future):
+    # Outcome of a call we stopped waiting for (lost the hedge race)
+    try:
+        result, latency = future.result()
+    except Exception:
+        _record_outcome(name, False)
+        return
+    _record_outcome(name, not is_transient_failure(result), latency)
+
+def analyze_with_failover(image_path, description, category, chain=None):
+    """
+    Runs the moderation on the provider chain and returns the first real verdict,
+    or SERVICE_UNAVAILABLE if every provider failed, timed out or is switched
+    off by its breaker before AI_TOTAL_DEADLINE.
+    """
+    try:
+        return _failover(image_path, description, category, chain or provider_chain())
+    finally:
+        # Pool threads only buffer their call metrics; this thread writes them
+        # (plus any a call abandoned earlier finished since)
+        ai_metrics.flush()
+
+def _failover(image_path, description, category, chain):
+    executor = _get_executor()
+    deadline = time.monotonic() + AI_TOTAL_DEADLINE
+    remaining = list(chain)
+    running = {}  # future -> (provider name, start time)
+    hedged = False
+
+    # Rate-limit waits happen here, before a call's clock starts: waiting for
+    # capacity is not provider latency, so it never counts against the breaker,
+    # the hedge delay or AI_CALL_DEADLINE. A hedge is optional and never waits.
+    def launch(hedge=False):
+        while remaining:
+            name = remaining.pop(0)
+            health = provider_health(name)
+            with _health_lock:
+                circuit_open = health.breaker.state == CircuitBreaker.OPEN
+            if not circuit_open:
+                if not _acquire_rate_limit(name, 0 if hedge else deadline - time.monotonic()):
+                    if hedge:
+                        # Still there for a failover, which may wait for capacity
+                        remaining.insert(0, name)
+                        return False
+                    print(f"AI provider {name} skipped: rate limit")
+                    continue
+                with _health_lock:
+                    allowed = health.breaker.allow()
+                if allowed:
+                    future = executor.submit(_call_provider, name, image_path, description, category)
+                    running[future] = (name, time.monotonic())
+                    return True
+            print(f"AI provider {name} skipped: circuit open")
+        if hedge and len(chain) == 1 and running and _acquire_rate_limit(chain[0], 0):
+            # Single provider: hedge with a duplicate request
+            name = chain[0]
+            future = executor.submit(_call_provider, name, image_path, description, category)
+            running[future] = (name, time.monotonic())
+            return True
+        return False
+
+    launch()
+    while running:
+        now = time.monotonic()
+        wake_at = [deadline] + [start + AI_CALL_DEADLINE for _, start in running.values()]
+        if not hedged and len(running) == 1:
+            name, start = next(iter(running.values()))
+            wake_at.append(start + provider_health(name).hedge_delay())
+        done, _ = wait(list(running), timeout=max(0, min(wake_at) - now), return_when=FIRST_COMPLETED)
+
+        for future in done:
+            name, start = running.pop(future)
+            try:
+                result, latency = future.result()
+            except Exception as e:
+                print(f"{name} Error: {e}")
+                result = None
+            if result is not None and not is_transient_failure(result):
+                _record_outcome(name, True, latency)
+                for other, (other_name, _) in running.items():
+                    other.add_done_callback(lambda f, n=other_name: _record_late(n, f))
+                return result
+            _record_outcome(name, False)
+
+        now = time.monotonic()
+        for future, (name, start) in list(running.items()):
+            if now >= start + AI_CALL_DEADLINE:
+                # Abandoned: the thread finishes in the background (HTTP timeouts match the deadline)
+                print(f"AI provider {name} timed out after {AI_CALL_DEADLINE}s")
+                running.pop(future)
+                _record_outcome(name, False)
+
+        if now >= deadline:
+            for future, (name, _) in running.items():
+                _record_outcome(name, False)
+            break
+        if not running:
+            launch()
+        elif not hedged and len(running) == 1:
+            name, start = next(iter(running.values()))
+            if now >= start + provider_health(name).hedge_delay():
+                hedged = True
+                if launch(hedge=True):
+                    print(f"AI provider {name} slower than its p95, hedging")
+
+    return False, SERVICE_UNAVAILABLE, 0, False
+
+# --- Local pre-filter ----------------------------------------------------------
+# Runs before any paid provider call. Descriptions that are abusive, empty,
+# repetitive or link spam are rejected locally. Everything else goes to the
+# LLM as before: a keyword is no safety check, so fast-tracking text-only
+# complaints that name their category is opt-in (AI_PREFILTER_FAST_TRACK). Languages follow client/src/locales (en, hi, mr),
+# in Devanagari and in the romanized spellings people type on phones.
+
+PREFILTER_LEXICON = {
+    "abuse": [
+        # English
+        "fuck", "fucking", "fucker", "motherfucker", "bitch", "bastard", "asshole", "cunt",
+        "dickhead", "slut", "whore",
+        # Hindi
+        "madarchod", "maderchod", "behenchod", "bhenchod", "bhosdike", "bhosadike", "chutiya",
+        "chootiya", "gandu", "randi", "harami", "haramkhor",
+        "मादरचोद", "बहनचोद", "भेनचोद", "भोसड़ीके", "भोसडीके", "चूतिया", "चुतिया", "गांडू", "रंडी",
+        "हरामी", "हरामखोर",
+        # Marathi
+        "aighalya", "bhadwa", "bhadvya", "lavdya", "zavadya", "gandya", "chutya",
+        "आईघाल्या", "भडवा", "भडव्या", "लवड्या", "झवाड्या", "गांड्या", "चुत्या", "रांडेच्या",
+    ],
+    # Danger to life: fast-tracked complaints get a high urgency score
+    "emergency": [
+        "fire", "live wire", "electric shock", "electrocution", "short circuit", "collapsed",
+        "building collapse", "gas leak", "sinkhole",
+        "आग", "करंट", "बिजली का झटका", "गैस रिसाव", "इमारत गिरी", "शॉर्ट सर्किट",
+        "विजेचा धक्का", "गॅस गळती", "इमारत कोसळली",
+    ],
+    "POTHOLE": ["pothole", "potholes", "gaddha", "khadda", "गड्ढा", "गड्ढे", "खड्डा", "खड्डे"],
+    "GARBAGE": ["garbage", "trash", "rubbish", "debris", "dump", "kachra", "कचरा", "कूड़ा", "कचऱ्याचा"],
+    "DRAINAGE": ["drain", "drainage", "gutter", "sewage", "waterlogging", "flooding", "nala", "nali", "गटर",
+                 "नाली", "नाला", "जलभराव", "गटार", "पाणी साचले"],
+    "LIGHTING": ["streetlight", "street light", "street lamp", "lamp post", "स्ट्रीट लाइट", "बत्ती", "पथदिवा",
+                 "दिवा बंद"],
+    "WATER": ["water supply", "no water", "pipeline", "pipe burst", "water leak", "पानी की सप्लाई", "पाइपलाइन",
+              "पाणीपुरवठा", "पाणी येत नाही"],
+    "SANITATION": ["toilet", "urinal", "sanitation", "शौचालय", "स्वच्छतागृह"],
+    "TRAFFIC": ["traffic", "signal", "illegal parking", "parking", "jam", "ट्रैफिक", "वाहतूक", "सिग्नल"],
+    "PARKS": ["park", "garden", "playground", "tree fell", "पार्क", "बगीचा", "उद्यान", "बाग"],
+}
+
+PREFILTER_RULES = ("abuse_lexicon", "too_short", "repetition", "url_spam", "fast_track")
+
+# Text-only complaints accepted without an LLM call. Off by default: the lexicon only
+# knows abuse, not threats or hate speech, so it cannot stand in for the LLM's verdict.
+AI_PREFILTER_FAST_TRACK = os.environ.get("AI_PREFILTER_FAST_TRACK", "False") == "True"
+FAST_TRACK_URGENCY = 5
+EMERGENCY_URGENCY = 9
+
+MIN_DESCRIPTION_CHARS = 10
+MIN_DESCRIPTION_WORDS = 2
+URL_RE = re.compile(r"(?:https?://|www\.)\S+|\b\S+\.(?:com|in|net|org|xyz|ly|me|io)(?:/\S*)?\b", re.IGNORECASE)
+
+class AhoCorasick:
+    """
+    Finds every lexicon term in a text in one pass, however many terms there
+    are. Matches must start and end on a word boundary, so "class" does not
+    match "ass". Devanagari vowel signs count as part of the word.
+    """
+
+    def __init__(self, terms):
+        # terms: {term: label}
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        for term, label in terms.items():
+            node = 0
+            for char in term:
+                if char not in self.goto[node]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                    self.goto[node][char] = len(self.goto) - 1
+                node = self.goto[node][char]
+            self.output[node].append((len(term), label))
+
+        # Breadth-first: a node's failure link points to the longest proper suffix that is also a prefix
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self.goto[node].items():
+                queue.append(child)
+                fallback = self.fail[node]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0) if self.goto[fallback].get(char) != child else 0
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+
+    @staticmethod
+    def _is_word_char(char):
+        return unicodedata.category(char)[0] in "LMN"
+
+    def find(self, text):
+        """Yields (term_start, term_end, label) for every whole-word match."""
+        node = 0
+        for index, char in enumerate(text):
+            while node and char not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(char, 0)
+            for length, label in self.output[node]:
+                start, end = index - length + 1, index + 1
+                if start > 0 and self._is_word_char(text[start - 1]):
+                    continue
+                if end < len(text) and self._is_word_char(text[end]):
+                    continue
+                yield start, end, label
+
+def normalize_for_prefilter(text):
+    text = unicodedata.normalize("NFC", text or "").casefold()
+    # "fuuuuck" -> "fuck", "!!!!!" -> "!"
+    text = re.sub(r"(.)\1{2,}", r"\1", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+_prefilter_matcher = None
+
+def prefilter_matcher():
+    global _prefilter_matcher
+    if _prefilter_matcher is None:
+        terms = {}
+        for label, words in PREFILTER_LEXICON.items():
+            for word in words:
+                terms.setdefault(normalize_for_prefilter(word), label)
+        _prefilter_matcher = AhoCorasick(terms)
+    return _prefilter_matcher
+
+def _structural_rule(description):
+    """Name of the first structural rule the description breaks, or None."""
+    text = (description or "").strip()
+    words = re.findall(r"\w+", text)
+    if len(text) < MIN_DESCRIPTION_CHARS or len(words) < MIN_DESCRIPTION_WORDS:
+        return "too_short"
+
+    urls = URL_RE.findall(text)
+    if len(urls) >= 2 or (urls and sum(len(url) for url in urls) > len(text) / 2):
+        return "url_spam"
+
+    # One long run of a character, or the same word over and over
+    if re.search(r"(.)\1{9,}", text):
+        return "repetition"
+    lowered = [word.casefold() for word in words]
+    if len(lowered) >= 6 and max(lowered.count(word) for word in set(lowered)) > len(lowered) / 2:
+        return "repetition"
+    return None
+
+PREFILTER_REASONS = {
+    "abuse_lexicon": "The description contains abusive language.",
+    "too_short": "Please describe the issue in a few words.",
+    "repetition": "The description looks like spam (repeated text).",
+    "url_spam": "Links are not allowed in complaints.",
+}
+
+def prefilter(description, category, has_image):
+    """
+    Local verdict for a complaint, or None when the LLM has to decide.
+    Returns the same (is_valid, reason, urgency_score, category_matches) tuple.
+    """
+    rule = _structural_rule(description)
+    labels = set()
+    if rule is None:
+        labels = {label for _, _, label in prefilter_matcher().find(normalize_for_prefilter(description))}
+        if "abuse" in labels:
+            rule = "abuse_lexicon"
+
+    if rule is not None:
+        ai_metrics.add("prefilter", {rule: 1})
+        return False, PREFILTER_REASONS[rule], 0, False
+
+    # A photo still needs the LLM (nudity, selfies, does it show the issue?)
+    if AI_PREFILTER_FAST_TRACK and not has_image and (category or "").upper() in labels:
+        ai_metrics.add("prefilter", {"fast_track": 1})
+        return True, None, EMERGENCY_URGENCY if "emergency" in labels else FAST_TRACK_URGENCY, True
+    return None
+
+def prefilter_stats():
+    """How many submissions each rule decided locally (= LLM calls saved)."""
+    return ai_metrics.counters("prefilter", PREFILTER_RULES)
+
+# --- Verdict cache -------------------------------------------------------------
+# Identical submissions (client retries, spam, a rejected complaint sent again)
+# get the stored verdict instead of another LLM call. Keys are content hashes,
+# so the same photo under a different file name still hits.
+
+# Bump when the prompts change so old verdicts are not reused
+VERDICT_CACHE_VERSION = 1
+
+def verdict_cache():
+    from django.core.cache import caches
+    return caches["ai_verdicts" if "ai_verdicts" in settings.CACHES else "default"]
+
+def normalize_description(description):
+    return re.sub(r"\s+", " ", (description or "")).strip().casefold()
+
+def verdict_cache_key(image_path, description, category, provider_name):
+    digest = hashlib.sha256()
+    if has_image(image_path):
+        with open_image(image_path) as image_file:
+            for block in iter(lambda: image_file.read(1024 * 1024), b""):
+                digest.update(block)
+    digest.update(b"\0")
+    digest.update(normalize_description(description).encode())
+    digest.update(b"\0")
+    digest.update((category or "").strip().upper().encode())
+    return f"ai_verdict:v{VERDICT_CACHE_VERSION}:{provider_name}:{digest.hexdigest()}"
+
+def is_transient_failure(result):
+    is_valid, reason, _, _ = result
+    return not is_valid and (reason in (SERVICE_UNAVAILABLE, RESPONSE_ERROR) or str(reason).endswith("Not Configured"))
+
+def verdict_cache_stats():
+    # Counted in the database (complaints/ai_metrics.py), not in the cache they describe
+    counts = ai_metrics.counters("verdict_cache", ("hits", "misses"))
+    hits, misses = counts["hits"], counts["misses"]
+    total = hits + misses
+    return {"hits": hits, "misses": misses, "hit_rate": hits / total if total else 0.0}
+
+def analyze_complaint(image_path, description, category, refresh=False):
+    """
+    Returns (is_valid, reason, urgency_score, category_matches).
+    `refresh=True` ignores a cached verdict and the prefilter (re-scoring after a
+    prompt change must not replace LLM scores with the keyword heuristic).
+    """
+    if not refresh:
+        local_verdict = prefilter(description, category, has_image=has_image(image_path))
+        if local_verdict is not None:
+            return local_verdict
+
+    chain = provider_chain()
+    cache = verdict_cache()
+    key = verdict_cache_key(image_path, description, category, "+".join(chain))
+
+    if not refresh:
+        cached = cache.get(key)
+        if cached is not None:
+            ai_metrics.add("verdict_cache", {"hits": 1})
+            return tuple(cached)
+        ai_metrics.add("verdict_cache", {"misses": 1})
+
+    result = analyze_with_failover(image_path, description, category, chain)
+    if not is_transient_failure(result):
+        cache.set(key, result)
+    return result
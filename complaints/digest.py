@@ -0,0 +1,82 @@
+"""
+Daily per-ward digest for ward officers.
+
+Instead of one email per newly verified complaint, each officer gets one
+email listing their ward's verified complaints they haven't been told about
+yet, most urgent first, each with its magic resolve link. High-urgency
+complaints are still emailed immediately by the verification signal
+(settings.OFFICER_IMMEDIATE_URGENCY); both paths set
+Complaint.officer_notified_at so nothing is reported twice.
+
+The digest is built from one query across all wards, ordered by ward, and
+queued in the email outbox, so `send_outbox_emails` delivers every ward's
+digest over a single SMTP session.
+"""
+from itertools import groupby
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .models import Complaint
+from .outbox import queue_email
+
+DIGEST_STATUSES = [Complaint.Status.NEW, Complaint.Status.VERIFIED, Complaint.Status.ESCALATED]
+
+
+def pending_digest_complaints():
+    """Verified complaints not yet reported to their ward officer, grouped by ward, most urgent first."""
+    return Complaint.objects.filter(
+        officer_notified_at__isnull=True,
+        verification_count__gte=1,
+        status__in=DIGEST_STATUSES,
+        ward__officer_email__gt='',
+    ).select_related('ward').only(
+        'id', 'title', 'category', 'location_address', 'urgency_score', 'verification_count',
+        'admin_token', 'created_at', 'ward__name', 'ward__full_name', 'ward__officer_email',
+    ).order_by('ward_id', '-urgency_score', 'created_at', 'id')
+
+
+def render_digest(ward, complaints, date):
+    from .signals import resolve_link
+
+    lines = []
+    for number, complaint in enumerate(complaints, 1):
+        lines.append(
+            f"{number}. [{complaint.urgency_score}/10] #{complaint.id} {complaint.title} "
+            f"({complaint.get_category_display()}, {complaint.verification_count} verifications)\n"
+            f"   Location: {complaint.location_address or 'N/A'}\n"
+            f"   Reported: {complaint.created_at.strftime('%Y-%m-%d')}\n"
+            f"   Resolve: {resolve_link(complaint)}"
+        )
+
+    subject = f"Daily Digest: {len(complaints)} verified complaint(s) in Ward {ward.name} ({date:%Y-%m-%d})"
+    body = (
+        "Dear Assistant Municipal Commissioner,\n\n"
+        f"The following complaints in Ward {ward.name} ({ward.full_name}) were verified by the community "
+        "and are awaiting action, most urgent first:\n\n"
+        + "\n\n".join(lines)
+        + "\n\nUse each complaint's link to mark it as resolved.\n\n"
+        "Thank you,\nJan Sevak Platform\n"
+    )
+    return subject, body
+
+
+@transaction.atomic
+def queue_officer_digests(now=None):
+    """
+    Queues one digest email per ward with pending complaints.
+    Returns (digests queued, complaints covered).
+    """
+    now = now or timezone.now()
+    complaints = list(pending_digest_complaints().select_for_update(of=('self',)))
+
+    digests = 0
+    for _, ward_complaints in groupby(complaints, key=lambda complaint: complaint.ward_id):
+        ward_complaints = list(ward_complaints)
+        ward = ward_complaints[0].ward
+        subject, body = render_digest(ward, ward_complaints, now)
+        recipient = settings.EMAIL_OVERRIDE_ADDRESS or ward.officer_email
+        queue_email(subject, body, [recipient])
+        digests += 1
+
+    Complaint.objects.filter(id__in=[complaint.id for complaint in complaints]).update(officer_notified_at=now)
+    return digests, len(complaints)
@@ -4,9 +4,15 @@ from .models import Complaint
 class ComplaintFilter(django_filters.FilterSet):
     urgency_min = django_filters.NumberFilter(field_name='urgency_score', lookup_expr='gte')
     urgency_max = django_filters.NumberFilter(field_name='urgency_score', lookup_expr='lte')
-    category = django_filters.CharFilter(lookup_expr='iexact')
-    status = django_filters.CharFilter(lookup_expr='iexact')
+    verifications_min = django_filters.NumberFilter(field_name='verification_count', lookup_expr='gte')
+    # Choice values are stored upper-case, so we normalize the input and do an exact
+    # match instead of `iexact` (which wraps the column in UPPER()/LIKE and skips the index)
+    category = django_filters.CharFilter(method='filter_normalized')
+    status = django_filters.CharFilter(method='filter_normalized')
 
     class Meta:
         model = Complaint
-        fields = ['category', 'status', 'urgency_min', 'urgency_max']
+        fields = ['category', 'status', 'urgency_min', 'urgency_max', 'verifications_min']
+
+    def filter_normalized(self, queryset, name, value):
+        return queryset.filter(**{name: value.strip().upper()})
@@ -0,0 +1,353 @@
+"""
+Helpers for the map endpoints (GeoJSON and clustered tiles).
+
+Complaints are read as plain tuples with values_list().iterator() and
+encoded one feature at a time, so memory use does not grow with the table.
+"""
+import hashlib
+import json
+import math
+import time
+from datetime import datetime
+from django.core.files.storage import default_storage
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+# Columns needed to build one Feature, in the order of the tuples we get back
+FEATURE_COLUMNS = ('id', 'title', 'category', 'status', 'urgency_score', 'longitude', 'latitude', 'ward__name', 'image')
+
+# Features encoded per chunk handed to the WSGI server
+STREAM_CHUNK_SIZE = 500
+
+
+def parse_bbox(value):
+    """Parses `minLon,minLat,maxLon,maxLat` into four floats."""
+    try:
+        min_lng, min_lat, max_lng, max_lat = (float(part) for part in value.split(','))
+    except ValueError:
+        raise ValidationError({"bbox": "Expected bbox=minLon,minLat,maxLon,maxLat"})
+    if min_lng > max_lng or min_lat > max_lat:
+        raise ValidationError({"bbox": "bbox min values must be less than max values."})
+    return min_lng, min_lat, max_lng, max_lat
+
+
+def parse_since(value):
+    """Parses an ISO date or datetime; naive values are taken as UTC/project time."""
+    try:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            day = parse_date(value)
+            parsed = datetime.combine(day, datetime.min.time()) if day else None
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValidationError({"since": "Expected an ISO date or datetime."})
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def filter_map_queryset(queryset, params):
+    """
+    Applies the map filters (`bbox`, `since`) and drops complaints without
+    coordinates. Category/status/urgency are handled by ComplaintFilter.
+    """
+    queryset = queryset.filter(latitude__isnull=False, longitude__isnull=False)
+
+    if params.get('bbox'):
+        min_lng, min_lat, max_lng, max_lat = parse_bbox(params['bbox'])
+        queryset = queryset.filter(
+            latitude__gte=min_lat, latitude__lte=max_lat,
+            longitude__gte=min_lng, longitude__lte=max_lng,
+        )
+
+    if params.get('since'):
+        queryset = queryset.filter(created_at__gte=parse_since(params['since']))
+
+    return queryset
+
+
+def build_feature(row):
+    pk, title, category, status, urgency_score, longitude, latitude, ward_name, image = row
+    return {
+        "type": "Feature",
+        "geometry": {
+            "type": "Point",
+            "coordinates": [longitude, latitude]  # GeoJSON is [lon, lat]
+        },
+        "properties": {
+            "id": pk,
+            "title": title,
+            "category": category,
+            "status": status,
+            "urgency_score": urgency_score,
+            "ward_name": ward_name or "Unknown",
+            "image": default_storage.url(image) if image else None
+        }
+    }
+
+
+def encode_feature(row):
+    return json.dumps(build_feature(row))
+
+
+def iter_feature_collection(rows, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Yields a FeatureCollection as byte chunks from an iterable of
+    FEATURE_COLUMNS tuples.
+    """
+    yield b'{"type": "FeatureCollection", "features": ['
+    buffer = []
+    first = True
+    for row in rows:
+        buffer.append(encode_feature(row))
+        if len(buffer) >= chunk_size:
+            yield (('' if first else ',') + ','.join(buffer)).encode()
+            first = False
+            buffer = []
+    if buffer:
+        yield (('' if first else ',') + ','.join(buffer)).encode()
+    yield b']}'
+
+
+# --- Geohash + map tiles ----------------------------------------------------
+
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# Stored precision: 9 characters is roughly a 5m x 5m cell
+GEOHASH_PRECISION = 9
+
+# From this zoom level up, tiles return individual points instead of clusters
+POINTS_MIN_ZOOM = 16
+
+# A high-zoom tile with more points than this is clustered instead (see dense_tile_precision)
+MAX_TILE_POINTS = 500
+
+MAX_ZOOM = 20
+
+
+def encode_geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    """Standard base32 geohash of a point."""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True  # geohash interleaves bits starting with longitude
+    while len(chars) < precision:
+        if even:
+            mid = (lng_range[0] + lng_range[1]) / 2
+            if longitude >= mid:
+                bits = (bits << 1) | 1
+                lng_range[0] = mid
+            else:
+                bits <<= 1
+                lng_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if latitude >= mid:
+                bits = (bits << 1) | 1
+                lat_range[0] = mid
+            else:
+                bits <<= 1
+                lat_range[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(GEOHASH_ALPHABET[bits])
+            bits = 0
+            bit_count = 0
+    return ''.join(chars)
+
+
+def geohash_cell_size(precision):
+    """(width, height) in degrees of a geohash cell; bits alternate starting with longitude."""
+    bits = 5 * precision
+    return 360.0 / 2 ** ((bits + 1) // 2), 180.0 / 2 ** (bits // 2)
+
+
+def geohash_center(geohash):
+    """(lng, lat) of the center of a geohash cell."""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        value = GEOHASH_ALPHABET.index(char)
+        for shift in range(4, -1, -1):
+            bounds = lng_range if even else lat_range
+            # A 1 bit keeps the upper half, a 0 bit the lower half
+            bounds[1 - (value >> shift & 1)] = (bounds[0] + bounds[1]) / 2
+            even = not even
+    return (lng_range[0] + lng_range[1]) / 2, (lat_range[0] + lat_range[1]) / 2
+
+
+def tile_bounds(z, x, y):
+    """(min_lng, min_lat, max_lng, max_lat) of a Web Mercator (slippy map) tile."""
+    n = 2 ** z
+
+    def lat(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return x / n * 360.0 - 180.0, lat(y + 1), (x + 1) / n * 360.0 - 180.0, lat(y)
+
+
+def cluster_precision(z):
+    """
+    Geohash prefix length used to cluster a tile at zoom `z`, chosen so a
+    tile holds roughly 8-32 cells across (z=10 -> 5 chars/~5km, z=12 -> 6/~1km).
+    """
+    return max(1, min(GEOHASH_PRECISION, (z + 1) // 2))
+
+
+def dense_tile_precision(z):
+    """
+    Geohash prefix length for a high-zoom tile with too many points to list:
+    at most ~8x8 cells per tile (z=16 -> 7 chars/~150m, z=20 -> 9/~5m), so
+    the number of clusters stays bounded however dense the tile is.
+    """
+    return max(1, min(GEOHASH_PRECISION, z // 2 - 1))
+
+
+def build_tile(queryset, z, x, y):
+    """
+    Aggregates the complaints inside one tile.
+
+    Low zooms return clusters (one per geohash cell) with counts by category
+    and status; high zooms return the individual points as GeoJSON Features
+    (same shape as the geojson endpoint). Either way the
+    payload size is bounded by the tile, not by the table.
+
+    A geohash cell belongs to the one tile holding its center, with all of its
+    complaints, so a cell on a tile edge is never returned by two tiles. High
+    zoom points follow their cell (dense_tile_precision) the same way.
+    """
+    from django.db.models.functions import Substr
+
+    bounds = tile_bounds(z, x, y)
+    queryset = queryset.order_by()
+    tile = {"z": z, "x": x, "y": y, "clusters": [], "points": []}
+
+    if z < POINTS_MIN_ZOOM:
+        tile["clusters"] = _clusters(queryset, cluster_precision(z), bounds)
+        return tile
+
+    precision = dense_tile_precision(z)
+    clusters = _clusters(queryset, precision, bounds)
+    if sum(cluster["count"] for cluster in clusters) > MAX_TILE_POINTS:
+        tile["clusters"] = clusters
+    elif clusters:
+        rows = (
+            _around(queryset, precision, bounds)
+            .annotate(cell=Substr('geohash', 1, precision))
+            .filter(cell__in=[cluster["geohash"] for cluster in clusters])
+            .values_list(*FEATURE_COLUMNS)
+        )
+        tile["points"] = [build_feature(row) for row in rows]
+    return tile
+
+
+def _around(queryset, precision, bounds):
+    """Complaints of every cell that may be centered in `bounds` (such a cell reaches half a cell past it)."""
+    min_lng, min_lat, max_lng, max_lat = bounds
+    width, height = geohash_cell_size(precision)
+    return queryset.filter(
+        geohash__isnull=False,
+        latitude__gte=min_lat - height / 2, latitude__lt=max_lat + height / 2,
+        longitude__gte=min_lng - width / 2, longitude__lt=max_lng + width / 2,
+    )
+
+
+def _owns(bounds, cell):
+    min_lng, min_lat, max_lng, max_lat = bounds
+    lng, lat = geohash_center(cell)
+    return min_lng <= lng < max_lng and min_lat <= lat < max_lat
+
+
+def _clusters(queryset, precision, bounds):
+    from django.db.models import Avg, Count
+    from django.db.models.functions import Substr
+
+    # One GROUP BY over (cell, category, status); folded into one entry per cell below
+    rows = (
+        _around(queryset, precision, bounds)
+        .annotate(cell=Substr('geohash', 1, precision))
+        .values('cell', 'category', 'status')
+        .annotate(count=Count('id'), lat=Avg('latitude'), lng=Avg('longitude'))
+    )
+
+    cells = {}
+    for row in rows:
+        if not _owns(bounds, row['cell']):
+            continue  # centered in a neighbouring tile, which returns it
+        cell = cells.setdefault(row['cell'], {
+            "geohash": row['cell'], "count": 0, "lat": 0.0, "lng": 0.0,
+            "categories": {}, "statuses": {},
+        })
+        count = row['count']
+        # Running count-weighted centroid of the cell
+        cell["lat"] += (row['lat'] - cell["lat"]) * count / (cell["count"] + count)
+        cell["lng"] += (row['lng'] - cell["lng"]) * count / (cell["count"] + count)
+        cell["count"] += count
+        cell["categories"][row['category']] = cell["categories"].get(row['category'], 0) + count
+        cell["statuses"][row['status']] = cell["statuses"].get(row['status'], 0) + count
+    return list(cells.values())
+
+
+# Map caches (tiles and the GeoJSON snapshot) share one version stamp.
+# Instead of deleting every cached entry when a complaint changes, the Complaint
+# save/delete dispatchers (complaints/signals.py) bump the stamp; entries built
+# for an older stamp are simply ignored and expire. Reading it is a cache get,
+# no ORM work. The stamp lives in the 'default' cache, so processes see each
+# other's changes only when that cache is shared (see CACHES in settings).
+MAP_VERSION_KEY = 'complaint_map_version'
+TILE_CACHE_SECONDS = 300
+GEOJSON_SNAPSHOT_KEY = 'complaint_geojson_snapshot'
+GEOJSON_SNAPSHOT_SECONDS = 3600
+
+
+def map_version():
+    from django.core.cache import cache
+    return cache.get_or_set(MAP_VERSION_KEY, time.time_ns, None)
+
+
+def invalidate_map():
+    from django.core.cache import cache
+    cache.set(MAP_VERSION_KEY, time.time_ns(), None)
+
+
+def get_tile(queryset, z, x, y):
+    from django.core.cache import cache
+    key = f"complaint_tile:{map_version()}:{z}:{x}:{y}"
+    tile = cache.get(key)
+    if tile is None:
+        tile = build_tile(queryset, z, x, y)
+        cache.set(key, tile, TILE_CACHE_SECONDS)
+    return tile
+
+
+def get_geojson_snapshot(queryset):
+    """
+    Returns (etag, body) for the unfiltered FeatureCollection.
+
+    The pre-encoded bytes are cached next to their strong ETag, so a repeat
+    map load is a single cache round trip (get_many) and no ORM work. The
+    snapshot is rebuilt on the first request after any complaint change.
+    """
+    from django.core.cache import cache
+
+    cached = cache.get_many([MAP_VERSION_KEY, GEOJSON_SNAPSHOT_KEY])
+    version = cached.get(MAP_VERSION_KEY)
+    snapshot = cached.get(GEOJSON_SNAPSHOT_KEY)
+    if version is not None and snapshot is not None and snapshot[0] == version:
+        return snapshot[1], snapshot[2]
+
+    if version is None:
+        version = map_version()
+    # The version is read BEFORE building: if a complaint changes meanwhile, the
+    # stamp moves on and this (possibly stale) snapshot is never served.
+    rows = queryset.order_by('id').values_list(*FEATURE_COLUMNS).iterator(chunk_size=2000)
+    body = b''.join(iter_feature_collection(rows))
+    etag = '"%s"' % hashlib.sha1(body).hexdigest()
+    cache.set(GEOJSON_SNAPSHOT_KEY, (version, etag, body), GEOJSON_SNAPSHOT_SECONDS)
+    return etag, body
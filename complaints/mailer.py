@@ -0,0 +1,118 @@
+"""
+Batched email delivery over reused SMTP sessions.
+
+Django's send_mail() opens a connection per call: TCP + SSL handshake + AUTH
+LOGIN before a single message, then QUIT. Against the GoDaddy server on port
+465 that costs far more than the message itself. A MailSession keeps one
+authenticated connection for a whole batch, sends up to
+EMAIL_MAX_MESSAGES_PER_SESSION messages over it (servers drop or throttle
+long sessions), and reconnects only when the server hangs up.
+
+Batch code opens a session with `with mailer.batch():`; send_mail() below has
+Django's signature and uses the active batch session, falling back to a
+one-off connection outside a batch.
+"""
+import smtplib
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+
+# Errors after which the message is worth retrying on a fresh connection.
+# 421 is "service not available, closing transmission channel".
+RECONNECT_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+RECONNECT_CODES = (421,)
+
+_active_session = ContextVar('mail_session', default=None)
+
+
+def _needs_reconnect(error):
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code in RECONNECT_CODES
+    return isinstance(error, RECONNECT_ERRORS)
+
+
+class MailSession:
+    """One SMTP connection reused for many messages; see the module docstring."""
+
+    def __init__(self, max_messages=None, connection=None):
+        self.max_messages = max_messages or settings.EMAIL_MAX_MESSAGES_PER_SESSION
+        self.connection = connection
+        self.sent_in_session = 0
+        self.sessions = 0
+        self.sent = 0
+
+    def open(self):
+        if self.connection is None:
+            self.connection = get_connection(fail_silently=False)
+        # open() is a no-op when the connection is already open
+        if self.connection.open():
+            self.sessions += 1
+            self.sent_in_session = 0
+
+    def close(self):
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            finally:
+                self.sent_in_session = 0
+
+    def send(self, message):
+        """Sends an EmailMessage; raises if it can't be delivered even after one reconnect."""
+        if self.sent_in_session >= self.max_messages:
+            self.close()
+        try:
+            self._send(message)
+        except Exception as e:
+            if not _needs_reconnect(e):
+                raise
+            print(f"SMTP session lost ({e}), reconnecting...")
+            self.close()
+            self._send(message)
+        self.sent += 1
+        self.sent_in_session += 1
+
+    def _send(self, message):
+        self.open()
+        message.connection = self.connection
+        self.connection.send_messages([message])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+@contextmanager
+def batch(max_messages=None):
+    """Routes every send_mail()/send_message() in the block through one MailSession."""
+    session = _active_session.get()
+    if session is not None:
+        # Already inside a batch: keep using its connection
+        yield session
+        return
+    with MailSession(max_messages) as session:
+        token = _active_session.set(session)
+        try:
+            yield session
+        finally:
+            _active_session.reset(token)
+
+
+def send_message(message):
+    session = _active_session.get()
+    if session is None:
+        return message.send(fail_silently=False)
+    session.send(message)
+    return 1
+
+
+def send_mail(subject, message, from_email, recipient_list, fail_silently=False):
+    """django.core.mail.send_mail(), over the active batch session if there is one."""
+    try:
+        return send_message(EmailMessage(subject, message, from_email, recipient_list))
+    except Exception:
+        if fail_silently:
+            return 0
+        raise
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from complaints import ai_metrics
+
+class Command(BaseCommand):
+    help = 'Prints p50/p95/p99 latency, outcomes and token usage of AI provider calls per provider'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Clear the counters after printing')
+
+    def handle(self, *args, **options):
+        metrics = ai_metrics.all_metrics()
+        self.stdout.write("📊 AI provider calls")
+        self.stdout.write(
+            f"  {'provider':<10} {'model':<18} {'calls':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+            f"{'errors':>7} {'parse':>6} {'tokens in/out':>15} {'avg image':>10}"
+        )
+
+        for row in metrics['providers']:
+            if not row['calls']:
+                continue
+            latency = row['latency_ms']
+            outcomes = row['outcomes']
+            errors = outcomes['unavailable'] + outcomes['exception'] + outcomes['not_configured']
+            image = f"{row['image_bytes']['avg'] / 1024:.0f} KB" if row['image_bytes']['avg'] else '-'
+            tokens = f"{row['tokens']['prompt']}/{row['tokens']['completion']}"
+            model = ', '.join(row['models']) or row['model'] or '-'
+            self.stdout.write(
+                f"  {row['provider']:<10} {model:<18} {row['calls']:>6} "
+                f"{latency['p50']:>8.0f} {latency['p95']:>8.0f} {latency['p99']:>8.0f} "
+                f"{errors:>7} {row['parse_failures']:>6} {tokens:>15} {image:>10}"
+            )
+
+        cache = metrics['verdict_cache']
+        self.stdout.write(f"  Verdict cache: {cache['hits']} hits, {cache['misses']} misses ({cache['hit_rate']:.0%})")
+        saved = sum(metrics['prefilter'].values())
+        self.stdout.write(f"  Pre-filter: {saved} decided locally {metrics['prefilter']}")
+
+        if options['reset']:
+            ai_metrics.reset()
+            self.stdout.write(self.style.SUCCESS("✅ Counters reset."))
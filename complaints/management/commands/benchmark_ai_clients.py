@@ -0,0 +1,97 @@
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+from django.core.management.base import BaseCommand
+from complaints import ai_service
+
+VERDICT = json.dumps({
+    "is_safe": True, "is_civic_issue": True, "rejection_reason": None,
+    "urgency_score": 6, "category_matches": True,
+})
+
+
+class FakeChatCompletions(BaseHTTPRequestHandler):
+    """Answers /chat/completions like the OpenAI API does, instantly."""
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real API
+    disable_nagle_algorithm = True
+    connections = 0
+
+    def setup(self):
+        super().setup()
+        type(self).connections += 1
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        body = json.dumps({
+            "id": "bench", "object": "chat.completion", "created": 0, "model": "gpt-4o-mini",
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": VERDICT}}],
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = 'Measures per-call overhead of AI provider clients with and without connection reuse (local fake API, no network)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--calls', type=int, default=200, help='analyze() calls per scenario')
+
+    def handle(self, *args, **options):
+        calls = options['calls']
+        server = ThreadingHTTPServer(('127.0.0.1', 0), FakeChatCompletions)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+        self.stdout.write(f"⏱️  {calls} OpenAIProvider.analyze() calls against a local fake API...")
+        env = {"OPENAI_API_KEY": "benchmark", "OPENAI_BASE_URL": base_url, "AI_PROVIDER": "openai"}
+        # The providers print debug output on every call; keep the report readable
+        with patch.dict(os.environ, env), patch('builtins.print'):
+            ai_service.reset_providers()
+            results = [
+                # Old behaviour: a new provider (new client, new connection) per complaint
+                ("new client per call", lambda: ai_service.OpenAIProvider()),
+                # Registry: one client per process, connections kept alive
+                ("shared client (registry)", lambda: ai_service.get_provider()),
+            ]
+            rows = [(label, *self.run_scenario(factory, calls)) for label, factory in results]
+            ai_service.reset_providers()
+
+        server.shutdown()
+        server.server_close()
+
+        for label, per_call_ms, setup_ms, connections in rows:
+            self.stdout.write(
+                f"  {label:<26} {per_call_ms:7.2f} ms/call (client setup {setup_ms:5.2f} ms)  "
+                f"{connections:4d} new TCP connections"
+            )
+        saved = rows[0][1] - rows[1][1]
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Reuse saves {saved:.2f} ms per call locally. Against the real API every new "
+            f"connection also pays DNS + a TLS handshake (typically 50-300 ms)."
+        ))
+
+    def run_scenario(self, factory, calls):
+        # One warm-up call so imports and the first connection are not counted
+        factory().analyze(None, "Warm-up", "OTHERS")
+        FakeChatCompletions.connections = 0
+
+        setup = 0.0
+        start = time.perf_counter()
+        for i in range(calls):
+            setup_start = time.perf_counter()
+            provider = factory()
+            setup += time.perf_counter() - setup_start
+            result = provider.analyze(None, f"Pothole near stop {i}", "POTHOLE")
+            assert result[0], result
+        elapsed = time.perf_counter() - start
+        return elapsed / calls * 1000, setup / calls * 1000, FakeChatCompletions.connections
@@ -0,0 +1,115 @@
+import io
+import os
+import shutil
+import tempfile
+import time
+from unittest.mock import patch
+from django.contrib.auth.models import User
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from complaints.models import Ward
+from complaints.moderation import moderate, moderate_upload
+from complaints.serializers import ComplaintSerializer
+
+VERDICTS = {
+    "accepted": (True, None, 6, True),
+    "rejected": (False, "Not a civic issue", 0, False),
+}
+
+
+class Command(BaseCommand):
+    help = 'Compares database writes and storage I/O per submission: save-then-moderate vs moderate-then-save (fake AI verdicts, rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--submissions', type=int, default=50, help='Submissions per scenario')
+
+    def handle(self, *args, **options):
+        submissions = options['submissions']
+        photo = self.make_photo()
+        media_root = tempfile.mkdtemp(prefix='jansevak-bench-')
+        self.stdout.write(
+            f"⏱️  {submissions} submissions per scenario with a {len(photo) // 1024} KB photo "
+            f"(temporary MEDIA_ROOT, everything rolled back)..."
+        )
+
+        rows = []
+        try:
+            with override_settings(MEDIA_ROOT=media_root, EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend'), \
+                    patch('builtins.print'):
+                for outcome, verdict in VERDICTS.items():
+                    for label, flow in (("save, then moderate", self.save_then_moderate),
+                                        ("moderate, then save", self.moderate_then_save)):
+                        rows.append((outcome, label, *self.run_scenario(flow, verdict, photo, submissions)))
+        finally:
+            shutil.rmtree(media_root, ignore_errors=True)
+
+        self.stdout.write(f"  {'':9} {'flow':<20} {'DB writes':>9} {'files written':>13} {'KB written':>10} {'files deleted':>13} {'ms':>7}")
+        for outcome, label, writes, saved, written, deleted, ms in rows:
+            self.stdout.write(
+                f"  {outcome:<9} {label:<20} {writes:9.1f} {saved:13.1f} {written / 1024:10.1f} {deleted:13.1f} {ms:7.2f}"
+            )
+        self.stdout.write(self.style.SUCCESS(
+            "✅ Per submission. Against S3 each file written or deleted is a billed request with network latency."
+        ))
+
+    def make_photo(self):
+        from PIL import Image
+        buffer = io.BytesIO()
+        Image.radial_gradient('L').convert('RGB').resize((2000, 1500)).save(buffer, 'JPEG', quality=90)
+        return buffer.getvalue()
+
+    def save_then_moderate(self, serializer, user):
+        # Previous behaviour: store the row and the file, then score or delete them
+        complaint = serializer.save(reporter=user)
+        moderate(complaint)
+
+    def moderate_then_save(self, serializer, user):
+        accepted, _, fields = moderate_upload(serializer.validated_data)
+        if accepted:
+            serializer.save(reporter=user, **fields)
+
+    def run_scenario(self, flow, verdict, photo, submissions):
+        counts = {"saved": 0, "written": 0, "deleted": 0}
+        original_save, original_remove = FileSystemStorage._save, os.remove
+
+        def counting_save(storage, name, content):
+            counts["saved"] += 1
+            counts["written"] += content.size
+            return original_save(storage, name, content)
+
+        def counting_remove(path, *args, **kwargs):
+            counts["deleted"] += 1
+            return original_remove(path, *args, **kwargs)
+
+        with transaction.atomic():
+            user = User.objects.create(username='upload-benchmark')
+            ward = Ward.objects.create(name='BENCH', full_name='Benchmark Ward', officer_email='')
+
+            with patch('complaints.ai_service.analyze_complaint', return_value=verdict), \
+                    patch.object(FileSystemStorage, '_save', counting_save), \
+                    patch('os.remove', counting_remove), \
+                    CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                for i in range(submissions):
+                    serializer = ComplaintSerializer(data={
+                        "title": f"Benchmark {i}", "description": "Garbage pile near the bus stop",
+                        "category": "GARBAGE", "ward": ward.id,
+                        "image": SimpleUploadedFile(f"photo{i}.jpg", photo, content_type="image/jpeg"),
+                    }, context={})
+                    serializer.is_valid(raise_exception=True)
+                    flow(serializer, user)
+                elapsed = time.perf_counter() - start
+
+            transaction.set_rollback(True)
+
+        writes = sum(1 for q in queries.captured_queries if q['sql'].split()[0] in ('INSERT', 'UPDATE', 'DELETE'))
+        return (
+            writes / submissions,
+            counts["saved"] / submissions,
+            counts["written"] / submissions,
+            counts["deleted"] / submissions,
+            elapsed / submissions * 1000,
+        )
@@ -0,0 +1,139 @@
+from contextlib import contextmanager, nullcontext
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIClient
+from complaints import side_effects, signals
+from complaints.models import Complaint, OutboundEmail, UserProfile, Verification, Ward
+
+
+# The receivers as they were before the per-model dispatchers: each one works
+# out on its own whether it has anything to do and loads what it needs.
+def legacy_award_points_resolution(sender, instance, created, **kwargs):
+    if (instance.entered_status(Complaint.Status.RESOLVED) and instance.reporter_id
+            and side_effects.claim(instance, side_effects.RESOLUTION_POINTS)):
+        if not UserProfile.objects.filter(user_id=instance.reporter_id).update(points=F('points') + 50):
+            UserProfile.objects.create(user_id=instance.reporter_id, points=50)
+
+def legacy_award_points_verification(sender, instance, created, **kwargs):
+    if created:
+        profile, _ = UserProfile.objects.get_or_create(user=instance.user)
+        profile.points += 10
+        profile.save()
+
+def legacy_increment_verification_count(sender, instance, created, **kwargs):
+    if created:
+        Complaint.objects.filter(pk=instance.complaint_id).update(verification_count=F('verification_count') + 1)
+
+def legacy_check_verification_threshold(sender, instance, created, **kwargs):
+    if created:
+        complaint = instance.complaint
+        complaint.refresh_from_db(fields=['verification_count'])
+        if complaint.verification_count == 1:
+            if settings.OFFICER_EMAIL_DIGEST and complaint.urgency_score < settings.OFFICER_IMMEDIATE_URGENCY:
+                return
+            signals.send_complaint_email(complaint)
+
+def legacy_notify_citizen_resolution(sender, instance, created, **kwargs):
+    if not (instance.entered_status(Complaint.Status.RESOLVED) and instance.reporter_id):
+        return
+    occurrence = side_effects.resolution_number(instance)
+    if side_effects.claim(instance, side_effects.RESOLUTION_EMAIL, occurrence):
+        signals.send_resolution_email(instance)
+
+def legacy_invalidate_map_caches(sender, instance, **kwargs):
+    from complaints.geo import invalidate_map
+    invalidate_map()
+
+def legacy_record_left_resolved(sender, instance, created, **kwargs):
+    if instance._previous_status == Complaint.Status.RESOLVED and instance.status != Complaint.Status.RESOLVED:
+        side_effects.claim(instance, side_effects.LEFT_RESOLVED, side_effects.resolution_number(instance))
+
+def legacy_reset_status_snapshot(sender, instance, **kwargs):
+    instance._loaded_status = instance._previous_status = instance.status
+
+LEGACY_RECEIVERS = [
+    (post_save, Complaint, legacy_award_points_resolution),
+    (post_save, Verification, legacy_award_points_verification),
+    (post_save, Verification, legacy_increment_verification_count),
+    (post_save, Verification, legacy_check_verification_threshold),
+    (post_save, Complaint, legacy_notify_citizen_resolution),
+    (post_save, Complaint, legacy_invalidate_map_caches),
+    (post_delete, Complaint, legacy_invalidate_map_caches),
+    (post_save, Complaint, legacy_record_left_resolved),
+    (post_save, Complaint, legacy_reset_status_snapshot),
+]
+
+DISPATCHERS = [
+    (post_save, Complaint, signals.complaint_saved),
+    (post_delete, Complaint, signals.complaint_deleted),
+    (post_save, Verification, signals.verification_saved),
+    (post_delete, Verification, signals.verification_deleted),
+]
+
+
+@contextmanager
+def legacy_receivers():
+    for signal, sender, receiver in DISPATCHERS:
+        signal.disconnect(receiver, sender=sender)
+    for signal, sender, receiver in LEGACY_RECEIVERS:
+        signal.connect(receiver, sender=sender, weak=False)
+    try:
+        yield
+    finally:
+        for signal, sender, receiver in LEGACY_RECEIVERS:
+            signal.disconnect(receiver, sender=sender)
+        for signal, sender, receiver in DISPATCHERS:
+            signal.connect(receiver, sender=sender)
+
+
+class Command(BaseCommand):
+    help = 'Counts SQL queries of a verify, resolve and confirm call with the old per-receiver signals vs the per-model dispatchers (rolled back)'
+
+    def handle(self, *args, **options):
+        self.stdout.write("⏱️  Queries per call, side effects included (everything is rolled back)...")
+        rows = []
+        with override_settings(ALLOWED_HOSTS=['*'], OFFICER_EMAIL_DIGEST=False, EMAIL_OVERRIDE_ADDRESS=None):
+            for label, receivers in (("per-receiver signals", legacy_receivers), ("per-model dispatcher", nullcontext)):
+                with receivers():
+                    rows.append((label, self.measure()))
+
+        self.stdout.write(f"  {'':22} {'verify':>7} {'resolve':>8} {'confirm':>8}  emails")
+        for label, (verify, resolve, confirm, emails) in rows:
+            self.stdout.write(f"  {label:<22} {verify:7d} {resolve:8d} {confirm:8d}  {emails:6d}")
+        self.stdout.write(self.style.SUCCESS(
+            "✅ Savepoints not counted. Both pipelines write points, ledger and emails in the request's transaction."
+        ))
+
+    def measure(self):
+        with transaction.atomic():
+            ward = Ward.objects.create(name='BENCH', full_name='Benchmark Ward', officer_email='bench@mcgm.gov.in')
+            reporter = User.objects.create(username='signal-benchmark-reporter')
+            voter = User.objects.create(username='signal-benchmark-voter')
+            complaint = Complaint.objects.create(
+                title="Benchmark pothole", description="Deep pothole", category="POTHOLE",
+                ward=ward, reporter=reporter, urgency_score=9,
+            )
+            client = APIClient()
+
+            def count(call):
+                with CaptureQueriesContext(connection) as queries:
+                    response = call()
+                assert response.status_code == 200, response.content
+                # SAVEPOINT/RELEASE are transaction control: after a real commit they are BEGIN/COMMIT
+                return sum(1 for query in queries.captured_queries
+                           if not query['sql'].startswith(('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')))
+
+            client.force_authenticate(user=voter)
+            verify = count(lambda: client.post(f'/api/complaints/{complaint.id}/verify/'))
+            resolve = count(lambda: client.get(f'/api/resolve/{complaint.id}/{complaint.admin_token}/'))
+            client.force_authenticate(user=reporter)
+            confirm = count(lambda: client.post(f'/api/complaints/{complaint.id}/confirm_resolution/'))
+            emails = OutboundEmail.objects.filter(complaint=complaint).count()
+
+            transaction.set_rollback(True)
+        return verify, resolve, confirm, emails
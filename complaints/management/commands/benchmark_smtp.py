@@ -0,0 +1,143 @@
+import socketserver
+import threading
+import time
+from django.core.mail import EmailMessage
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from complaints import mailer
+
+
+class FakeSMTPHandler(socketserver.StreamRequestHandler):
+    """
+    Just enough SMTP (EHLO, AUTH, MAIL/RCPT/DATA, RSET, QUIT) for smtplib.
+    `server.handshake_delay` is slept before the greeting and the AUTH reply,
+    standing in for the TLS handshake and login of a remote server.
+    """
+    disable_nagle_algorithm = True
+
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        time.sleep(server.handshake_delay)
+        self.reply("220 fake.smtp ESMTP ready")
+        in_session = 0
+
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors="replace").strip().upper()
+            if command.startswith(("EHLO", "HELO")):
+                self.wfile.write(b"250-fake.smtp\r\n250-AUTH PLAIN LOGIN\r\n250 8BITMIME\r\n")
+            elif command.startswith("AUTH"):
+                time.sleep(server.handshake_delay)
+                with server.lock:
+                    server.logins += 1
+                self.reply("235 Authentication successful")
+            elif command.startswith(("MAIL", "RCPT", "RSET", "NOOP")):
+                self.reply("250 OK")
+            elif command == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                while self.rfile.readline() not in (b".\r\n", b""):
+                    pass
+                in_session += 1
+                with server.lock:
+                    server.messages += 1
+                self.reply("250 Queued")
+                if server.drop_after and in_session >= server.drop_after:
+                    # Like a server enforcing a per-session limit by hanging up
+                    return
+            elif command == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class FakeSMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, handshake_delay=0.0, drop_after=None):
+        super().__init__(('127.0.0.1', 0), FakeSMTPHandler)
+        self.handshake_delay = handshake_delay
+        self.drop_after = drop_after
+        self.lock = threading.Lock()
+        self.connections = self.logins = self.messages = 0
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def email_settings(self):
+        return override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+            EMAIL_HOST='127.0.0.1', EMAIL_PORT=self.port, EMAIL_USE_SSL=False, EMAIL_USE_TLS=False,
+            EMAIL_HOST_USER='benchmark@jansevak.local', EMAIL_HOST_PASSWORD='benchmark',
+        )
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class Command(BaseCommand):
+    help = 'Measures email throughput with a new SMTP connection per message vs one reused session (local fake server, no network)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=300, help='Messages per scenario (e.g. one escalation run)')
+        parser.add_argument('--handshake-ms', type=float, default=150.0,
+                            help='Delay of the fake server before its greeting and AUTH reply, like SSL + login to a remote host')
+        parser.add_argument('--per-session', type=int, default=50, help='Message cap per reused session')
+
+    def handle(self, *args, **options):
+        messages = options['messages']
+        delay = options['handshake_ms'] / 1000
+        self.stdout.write(
+            f"⏱️  {messages} messages against a local fake SMTP server "
+            f"({options['handshake_ms']:.0f} ms per handshake and per login)..."
+        )
+
+        rows = []
+        for label, scenario in (
+            ("new connection per message", self.one_connection_per_message),
+            (f"reused session (cap {options['per_session']})", lambda n: self.reused_session(n, options['per_session'])),
+        ):
+            server = FakeSMTPServer(handshake_delay=delay)
+            try:
+                with server.email_settings():
+                    start = time.perf_counter()
+                    scenario(messages)
+                    elapsed = time.perf_counter() - start
+            finally:
+                server.stop()
+            rows.append((label, elapsed, server.connections, server.logins, server.messages))
+
+        for label, elapsed, connections, logins, delivered in rows:
+            self.stdout.write(
+                f"  {label:<30} {delivered / elapsed:8.1f} msg/s  {elapsed:7.2f} s total  "
+                f"{connections:4d} connections  {logins:4d} logins"
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Session reuse is {rows[0][1] / rows[1][1]:.1f}x faster for {messages} messages."
+        ))
+
+    def message(self, i):
+        return EmailMessage(f"[ESCALATION LEVEL 1] Benchmark #{i}", "Please intervene immediately.",
+                            'benchmark@jansevak.local', ['amc.city@mcgm.gov.in'])
+
+    def one_connection_per_message(self, messages):
+        # What send_mail() did for every notification and escalation
+        for i in range(messages):
+            self.message(i).send(fail_silently=False)
+
+    def reused_session(self, messages, per_session):
+        with mailer.batch(max_messages=per_session):
+            for i in range(messages):
+                mailer.send_message(self.message(i))
+
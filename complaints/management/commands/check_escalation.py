@@ -2,8 +2,8 @@ from django.core.management.base import BaseCommand
 from django.utils import timezone
 from datetime import timedelta
 from complaints.models import Complaint
-from django.core.mail import send_mail
 from django.conf import settings
+from complaints import mailer
 
 class Command(BaseCommand):
     help = 'Checks for high urgency complaints that need escalation'
@@ -11,23 +11,31 @@ class Command(BaseCommand):
     def handle(self, *args, **options):
         self.stdout.write("🔍 Checking for complaints to escalate...")
         
+        complaints_to_escalate = self.get_candidates()
+        
+        count = 0
+        # OPTIMIZATION: One SMTP login for the whole run instead of one per complaint
+        with mailer.batch() as session:
+            for complaint in complaints_to_escalate:
+                self.escalate_complaint(complaint)
+                count += 1
+        if session.sessions:
+            self.stdout.write(f"📧 {session.sent} emails over {session.sessions} SMTP session(s)")
+            
+        self.stdout.write(self.style.SUCCESS(f"✅ Escalated {count} complaints."))
+
+    def get_candidates(self):
         # Criteria: Urgency >= 8, Status NOT Resolved, Created > 24 hours ago
         threshold_time = timezone.now() - timedelta(hours=24)
         
         # Find complaints that need escalation (Level 0 -> 1)
-        complaints_to_escalate = Complaint.objects.filter(
+        # Served by the partial index complaint_escalation_idx
+        return Complaint.objects.filter(
             urgency_score__gte=8,
             status__in=[Complaint.Status.NEW, Complaint.Status.VERIFIED, Complaint.Status.ESCALATED],
             created_at__lte=threshold_time,
             escalation_level=0
         )
-        
-        count = 0
-        for complaint in complaints_to_escalate:
-            self.escalate_complaint(complaint)
-            count += 1
-            
-        self.stdout.write(self.style.SUCCESS(f"✅ Escalated {count} complaints."))
 
     def escalate_complaint(self, complaint):
         # 1. Update Level
@@ -66,7 +74,7 @@ class Command(BaseCommand):
                 # For now, we default to AMC City, but logic could be smarter based on Ward location
                 recipient_list = [settings.SENIOR_OFFICIALS['AMC_CITY']]
 
-            send_mail(
+            mailer.send_mail(
                 subject,
                 message,
                 settings.EMAIL_HOST_USER,
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from complaints.search import install_search_index
+
+class Command(BaseCommand):
+    help = 'Re-creates the complaint full-text search index (triggers + backfill)'
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"🔎 Rebuilding search index on {connection.vendor}...")
+
+        if connection.vendor not in ('postgresql', 'sqlite'):
+            self.stdout.write(self.style.WARNING("⚠️  No full-text backend for this database, search uses icontains."))
+            return
+
+        with transaction.atomic():
+            install_search_index(connection)
+
+        self.stdout.write(self.style.SUCCESS("✅ Search index rebuilt."))
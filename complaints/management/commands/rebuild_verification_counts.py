@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from complaints.models import Complaint, Verification
+
+class Command(BaseCommand):
+    help = 'Rebuilds the denormalized Complaint.verification_count column from the Verification table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Complaints processed per batch')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        self.stdout.write("🔢 Rebuilding verification counts...")
+
+        # COUNT(*) of each complaint's verifications, evaluated by the database row by row
+        actual = Coalesce(Subquery(
+            Verification.objects.filter(complaint=OuterRef('pk'))
+            .order_by().values('complaint').annotate(total=Count('id')).values('total'),
+            output_field=IntegerField(),
+        ), Value(0))
+
+        # Walk the table in primary key order so each batch is an index range scan
+        # and memory stays flat no matter how many complaints exist.
+        last_id = 0
+        checked = 0
+        fixed = 0
+        while True:
+            ids = list(Complaint.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:chunk_size])
+            if not ids:
+                break
+
+            # OPTIMIZATION: One UPDATE ... SET verification_count = (SELECT COUNT(*) ...) per chunk.
+            # Counting and writing in the same statement means an F() increment from a
+            # concurrent upvote can't be overwritten by a count read a moment earlier.
+            fixed += (
+                Complaint.objects.filter(pk__gt=last_id, pk__lte=ids[-1])
+                .exclude(verification_count=actual)
+                .update(verification_count=actual)
+            )
+            checked += len(ids)
+            last_id = ids[-1]
+
+        self.stdout.write(self.style.SUCCESS(f"✅ Checked {checked} complaints, corrected {fixed} counters."))
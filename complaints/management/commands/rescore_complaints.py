@@ -0,0 +1,135 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from complaints import ai_service
+from complaints.geo import invalidate_map
+from complaints.models import Complaint
+
+DEFAULT_CHECKPOINT = os.path.join(settings.BASE_DIR, '.rescore_checkpoint.json')
+
+class Command(BaseCommand):
+    help = 'Re-runs the AI on existing complaints to recompute urgency_score and ai_verified_category (e.g. after a prompt or model change)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=100, help='Complaints read, scored and written per batch')
+        parser.add_argument('--workers', type=int, default=4, help='Concurrent AI calls')
+        parser.add_argument('--rpm', type=int, default=60, help='Requests per minute allowed per provider (0 = unlimited)')
+        parser.add_argument('--checkpoint', default=DEFAULT_CHECKPOINT, help='File recording progress, used to resume')
+        parser.add_argument('--restart', action='store_true', help='Ignore an existing checkpoint and start from the first complaint')
+        parser.add_argument('--limit', type=int, default=None, help='Stop after this many complaints')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        workers = options['workers']
+        checkpoint_path = options['checkpoint']
+        if workers < 1 or chunk_size < 1:
+            raise CommandError("--workers and --chunk-size must be at least 1")
+
+        progress = {"last_id": 0, "processed": 0, "updated": 0, "flagged": 0, "failed_ids": []}
+        if not options['restart'] and os.path.exists(checkpoint_path):
+            with open(checkpoint_path) as f:
+                progress.update(json.load(f))
+            self.stdout.write(f"↩️  Resuming after complaint #{progress['last_id']} ({progress['processed']} already done)")
+
+        chain = ai_service.provider_chain()
+        for name in chain:
+            ai_service.set_rate_limit(name, options['rpm'])
+        self.stdout.write(
+            f"🧠 Re-scoring complaints with {' -> '.join(chain)} "
+            f"({workers} workers, {options['rpm'] or 'unlimited'} req/min per provider)..."
+        )
+
+        # Complaints still waiting for moderation belong to run_moderation_worker
+        base = Complaint.objects.exclude(status=Complaint.Status.PENDING).order_by('pk').only(
+            'id', 'image', 'description', 'category', 'urgency_score', 'ai_verified_category', 'updated_at'
+        )
+
+        started = time.monotonic()
+        done_this_run = 0
+        try:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='rescore') as pool:
+                while options['limit'] is None or done_this_run < options['limit']:
+                    size = chunk_size if options['limit'] is None else min(chunk_size, options['limit'] - done_this_run)
+                    complaints = list(base.filter(pk__gt=progress['last_id'])[:size])
+                    if not complaints:
+                        break
+
+                    chunk_started = time.monotonic()
+                    verdicts = pool.map(self.score, complaints)
+
+                    changed = []
+                    now = timezone.now()
+                    for complaint, verdict in zip(complaints, verdicts):
+                        if verdict is None or ai_service.is_transient_failure(verdict):
+                            progress['failed_ids'].append(complaint.id)
+                            continue
+                        is_valid, _, score, verified = verdict
+                        if not is_valid:
+                            # Existing complaints are never deleted or zeroed here, just reported
+                            progress['flagged'] += 1
+                            continue
+                        if (complaint.urgency_score, complaint.ai_verified_category) != (score, verified):
+                            complaint.urgency_score = score
+                            complaint.ai_verified_category = verified
+                            # bulk_update skips auto_now
+                            complaint.updated_at = now
+                            changed.append(complaint)
+
+                    if changed:
+                        with transaction.atomic():
+                            Complaint.objects.bulk_update(changed, ['urgency_score', 'ai_verified_category', 'updated_at'])
+                        # bulk_update sends no post_save, so refresh the map caches (they show urgency) here
+                        invalidate_map()
+
+                    progress['last_id'] = complaints[-1].id
+                    progress['processed'] += len(complaints)
+                    progress['updated'] += len(changed)
+                    done_this_run += len(complaints)
+                    self.save_checkpoint(checkpoint_path, progress)
+
+                    chunk_rate = len(complaints) / (time.monotonic() - chunk_started)
+                    self.stdout.write(
+                        f"  up to #{progress['last_id']}: {len(complaints)} scored, {len(changed)} changed "
+                        f"({chunk_rate:.1f}/s)"
+                    )
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING(
+                f"⏸️  Interrupted. Run again to resume after complaint #{progress['last_id']}."
+            ))
+            return
+        finally:
+            for name in chain:
+                ai_service.set_rate_limit(name, None)
+
+        elapsed = time.monotonic() - started
+        rate = done_this_run / elapsed if elapsed else 0.0
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Re-scored {done_this_run} complaints in {elapsed:.1f}s ({rate:.1f}/s, {rate * 60:.0f}/min). "
+            f"Total: {progress['processed']} processed, {progress['updated']} updated, "
+            f"{progress['flagged']} flagged as invalid, {len(progress['failed_ids'])} failed."
+        ))
+        if progress['failed_ids']:
+            self.stdout.write(f"   Failed complaint ids: {progress['failed_ids'][:50]}")
+        if options['limit'] is None and os.path.exists(checkpoint_path):
+            # Finished: the next run starts over
+            os.remove(checkpoint_path)
+
+    def score(self, complaint):
+        try:
+            image_path = complaint.image.path if complaint.image else None
+            return ai_service.analyze_complaint(image_path, complaint.description, complaint.category, refresh=True)
+        except Exception as e:
+            self.stderr.write(f"  #{complaint.id}: {e}")
+            return None
+
+    def save_checkpoint(self, path, progress):
+        # Write-then-rename so an interruption never leaves a half-written file
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(progress, f)
+        os.replace(tmp_path, path)
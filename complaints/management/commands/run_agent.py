@@ -2,11 +2,14 @@ from django.core.management.base import BaseCommand
 from django.utils import timezone
 from datetime import timedelta
 from complaints.models import Complaint, Ward
-from complaints.agents.escalation_agent import run_escalation_agent
+from complaints.agents.escalation_agent import run_escalation_agent_batch
 import os
 
 class Command(BaseCommand):
-    help = 'Runs the LangGraph Escalation Agent'
+    help = 'Runs the LangGraph Escalation Agent on the given complaints (or on a test complaint)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('complaint_ids', nargs='*', type=int, help='Complaints to run the agent on')
 
     def handle(self, *args, **options):
         self.stdout.write("🤖 Starting Escalation Agent Test...")
@@ -19,6 +22,15 @@ class Command(BaseCommand):
         else:
             self.stdout.write(self.style.ERROR("❌ GEMINI_API_KEY not found! Agent might fail."))
 
+        if options['complaint_ids']:
+            # One SMTP session for all of their escalation emails
+            results = run_escalation_agent_batch(options['complaint_ids'])
+            for complaint_id, result in results.items():
+                self.stdout.write(f"🏁 Complaint #{complaint_id}: {result.get('final_status')}")
+            escalated = sum(1 for result in results.values() if result.get('final_status') == "ESCALATED")
+            self.stdout.write(self.style.SUCCESS(f"✅ {escalated} of {len(results)} complaints escalated."))
+            return
+
         # 1. Create Dummy Complaint
         ward, _ = Ward.objects.get_or_create(name="A", defaults={"full_name": "Colaba", "officer_email": "ac.a@mcgm.gov.in"})
         
@@ -42,7 +54,7 @@ class Command(BaseCommand):
         # 2. Run Agent
         try:
             self.stdout.write("🚀 Invoking Agent...")
-            result = run_escalation_agent(complaint.id)
+            result = run_escalation_agent_batch([complaint.id])[complaint.id]
             self.stdout.write(f"🏁 Agent Finished. Result: {result.get('final_status')}")
             
             # 3. Verify
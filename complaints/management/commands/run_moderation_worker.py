@@ -0,0 +1,34 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from complaints.moderation import claim_next_job, release_stale_jobs, run_job
+
+class Command(BaseCommand):
+    help = 'Processes queued AI moderation jobs (used when AI_MODERATION_ASYNC=True)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Drain the queue once and exit')
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds to sleep when the queue is empty')
+
+    def handle(self, *args, **options):
+        once = options['once']
+        poll_interval = options['poll_interval']
+        self.stdout.write("🤖 Moderation worker started...")
+
+        processed = 0
+        while True:
+            release_stale_jobs()
+            job = claim_next_job()
+            if job is not None:
+                job = run_job(job)
+                processed += 1
+                self.stdout.write(f"  Job #{job.id} (complaint #{job.complaint_id}): {job.state}")
+                continue
+
+            if once:
+                break
+            # Drop connections the database may have closed while we were idle
+            close_old_connections()
+            time.sleep(poll_interval)
+
+        self.stdout.write(self.style.SUCCESS(f"✅ Processed {processed} moderation jobs."))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from complaints.digest import queue_officer_digests
+
+class Command(BaseCommand):
+    help = "Queues each ward officer's daily digest of newly verified complaints (run once a day, e.g. from cron)"
+
+    def handle(self, *args, **options):
+        self.stdout.write("🗞️  Building ward officer digests...")
+        digests, complaints = queue_officer_digests()
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Queued {digests} digest emails covering {complaints} complaints "
+            f"(instead of {complaints} separate emails). `send_outbox_emails` delivers them."
+        ))
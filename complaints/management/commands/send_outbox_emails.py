@@ -0,0 +1,36 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from complaints.models import OutboundEmail
+from complaints.outbox import BATCH_SIZE, dispatch_due
+
+class Command(BaseCommand):
+    help = 'Delivers queued emails from the outbox table, retrying failures with backoff'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Send everything that is due once and exit')
+        parser.add_argument('--poll-interval', type=float, default=5.0, help='Seconds to sleep when nothing is due')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Emails claimed per round')
+
+    def handle(self, *args, **options):
+        self.stdout.write("📬 Outbox dispatcher started...")
+
+        sent = failed = 0
+        while True:
+            emails = dispatch_due(options['batch_size'])
+            for email in emails:
+                if email.state == OutboundEmail.State.SENT:
+                    sent += 1
+                else:
+                    failed += 1
+                self.stdout.write(f"  Email #{email.id} ({email.subject[:50]}): {email.state}")
+            if emails:
+                continue
+
+            if options['once']:
+                break
+            # Drop connections the database may have closed while we were idle
+            close_old_connections()
+            time.sleep(options['poll_interval'])
+
+        self.stdout.write(self.style.SUCCESS(f"✅ Sent {sent} emails, {failed} failed attempts."))
@@ -0,0 +1,31 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('complaints', '0009_complaint_created_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='complaint',
+            index=models.Index(fields=['reporter', '-created_at', '-id'], name='complaint_reporter_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='complaint',
+            index=models.Index(fields=['category', 'status', '-created_at'], name='complaint_cat_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='complaint',
+            index=models.Index(fields=['status', '-created_at'], name='complaint_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='complaint',
+            index=models.Index(
+                condition=models.Q(('escalation_level', 0), ('urgency_score__gte', 8)),
+                fields=['status', 'created_at'],
+                name='complaint_escalation_idx',
+            ),
+        ),
+    ]
@@ -0,0 +1,29 @@
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+def install(apps, schema_editor):
+    from complaints.search import install_search_index
+    install_search_index(schema_editor.connection)
+
+
+def uninstall(apps, schema_editor):
+    from complaints.search import uninstall_search_index
+    uninstall_search_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('complaints', '0010_complaint_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='complaint',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        # GIN index + trigger on PostgreSQL, FTS5 table + triggers on SQLite
+        migrations.RunPython(install, uninstall),
+    ]
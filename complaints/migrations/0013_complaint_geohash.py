@@ -0,0 +1,39 @@
+from django.db import migrations, models
+
+
+def backfill_geohash(apps, schema_editor):
+    from complaints.geo import encode_geohash
+
+    Complaint = apps.get_model('complaints', 'Complaint')
+    batch = []
+    located = Complaint.objects.filter(latitude__isnull=False, longitude__isnull=False).only('id', 'latitude', 'longitude')
+    for complaint in located.iterator(chunk_size=1000):
+        complaint.geohash = encode_geohash(complaint.latitude, complaint.longitude)
+        batch.append(complaint)
+        if len(batch) >= 1000:
+            Complaint.objects.bulk_update(batch, ['geohash'])
+            batch = []
+    if batch:
+        Complaint.objects.bulk_update(batch, ['geohash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('complaints', '0012_complaint_lat_lng_idx'),
+    ]
+
+    operations = [
+        # Nullable so SQLite can ALTER TABLE ADD COLUMN instead of rebuilding the
+        # table (a rebuild would drop the full-text search triggers)
+        migrations.AddField(
+            model_name='complaint',
+            name='geohash',
+            field=models.CharField(blank=True, editable=False, max_length=12, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='complaint',
+            index=models.Index(fields=['geohash'], name='complaint_geohash_idx'),
+        ),
+        migrations.RunPython(backfill_geohash, migrations.RunPython.noop),
+    ]
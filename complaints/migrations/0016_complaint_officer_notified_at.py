@@ -0,0 +1,31 @@
+from django.db import migrations, models
+
+
+def mark_already_notified(apps, schema_editor):
+    # Complaints verified before digests existed were already emailed one by one.
+    # Read the Verification table: verification_count is only backfilled by 0019.
+    Complaint = apps.get_model('complaints', 'Complaint')
+    Verification = apps.get_model('complaints', 'Verification')
+    Complaint.objects.filter(
+        models.Exists(Verification.objects.filter(complaint=models.OuterRef('pk')))
+    ).update(officer_notified_at=models.F('updated_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('complaints', '0015_outbound_email'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='complaint',
+            name='officer_notified_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='complaint',
+            index=models.Index(condition=models.Q(('officer_notified_at__isnull', True), ('verification_count__gte', 1)), fields=['ward', '-urgency_score'], name='complaint_officer_digest_idx'),
+        ),
+        migrations.RunPython(mark_already_notified, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def record_past_resolutions(apps, schema_editor):
+    # Resolved complaints already got their points and email
+    Complaint = apps.get_model('complaints', 'Complaint')
+    SideEffect = apps.get_model('complaints', 'SideEffect')
+    resolved = Complaint.objects.filter(status='RESOLVED', reporter__isnull=False).values_list('id', flat=True)
+    SideEffect.objects.bulk_create(
+        [SideEffect(complaint_id=complaint_id, effect=effect, occurrence=0)
+         for complaint_id in resolved.iterator()
+         for effect in ('resolution_points', 'resolution_email')],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('complaints', '0016_complaint_officer_notified_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SideEffect',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('effect', models.CharField(max_length=40)),
+                ('occurrence', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('complaint', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='side_effects', to='complaints.complaint')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('complaint', 'effect', 'occurrence'), name='unique_side_effect')],
+            },
+        ),
+        migrations.RunPython(record_past_resolutions, migrations.RunPython.noop),
+    ]
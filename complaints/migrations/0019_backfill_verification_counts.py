@@ -0,0 +1,25 @@
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def backfill_verification_counts(apps, schema_editor):
+    # The column existed before anything maintained it; reads rely on it now
+    Complaint = apps.get_model('complaints', 'Complaint')
+    Verification = apps.get_model('complaints', 'Verification')
+    actual = Coalesce(models.Subquery(
+        Verification.objects.filter(complaint=models.OuterRef('pk'))
+        .order_by().values('complaint').annotate(total=models.Count('id')).values('total'),
+        output_field=models.IntegerField(),
+    ), models.Value(0))
+    Complaint.objects.exclude(verification_count=actual).update(verification_count=actual)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('complaints', '0018_complaint_updated_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_verification_counts, migrations.RunPython.noop),
+    ]
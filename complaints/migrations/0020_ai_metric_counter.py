@@ -0,0 +1,23 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('complaints', '0019_backfill_verification_counts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AIMetricCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(max_length=32)),
+                ('name', models.CharField(max_length=64)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('scope', 'name'), name='unique_ai_metric_counter')],
+            },
+        ),
+    ]
@@ -1,6 +1,8 @@
 from django.db import models
 import uuid
 from django.contrib.auth.models import User
+from django.utils import timezone
+from django.contrib.postgres.search import SearchVectorField
 from django.utils.translation import gettext_lazy as _
 
 class Ward(models.Model):
@@ -27,6 +29,7 @@ class Complaint(models.Model):
         OTHERS = 'OTHERS', _('Others')
 
     class Status(models.TextChoices):
+        PENDING = 'PENDING', _('Pending Moderation')
         NEW = 'NEW', _('New')
         VERIFIED = 'VERIFIED', _('Community Verified')
         ESCALATED = 'ESCALATED', _('Escalated to Official')
@@ -48,6 +51,8 @@ class Complaint(models.Model):
     longitude = models.FloatField(null=True, blank=True)
     location_address = models.CharField(max_length=255, blank=True)
     ward = models.ForeignKey(Ward, on_delete=models.SET_NULL, null=True, blank=True)
+    # Derived from latitude/longitude in save(); map tiles cluster on its prefixes
+    geohash = models.CharField(max_length=12, null=True, blank=True, editable=False)
 
     # AI & Meta
     from django.core.validators import MinValueValidator, MaxValueValidator
@@ -56,6 +61,8 @@ class Complaint(models.Model):
     
     # Community
     verification_count = models.PositiveIntegerField(default=0)
+    # When the ward officer was told about it (immediate email or daily digest, see complaints/digest.py)
+    officer_notified_at = models.DateTimeField(null=True, blank=True, editable=False)
     
     # Resolution Workflow
     admin_token = models.UUIDField(default=uuid.uuid4, editable=False)
@@ -65,6 +72,75 @@ class Complaint(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Full-text search (PostgreSQL only, maintained by a DB trigger - see complaints/search.py)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination (ComplaintCursorPagination) seeks on this pair
+            models.Index(fields=['-created_at', '-id'], name='complaint_created_id_idx'),
+            # my_complaints: WHERE reporter_id = ? ORDER BY created_at DESC
+            models.Index(fields=['reporter', '-created_at', '-id'], name='complaint_reporter_created_idx'),
+            # ComplaintFilter: category and/or status (values normalized to upper-case), newest first
+            models.Index(fields=['category', 'status', '-created_at'], name='complaint_cat_status_idx'),
+            models.Index(fields=['status', '-created_at'], name='complaint_status_created_idx'),
+            # Map bbox queries (geojson): range on latitude, then longitude
+            models.Index(fields=['latitude', 'longitude'], name='complaint_lat_lng_idx'),
+            # Map tile clustering groups on geohash prefixes
+            models.Index(fields=['geohash'], name='complaint_geohash_idx'),
+            # check_escalation: only high-urgency, never-escalated complaints are ever candidates,
+            # so the index stays tiny compared to the table
+            models.Index(
+                fields=['status', 'created_at'],
+                condition=models.Q(escalation_level=0, urgency_score__gte=8),
+                name='complaint_escalation_idx',
+            ),
+            # send_officer_digest: verified complaints the officer hasn't heard about yet
+            models.Index(
+                fields=['ward', '-urgency_score'],
+                condition=models.Q(officer_notified_at__isnull=True, verification_count__gte=1),
+                name='complaint_officer_digest_idx',
+            ),
+        ]
+
+    # Only ever written with queryset.update(), never by save() of an existing row
+    UPDATED_IN_PLACE = ('verification_count', 'officer_notified_at')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Status as loaded (None if deferred); signals compare against it to see real transitions
+        instance._loaded_status = instance.__dict__.get('status')
+        return instance
+
+    def entered_status(self, status):
+        """
+        True while saving a change *into* `status`, False when a complaint that
+        already had it is saved again. Valid in post_save (see signals.py).
+        """
+        return self.status == status and getattr(self, '_previous_status', None) != status
+
+    def save(self, *args, **kwargs):
+        from .geo import encode_geohash
+        if self.latitude is not None and self.longitude is not None:
+            self.geohash = encode_geohash(self.latitude, self.longitude)
+        else:
+            self.geohash = None
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None and not self._state.adding and not kwargs.get('force_insert'):
+            # A full save of a loaded complaint would write back stale copies of the columns
+            # other code bumps with UPDATE ... F() (a concurrent upvote, the officer digest)
+            deferred = self.get_deferred_fields()
+            update_fields = [
+                field.attname for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in deferred
+                and field.attname not in self.UPDATED_IN_PLACE
+            ]
+            kwargs['update_fields'] = update_fields
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'geohash'}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.category} in {self.ward} ({self.status})"
 
@@ -99,4 +175,110 @@ class ComplaintImage(models.Model):
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        return f"Image for {self.complaint.title}"
\ No newline at end of file
+        return f"Image for {self.complaint.title}"
+
+class ModerationJob(models.Model):
+    """
+    Queue entry for asynchronous AI moderation of a new complaint.
+    The table itself is the queue (see complaints/moderation.py), so no Redis is needed.
+    """
+    class State(models.TextChoices):
+        QUEUED = 'QUEUED', _('Queued')
+        RUNNING = 'RUNNING', _('Running')
+        ACCEPTED = 'ACCEPTED', _('Accepted')
+        REJECTED = 'REJECTED', _('Rejected')
+        FAILED = 'FAILED', _('Failed')
+
+    # SET_NULL: a rejected complaint is deleted, but its job keeps the verdict for the reporter to poll
+    complaint = models.ForeignKey(Complaint, related_name='moderation_jobs', on_delete=models.SET_NULL, null=True, blank=True)
+    reporter = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    state = models.CharField(max_length=10, choices=State.choices, default=State.QUEUED)
+    reason = models.CharField(max_length=255, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Worker poll: WHERE state = 'QUEUED' AND run_after <= now ORDER BY run_after
+            models.Index(fields=['state', 'run_after'], name='moderation_job_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"Moderation of #{self.complaint_id} ({self.state})"
+
+class OutboundEmail(models.Model):
+    """
+    Transactional outbox: emails are stored in the same transaction as the change
+    that triggers them and delivered later by the `send_outbox_emails` command
+    (see complaints/outbox.py), so requests never wait on SMTP.
+    """
+    class State(models.TextChoices):
+        QUEUED = 'QUEUED', _('Queued')
+        SENDING = 'SENDING', _('Sending')
+        SENT = 'SENT', _('Sent')
+        FAILED = 'FAILED', _('Failed')
+
+    complaint = models.ForeignKey(Complaint, related_name='emails', on_delete=models.SET_NULL, null=True, blank=True)
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=254, blank=True)
+    recipients = models.JSONField(default=list)
+    state = models.CharField(max_length=10, choices=State.choices, default=State.QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.CharField(max_length=255, blank=True)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Dispatcher poll: WHERE state = 'QUEUED' AND run_after <= now ORDER BY run_after
+            models.Index(fields=['state', 'run_after'], name='outbound_email_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.recipients)} ({self.state})"
+
+class SideEffect(models.Model):
+    """
+    Idempotency ledger: one row per side effect (points, emails...) already
+    carried out for a complaint. The unique constraint makes a second attempt
+    fail instead of repeating it, even from concurrent requests.
+    See complaints/side_effects.py.
+    """
+    complaint = models.ForeignKey(Complaint, related_name='side_effects', on_delete=models.CASCADE)
+    effect = models.CharField(max_length=40)
+    # 0 for once-only effects; repeatable ones (e.g. a second resolution after a reopen) count up
+    occurrence = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['complaint', 'effect', 'occurrence'], name='unique_side_effect'),
+        ]
+
+    def __str__(self):
+        return f"{self.effect} #{self.occurrence} for complaint #{self.complaint_id}"
+
+class AIMetricCounter(models.Model):
+    """
+    One counter of AI instrumentation (see complaints/ai_metrics.py): provider
+    call stats, verdict cache hits, pre-filter decisions. Kept in the database
+    so every process adds to the same numbers and nothing evicts them.
+    """
+    # Provider name, 'verdict_cache' or 'prefilter'
+    scope = models.CharField(max_length=32)
+    name = models.CharField(max_length=64)
+    value = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'name'], name='unique_ai_metric_counter'),
+        ]
+
+    def __str__(self):
+        return f"{self.scope}:{self.name} = {self.value}"
@@ -0,0 +1,187 @@
+"""
+AI moderation of new complaints.
+
+Synchronous mode (default) runs the provider inside the request. With
+settings.AI_MODERATION_ASYNC the complaint is saved as PENDING, a
+ModerationJob row is queued and the request returns 202 at once; the
+`run_moderation_worker` command picks jobs up and applies the verdict.
+
+In synchronous mode the upload is moderated before anything is written
+(moderate_upload): the AI reads the temporary upload, the complaint is
+inserted once with its final scores, and the image reaches MEDIA_ROOT (or
+S3) only for accepted complaints. Async mode has to store the file first
+so the worker can read it.
+
+The job table is the queue: a worker claims a job with a conditional
+UPDATE (state QUEUED -> RUNNING), which only one worker can win, so any
+number of worker processes can run side by side on SQLite or PostgreSQL.
+"""
+import os
+from datetime import timedelta
+from django.db.models import F
+from django.utils import timezone
+from .models import Complaint, ModerationJob
+
+MAX_ATTEMPTS = 3
+
+# Retry delay grows with each failed attempt: 30s, 60s, 120s ...
+RETRY_BACKOFF_SECONDS = 30
+
+# A RUNNING job whose worker died is handed out again after this long
+STALE_LOCK_SECONDS = 300
+
+CATEGORY_MISMATCH_REASON = "The image/description does not match the selected category."
+
+
+class ModerationUnavailable(Exception):
+    """No provider could give a verdict (outage, timeouts); nothing was decided."""
+
+
+def delete_rejected(complaint):
+    """Removes a rejected complaint together with its uploaded image."""
+    if complaint.image:
+        image_path = complaint.image.path
+        if os.path.exists(image_path):
+            os.remove(image_path)
+    complaint.delete()
+
+
+def judge(is_valid, reason, score, verified):
+    """
+    Turns an AI verdict into (accepted, reason, fields to store on the complaint).
+    """
+    if not is_valid:
+        return False, reason, {}
+
+    # Enforce Category Match
+    if not verified:
+        return False, CATEGORY_MISMATCH_REASON, {}
+
+    return True, None, {'urgency_score': score, 'ai_verified_category': verified}
+
+
+def apply_verdict(complaint, is_valid, reason, score, verified):
+    """
+    Applies an AI verdict to a saved complaint. Accepted complaints get their
+    scores (and leave PENDING); rejected ones are deleted.
+
+    Returns (accepted, reason).
+    """
+    accepted, reason, fields = judge(is_valid, reason, score, verified)
+    if not accepted:
+        delete_rejected(complaint)
+        return False, reason
+
+    for name, value in fields.items():
+        setattr(complaint, name, value)
+    if complaint.status == Complaint.Status.PENDING:
+        complaint.status = Complaint.Status.NEW
+    complaint.save()
+    return True, None
+
+
+def moderate(complaint):
+    """
+    Runs the AI provider chain on a complaint and applies the verdict.
+    Raises ModerationUnavailable instead of rejecting when no provider answered.
+    """
+    from .ai_service import analyze_complaint, is_transient_failure
+
+    image_path = complaint.image.path if complaint.image else None
+    result = analyze_complaint(image_path, complaint.description, complaint.category)
+    if is_transient_failure(result):
+        raise ModerationUnavailable(result[1])
+    return apply_verdict(complaint, *result)
+
+
+def upload_source(upload):
+    """
+    What the AI reads for an upload that is not in storage yet: the temporary
+    file of a large upload, or the bytes of one Django kept in memory.
+    """
+    if not upload:
+        return None
+    if hasattr(upload, 'temporary_file_path'):
+        return upload.temporary_file_path()
+    upload.seek(0)
+    data = upload.read()
+    upload.seek(0)  # storage reads it again when the complaint is saved
+    return data
+
+
+def moderate_upload(data):
+    """
+    Runs the AI provider chain on a validated, unsaved submission.
+
+    Returns (accepted, reason, fields); pass `fields` to serializer.save() so
+    the complaint is inserted once with its scores. Raises ModerationUnavailable
+    when no provider answered.
+    """
+    from .ai_service import analyze_complaint, is_transient_failure
+
+    result = analyze_complaint(upload_source(data.get('image')), data.get('description'), data.get('category'))
+    if is_transient_failure(result):
+        raise ModerationUnavailable(result[1])
+    return judge(*result)
+
+
+def enqueue(complaint):
+    return ModerationJob.objects.create(complaint=complaint, reporter=complaint.reporter)
+
+
+def release_stale_jobs():
+    """Puts jobs back in the queue whose worker crashed mid-run."""
+    cutoff = timezone.now() - timedelta(seconds=STALE_LOCK_SECONDS)
+    return ModerationJob.objects.filter(
+        state=ModerationJob.State.RUNNING, locked_at__lt=cutoff
+    ).update(state=ModerationJob.State.QUEUED, locked_at=None)
+
+
+def claim_next_job():
+    """
+    Returns the oldest due job after atomically marking it RUNNING, or None
+    when the queue is empty. Losing a race to another worker just means
+    trying the next candidate.
+    """
+    now = timezone.now()
+    candidates = ModerationJob.objects.filter(
+        state=ModerationJob.State.QUEUED, run_after__lte=now
+    ).order_by('run_after', 'id').values_list('id', flat=True)
+
+    for job_id in candidates[:10]:
+        claimed = ModerationJob.objects.filter(id=job_id, state=ModerationJob.State.QUEUED).update(
+            state=ModerationJob.State.RUNNING, locked_at=now, attempts=F('attempts') + 1
+        )
+        if claimed:
+            return ModerationJob.objects.select_related('complaint').get(id=job_id)
+    return None
+
+
+def run_job(job):
+    """Moderates the job's complaint; provider errors are retried with backoff."""
+    complaint = job.complaint
+    if complaint is None:
+        job.state = ModerationJob.State.FAILED
+        job.reason = "Complaint was deleted before moderation."
+    else:
+        try:
+            accepted, reason = moderate(complaint)
+        except Exception as e:
+            print(f"Moderation job #{job.id} failed: {e}")
+            if job.attempts < MAX_ATTEMPTS:
+                job.state = ModerationJob.State.QUEUED
+                job.run_after = timezone.now() + timedelta(seconds=RETRY_BACKOFF_SECONDS * 2 ** (job.attempts - 1))
+            else:
+                # The complaint stays PENDING so an admin can review it
+                job.state = ModerationJob.State.FAILED
+            job.reason = str(e)[:255]
+        else:
+            job.state = ModerationJob.State.ACCEPTED if accepted else ModerationJob.State.REJECTED
+            job.reason = (reason or '')[:255]
+            if not accepted:
+                # The complaint row is gone (SET_NULL already cleared the column)
+                job.complaint = None
+
+    job.locked_at = None
+    job.save(update_fields=['state', 'reason', 'run_after', 'locked_at', 'updated_at'])
+    return job
@@ -0,0 +1,100 @@
+"""
+Transactional email outbox.
+
+Signal handlers call queue_email() instead of send_mail(): the message is
+stored as an OutboundEmail row in the same transaction as the change that
+triggered it, so it is sent if and only if that change commits, and the
+request never waits on the SMTP server. The `send_outbox_emails` command
+delivers queued rows in batches over one SMTP session (complaints/mailer.py),
+retrying failures with exponential backoff.
+
+Rows are claimed with a conditional UPDATE (QUEUED -> SENDING) exactly like
+ModerationJob (see complaints/moderation.py), so several dispatchers can run
+side by side without sending a message twice.
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import EmailMessage
+from django.db.models import F
+from django.utils import timezone
+from . import mailer
+from .models import OutboundEmail
+
+MAX_ATTEMPTS = 5
+
+# Retry delay grows with each failed attempt: 1, 2, 4, 8 minutes
+RETRY_BACKOFF_SECONDS = 60
+
+# A SENDING row whose dispatcher died is handed out again after this long
+STALE_LOCK_SECONDS = 300
+
+BATCH_SIZE = 50
+
+
+def queue_email(subject, body, recipients, complaint=None, from_email=None):
+    """Stores an email for the dispatcher; call it inside the triggering transaction."""
+    return OutboundEmail.objects.create(
+        complaint=complaint,
+        subject=subject[:255],
+        body=body,
+        from_email=from_email or settings.EMAIL_HOST_USER or '',
+        recipients=list(recipients),
+    )
+
+
+def release_stale_emails():
+    """Puts emails back in the queue whose dispatcher crashed mid-send."""
+    cutoff = timezone.now() - timedelta(seconds=STALE_LOCK_SECONDS)
+    return OutboundEmail.objects.filter(
+        state=OutboundEmail.State.SENDING, locked_at__lt=cutoff
+    ).update(state=OutboundEmail.State.QUEUED, locked_at=None)
+
+
+def claim_due_emails(limit=BATCH_SIZE):
+    """Marks up to `limit` due emails SENDING and returns them, oldest first."""
+    now = timezone.now()
+    candidates = OutboundEmail.objects.filter(
+        state=OutboundEmail.State.QUEUED, run_after__lte=now
+    ).order_by('run_after', 'id').values_list('id', flat=True)
+
+    claimed = []
+    for email_id in candidates[:limit]:
+        # Losing the race to another dispatcher just means that row is theirs
+        if OutboundEmail.objects.filter(id=email_id, state=OutboundEmail.State.QUEUED).update(
+            state=OutboundEmail.State.SENDING, locked_at=now, attempts=F('attempts') + 1
+        ):
+            claimed.append(email_id)
+    return list(OutboundEmail.objects.filter(id__in=claimed).order_by('run_after', 'id'))
+
+
+def deliver(email):
+    """Sends one claimed email; failures are retried with backoff until MAX_ATTEMPTS."""
+    try:
+        mailer.send_message(EmailMessage(email.subject, email.body, email.from_email or None, email.recipients))
+    except Exception as e:
+        print(f"Failed to send email #{email.id} to {email.recipients}: {e}")
+        if email.attempts < MAX_ATTEMPTS:
+            email.state = OutboundEmail.State.QUEUED
+            email.run_after = timezone.now() + timedelta(seconds=RETRY_BACKOFF_SECONDS * 2 ** (email.attempts - 1))
+        else:
+            email.state = OutboundEmail.State.FAILED
+        email.last_error = str(e)[:255]
+    else:
+        print(f"Email #{email.id} sent to {', '.join(email.recipients)}")
+        email.state = OutboundEmail.State.SENT
+        email.sent_at = timezone.now()
+        email.last_error = ''
+
+    email.locked_at = None
+    email.save(update_fields=['state', 'run_after', 'last_error', 'sent_at', 'locked_at'])
+    return email
+
+
+def dispatch_due(limit=BATCH_SIZE):
+    """Delivers one batch of due emails over a single SMTP session. Returns the delivered rows."""
+    release_stale_emails()
+    emails = claim_due_emails(limit)
+    if not emails:
+        return []
+    with mailer.batch():
+        return [deliver(email) for email in emails]
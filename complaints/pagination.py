@@ -0,0 +1,15 @@
+from rest_framework.pagination import CursorPagination
+
+
+class ComplaintCursorPagination(CursorPagination):
+    """
+    Keyset pagination for complaint feeds.
+
+    Instead of COUNT(*) + OFFSET (what PageNumberPagination does), each page
+    seeks straight to the last seen (created_at, id) through the matching
+    index, so page 500 costs the same as page 1. Cursors are opaque strings
+    returned in `next` / `previous`; there is no total `count`.
+    """
+    page_size = 10
+    ordering = ('-created_at', '-id')
+    cursor_query_param = 'cursor'
@@ -0,0 +1,198 @@
+"""
+Full-text search for complaints.
+
+PostgreSQL: Complaint.search_vector is a tsvector kept up to date by a
+trigger and indexed with GIN; results are ranked with ts_rank.
+
+SQLite (the default in settings.DATABASES): an FTS5 virtual table mirrors
+title/description/ward and is kept up to date by triggers; results are
+ranked with bm25.
+
+Any other backend falls back to DRF's icontains SearchFilter.
+
+The database objects are created by migration 0011. SQLite drops triggers
+when Django rebuilds a table during a migration, so run
+`python manage.py rebuild_search_index` if search results go stale.
+"""
+import re
+from django.db import connections
+from django.db.models.expressions import RawSQL
+from rest_framework.filters import SearchFilter
+
+FTS_TABLE = 'complaints_complaint_fts'
+
+# Title matches count the most, then the ward, then the description
+SQLITE_WEIGHTS = '10.0, 1.0, 2.0'
+
+WARD_TEXT_SQL = "(SELECT name || ' ' || full_name FROM complaints_ward WHERE id = new.ward_id)"
+
+SQLITE_INSTALL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(title, description, ward)",
+    "DROP TRIGGER IF EXISTS complaints_complaint_fts_insert",
+    f"""
+    CREATE TRIGGER complaints_complaint_fts_insert AFTER INSERT ON complaints_complaint BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, description, ward)
+        VALUES (new.id, new.title, new.description, {WARD_TEXT_SQL});
+    END
+    """,
+    "DROP TRIGGER IF EXISTS complaints_complaint_fts_update",
+    f"""
+    CREATE TRIGGER complaints_complaint_fts_update AFTER UPDATE OF title, description, ward_id ON complaints_complaint BEGIN
+        UPDATE {FTS_TABLE} SET title = new.title, description = new.description, ward = {WARD_TEXT_SQL}
+        WHERE rowid = new.id;
+    END
+    """,
+    "DROP TRIGGER IF EXISTS complaints_complaint_fts_delete",
+    f"""
+    CREATE TRIGGER complaints_complaint_fts_delete AFTER DELETE ON complaints_complaint BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+    END
+    """,
+    "DROP TRIGGER IF EXISTS complaints_ward_fts_update",
+    f"""
+    CREATE TRIGGER complaints_ward_fts_update AFTER UPDATE OF name, full_name ON complaints_ward BEGIN
+        UPDATE {FTS_TABLE} SET ward = new.name || ' ' || new.full_name
+        WHERE rowid IN (SELECT id FROM complaints_complaint WHERE ward_id = new.id);
+    END
+    """,
+    # Backfill
+    f"DELETE FROM {FTS_TABLE}",
+    f"""
+    INSERT INTO {FTS_TABLE}(rowid, title, description, ward)
+    SELECT c.id, c.title, c.description, w.name || ' ' || w.full_name
+    FROM complaints_complaint c LEFT JOIN complaints_ward w ON w.id = c.ward_id
+    """,
+]
+
+SQLITE_UNINSTALL = [
+    "DROP TRIGGER IF EXISTS complaints_complaint_fts_insert",
+    "DROP TRIGGER IF EXISTS complaints_complaint_fts_update",
+    "DROP TRIGGER IF EXISTS complaints_complaint_fts_delete",
+    "DROP TRIGGER IF EXISTS complaints_ward_fts_update",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+# 'simple' config: complaints mix English, Hindi and Marathi, so no language-specific stemming
+POSTGRES_INSTALL = [
+    f"""
+    CREATE OR REPLACE FUNCTION complaints_complaint_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('simple', coalesce(NEW.title, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce({WARD_TEXT_SQL}, '')), 'B') ||
+            setweight(to_tsvector('simple', coalesce(NEW.description, '')), 'C');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS complaints_complaint_search_vector_trigger ON complaints_complaint",
+    """
+    CREATE TRIGGER complaints_complaint_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, description, ward_id ON complaints_complaint
+    FOR EACH ROW EXECUTE FUNCTION complaints_complaint_search_vector_update()
+    """,
+    """
+    CREATE OR REPLACE FUNCTION complaints_ward_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        UPDATE complaints_complaint SET ward_id = ward_id WHERE ward_id = NEW.id;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS complaints_ward_search_vector_trigger ON complaints_ward",
+    """
+    CREATE TRIGGER complaints_ward_search_vector_trigger
+    AFTER UPDATE OF name, full_name ON complaints_ward
+    FOR EACH ROW EXECUTE FUNCTION complaints_ward_search_vector_update()
+    """,
+    "CREATE INDEX IF NOT EXISTS complaint_search_gin ON complaints_complaint USING gin (search_vector)",
+    # Backfill (fires the trigger for every row)
+    "UPDATE complaints_complaint SET title = title",
+]
+
+POSTGRES_UNINSTALL = [
+    "DROP INDEX IF EXISTS complaint_search_gin",
+    "DROP TRIGGER IF EXISTS complaints_ward_search_vector_trigger ON complaints_ward",
+    "DROP FUNCTION IF EXISTS complaints_ward_search_vector_update()",
+    "DROP TRIGGER IF EXISTS complaints_complaint_search_vector_trigger ON complaints_complaint",
+    "DROP FUNCTION IF EXISTS complaints_complaint_search_vector_update()",
+]
+
+
+def _run(connection, statements):
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def install_search_index(connection):
+    """Creates (or re-creates) the search index objects and backfills them."""
+    if connection.vendor == 'postgresql':
+        _run(connection, POSTGRES_INSTALL)
+    elif connection.vendor == 'sqlite':
+        _run(connection, SQLITE_INSTALL)
+
+
+def uninstall_search_index(connection):
+    if connection.vendor == 'postgresql':
+        _run(connection, POSTGRES_UNINSTALL)
+    elif connection.vendor == 'sqlite':
+        _run(connection, SQLITE_UNINSTALL)
+
+
+def search_complaints(queryset, terms):
+    """
+    Filters `queryset` to complaints matching every term (prefix match, so it
+    works while the user is still typing) and orders them by relevance.
+
+    Returns None when the database has no full-text backend.
+    """
+    vendor = connections[queryset.db].vendor
+
+    if vendor == 'postgresql':
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+        from django.db.models import F
+
+        # Strip tsquery operators so user input can't break the query syntax
+        words = [re.sub(r"[&|!():*<>'\\\s]", '', term) for term in terms]
+        raw = ' & '.join(f"{word}:*" for word in words if word)
+        if not raw:
+            return queryset.none()
+        query = SearchQuery(raw, search_type='raw', config='simple')
+        return queryset.filter(search_vector=query).annotate(
+            search_rank=SearchRank(F('search_vector'), query)
+        ).order_by('-search_rank', '-created_at')
+
+    if vendor == 'sqlite':
+        # Each term becomes a quoted FTS5 prefix phrase; terms are implicitly ANDed
+        match = ' '.join('"%s"*' % term.replace('"', '""') for term in terms)
+        table = queryset.model._meta.db_table
+        return queryset.filter(
+            id__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", (match,))
+        ).annotate(
+            # bm25() is "lower is better", so negate it to sort like ts_rank
+            search_rank=RawSQL(
+                f"SELECT -bm25({FTS_TABLE}, {SQLITE_WEIGHTS}) FROM {FTS_TABLE} "
+                f"WHERE {FTS_TABLE} MATCH %s AND {FTS_TABLE}.rowid = {table}.id",
+                (match,),
+            )
+        ).order_by('-search_rank', '-created_at')
+
+    return None
+
+
+class ComplaintSearchFilter(SearchFilter):
+    """
+    Drop-in replacement for SearchFilter (same `?search=` parameter) that uses
+    the full-text index instead of icontains scans, ranked by relevance.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+
+        results = search_complaints(queryset, terms)
+        if results is None:
+            return super().filter_queryset(request, queryset, view)
+        return results
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Complaint, Ward, Verification, UserProfile, ComplaintImage
+from .models import Complaint, Ward, Verification, UserProfile, ComplaintImage, ModerationJob
 
 class WardSerializer(serializers.ModelSerializer):
     class Meta:
@@ -59,25 +59,44 @@ class ComplaintSerializer(serializers.ModelSerializer):
             return obj.verifications.filter(user=user).exists()
         return False
 
+class SparseFieldsMixin:
+    """
+    Lets clients trim a GET response with `?fields=id,title` (keep only these)
+    or `?omit=description` (drop these).
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method != 'GET':
+            return
+
+        fields = request.query_params.get('fields')
+        if fields:
+            keep = {name.strip() for name in fields.split(',')}
+            for name in set(self.fields) - keep:
+                self.fields.pop(name)
+
+        omit = request.query_params.get('omit')
+        if omit:
+            for name in omit.split(','):
+                self.fields.pop(name.strip(), None)
+
 class ComplaintImageSerializer(serializers.ModelSerializer):
     class Meta:
         model = ComplaintImage
         fields = ['id', 'image', 'uploaded_at']
 
-class ComplaintSerializer(serializers.ModelSerializer):
+class ComplaintSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     # 1. Magic Trick: Send the Ward's NAME (e.g. "G/North") instead of just ID "1"
     ward_name = serializers.CharField(source='ward.name', read_only=True)
     
-    # 2. Dynamic Field: Count how many upvotes this has
-    verification_count = serializers.SerializerMethodField()
-    
-    # 3. Dynamic Field: Check if current user has verified
+    # 2. Dynamic Field: Check if current user has verified (upvote count is the verification_count column)
     is_verified = serializers.SerializerMethodField()
 
-    # 4. Reporter Info
+    # 3. Reporter Info
     reporter_username = serializers.CharField(source='reporter.username', read_only=True)
 
-    # 5. Multiple Images
+    # 4. Multiple Images
     images = serializers.ListField(
         child=serializers.ImageField(), write_only=True, required=False
     )
@@ -94,7 +113,7 @@ class ComplaintSerializer(serializers.ModelSerializer):
             'reporter', 'reporter_username', 'is_anonymous', 'created_at'
         ]
         # Security: Users shouldn't be able to manually change these via API
-        read_only_fields = ['urgency_score', 'status', 'created_at']
+        read_only_fields = ['urgency_score', 'status', 'verification_count', 'created_at']
 
     def validate(self, data):
         """
@@ -124,19 +143,40 @@ class ComplaintSerializer(serializers.ModelSerializer):
             
         return complaint
 
-    def get_verification_count(self, obj):
-        # This asks the database: "Count all verification rows linked to this complaint"
-        return obj.verifications.count()
-
     def get_is_verified(self, obj):
+        # Prefer the annotation from ComplaintViewSet.get_queryset() (no extra query).
+        # Fall back to a lookup for instances that were not loaded through it (e.g. just created).
+        if hasattr(obj, 'user_has_verified'):
+            return obj.user_has_verified
         user = self.context.get('request').user if self.context.get('request') else None
         if user and user.is_authenticated:
             return obj.verifications.filter(user=user).exists()
         return False
 
+class ComplaintListSerializer(ComplaintSerializer):
+    """
+    Lean representation for feeds (`?view=compact`): no description and no
+    nested images. Ask for extra fields explicitly with `?fields=`.
+    """
+    class Meta(ComplaintSerializer.Meta):
+        fields = [
+            'id', 'title', 'category', 'status',
+            'ward_name', 'image', 'urgency_score', 'verification_count', 'is_verified',
+            'reporter', 'reporter_username', 'is_anonymous', 'created_at'
+        ]
+
 class UserProfileSerializer(serializers.ModelSerializer):
     username = serializers.CharField(source='user.username', read_only=True)
     
     class Meta:
         model = UserProfile
-        fields = ['username', 'points', 'badges']
\ No newline at end of file
+        fields = ['username', 'points', 'badges']
+class ModerationJobSerializer(serializers.ModelSerializer):
+    # The complaint's current scores once the AI has accepted it
+    urgency_score = serializers.IntegerField(source='complaint.urgency_score', read_only=True, default=None)
+    complaint_status = serializers.CharField(source='complaint.status', read_only=True, default=None)
+
+    class Meta:
+        model = ModerationJob
+        fields = ['id', 'complaint', 'state', 'reason', 'urgency_score', 'complaint_status', 'created_at', 'updated_at']
+        read_only_fields = fields
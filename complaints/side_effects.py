@@ -0,0 +1,37 @@
+"""
+Idempotency ledger for complaint side effects.
+
+Signal handlers call claim() before awarding points or queueing an email; it
+records the effect in the SideEffect table and returns False if it was already
+recorded, so a re-save, a retried request or two concurrent requests can't
+repeat it. The row is written in the caller's transaction and disappears with
+it on rollback.
+"""
+from django.db import IntegrityError, transaction
+from .models import SideEffect
+
+RESOLUTION_POINTS = 'resolution_points'
+RESOLUTION_EMAIL = 'resolution_email'
+# Recorded each time a resolved complaint goes back to another status (e.g. REOPENED)
+LEFT_RESOLVED = 'left_resolved'
+
+
+def resolution_number(complaint):
+    """0 for a complaint's first resolution, 1 after it was reopened once, ..."""
+    return SideEffect.objects.filter(complaint=complaint, effect=LEFT_RESOLVED).count()
+
+
+def claim(complaint, effect, occurrence=0):
+    """
+    Records `effect` for `complaint`; True if the caller should carry it out.
+    Each (effect, occurrence) can be claimed once: pass an occurrence number
+    derived from the complaint's history (not from the ledger entries of the
+    effect itself) so that two stale copies of a complaint compute the same one.
+    """
+    try:
+        # Savepoint: a duplicate must not break the caller's transaction
+        with transaction.atomic():
+            SideEffect.objects.create(complaint=complaint, effect=effect, occurrence=occurrence)
+    except IntegrityError:
+        return False
+    return True
@@ -1,7 +1,27 @@
-from django.db.models.signals import post_save
-from django.dispatch import receiver
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+from .geo import invalidate_map
 from .models import Complaint, Verification, UserProfile
+from .outbox import queue_email
+from . import side_effects
+
+RESOLUTION_POINTS = 50
+VERIFICATION_POINTS = 10
+
+# Complaint and Verification each have ONE post_save and ONE post_delete
+# dispatcher. It works out what happened (status transition,
+# verification threshold) once and loads related rows once. Its writes
+# (points, ledger, outbox emails) stay in the caller's transaction, so they
+# commit or roll back with the change and a crash can't lose them in between.
+# SMTP is the outbox's job (complaints/outbox.py). The one thing deferred to
+# transaction.on_commit is bumping the map cache version (complaints/geo.py), so
+# a map rebuilt meanwhile can't cache the old rows under the new version.
 
 # 1. Auto-create UserProfile for new users
 @receiver(post_save, sender=User)
@@ -9,72 +29,103 @@ def create_user_profile(sender, instance, created, **kwargs):
     if created:
         UserProfile.objects.create(user=instance)
 
-# 2. Award Points for Resolving a Complaint
+def add_points(user_id, points):
+    # OPTIMIZATION: One atomic UPDATE instead of reading and writing the profile (never below 0)
+    if not UserProfile.objects.filter(user_id=user_id).update(points=Greatest(F('points') + points, 0)):
+        if points > 0:
+            UserProfile.objects.create(user_id=user_id, points=points)
+
+def with_relations(complaint, *names):
+    """The complaint with `names` loaded: itself if they are cached, else one query for all of them."""
+    names = [name for name in names if getattr(complaint, f'{name}_id') is not None]
+    if all(Complaint._meta.get_field(name).is_cached(complaint) for name in names):
+        return complaint
+    return Complaint.objects.select_related(*names).get(pk=complaint.pk)
+
+# 2. Complaint dispatcher
+
+# Snapshot the status the complaint had before this save, so the dispatcher acts on
+# real transitions (Complaint.entered_status) and not on every re-save.
+# from_db() already remembered it; only complaints loaded without `status` cost a query.
+@receiver(pre_save, sender=Complaint)
+def snapshot_previous_status(sender, instance, **kwargs):
+    if instance._state.adding:
+        instance._previous_status = None
+    elif getattr(instance, '_loaded_status', None) is not None:
+        instance._previous_status = instance._loaded_status
+    else:
+        instance._previous_status = Complaint.objects.filter(pk=instance.pk).values_list('status', flat=True).first()
+
 @receiver(post_save, sender=Complaint)
-def award_points_resolution(sender, instance, created, **kwargs):
-    # If status changed to RESOLVED and we have a reporter
-    if instance.status == Complaint.Status.RESOLVED and instance.reporter:
-        profile, _ = UserProfile.objects.get_or_create(user=instance.reporter)
-        
-        # Simple check to avoid double counting (in a real app, use a Transaction log)
-        # Here we just add points. 
-        # Ideally we should check if points were already awarded for this complaint.
-        # For MVP, we assume status changes to RESOLVED only once.
-        profile.points += 50
-        profile.save()
-
-# 3. Award Points for Verifying (Upvoting)
+def complaint_saved(sender, instance, created, **kwargs):
+    resolved = instance.entered_status(Complaint.Status.RESOLVED) and instance.reporter_id is not None
+    # A resolved complaint that changes status again (e.g. REOPENED) may be resolved and announced again
+    left_resolved = instance._previous_status == Complaint.Status.RESOLVED and instance.status != Complaint.Status.RESOLVED
+    # The saved status becomes the baseline for the next save
+    instance._loaded_status = instance._previous_status = instance.status
+    # Drop cached map tiles and the GeoJSON snapshot (see complaints/geo.py)
+    transaction.on_commit(invalidate_map)
+
+    if not (resolved or left_resolved):
+        return
+
+    resolution_number = side_effects.resolution_number(instance)
+    if left_resolved:
+        side_effects.claim(instance, side_effects.LEFT_RESOLVED, resolution_number)
+    if resolved:
+        resolve_side_effects(instance, resolution_number)
+
+def resolve_side_effects(complaint, resolution_number):
+    # The ledger makes sure a complaint earns its points once, and allows one email per
+    # resolution; both survive a double-clicked magic link or a stale copy being saved
+    if side_effects.claim(complaint, side_effects.RESOLUTION_POINTS):
+        add_points(complaint.reporter_id, RESOLUTION_POINTS)
+    if side_effects.claim(complaint, side_effects.RESOLUTION_EMAIL, resolution_number):
+        send_resolution_email(with_relations(complaint, 'reporter', 'ward'))
+
+@receiver(post_delete, sender=Complaint)
+def complaint_deleted(sender, instance, **kwargs):
+    transaction.on_commit(invalidate_map)
+
+# 3. Verification dispatcher
 @receiver(post_save, sender=Verification)
-def award_points_verification(sender, instance, created, **kwargs):
-    if created:
-        profile, _ = UserProfile.objects.get_or_create(user=instance.user)
-        profile.points += 10
-        profile.save()
-
-from django.db.models.signals import post_delete
+def verification_saved(sender, instance, created, **kwargs):
+    if not created:
+        return
+
+    # Keep Complaint.verification_count in sync so read paths never COUNT(*) the Verification table.
+    # F() makes the increment atomic in SQL, so concurrent upvotes can't overwrite each other.
+    Complaint.objects.filter(pk=instance.complaint_id).update(verification_count=F('verification_count') + 1)
+    # One read of the new count, shared by the threshold check and the caller (the verify view)
+    complaint = instance.complaint
+    complaint.refresh_from_db(fields=['verification_count'])
+
+    add_points(instance.user_id, VERIFICATION_POINTS)
+    # The ward officer hears about the first community verification: right away if urgent,
+    # otherwise in the ward's daily digest (complaints/digest.py)
+    if complaint.verification_count == 1 and not (
+        settings.OFFICER_EMAIL_DIGEST and complaint.urgency_score < settings.OFFICER_IMMEDIATE_URGENCY
+    ):
+        send_complaint_email(with_relations(complaint, 'ward'))
 
 @receiver(post_delete, sender=Verification)
-def revoke_points_verification(sender, instance, **kwargs):
-    try:
-        profile = instance.user.profile
-        profile.points = max(0, profile.points - 10) # Prevent negative points
-        profile.save()
-    except UserProfile.DoesNotExist:
-        pass
-
-from django.core.mail import send_mail
-from django.conf import settings
-
-# 4. Send Email Notification to Ward Officer (Triggered by Verification)
-@receiver(post_save, sender=Verification)
-def check_verification_threshold(sender, instance, created, **kwargs):
-    if created:
-        complaint = instance.complaint
-        # Count total verifications (including the implicit one from the reporter if we count that, 
-        # but usually reporter is separate. Let's count actual Verification objects).
-        # Note: In our logic, reporter doesn't get a Verification object automatically, 
-        # but for this requirement "community is verifying", we can say:
-        # Threshold = 2 (1 Reporter + 1 Community Member) OR just 2 Verification objects if reporter also verifies.
-        # Let's assume we need 1 *additional* verification from the community.
-        
-        # Check if email already sent to avoid duplicates
-        # In a real app, add a 'email_sent' boolean field to Complaint model.
-        # For now, we'll just check if count is EXACTLY 1 (meaning this is the first community verification).
-        # Wait, user said "community is verifying". 
-        # If reporter creates it, count is 0. 
-        # Community member 1 verifies -> Count 1.
-        # Let's trigger on Count == 1.
-        
-        verification_count = complaint.verifications.count()
-        
-        if verification_count == 1:
-            send_complaint_email(complaint)
+def verification_deleted(sender, instance, **kwargs):
+    # verification_count__gt=0 keeps the PositiveIntegerField from going negative
+    Complaint.objects.filter(pk=instance.complaint_id, verification_count__gt=0).update(
+        verification_count=F('verification_count') - 1
+    )
+    add_points(instance.user_id, -VERIFICATION_POINTS)
+
+# 4. Emails (queued in the outbox, delivered by `send_outbox_emails`, see complaints/outbox.py)
+def resolve_link(complaint):
+    # Magic link for the officer, no login needed (see views.resolve_complaint)
+    return f"http://127.0.0.1:8000/api/resolve/{complaint.id}/{complaint.admin_token}/"
 
 def send_complaint_email(instance):
     if instance.ward and instance.ward.officer_email:
         # Generate Magic Link
-        resolve_link = f"http://127.0.0.1:8000/api/resolve/{instance.id}/{instance.admin_token}/"
-        
+        magic_link = resolve_link(instance)
+
         subject = f"New Civic Complaint: {instance.category} in Ward {instance.ward.name} (#{instance.id})"
         message = f"""
         Dear Assistant Municipal Commissioner,
@@ -93,70 +144,46 @@ def send_complaint_email(instance):
         ------------------------------------------------
 
         Please review and update the status of this complaint using the link below:
-        {resolve_link}
+        {magic_link}
 
         Thank you,
         Jan Sevak Platform
         """
-        
-        try:
-            # Determine Recipient
-            recipient_email = instance.ward.officer_email
-            if settings.EMAIL_OVERRIDE_ADDRESS:
-                recipient_email = settings.EMAIL_OVERRIDE_ADDRESS
-                print(f"Redirecting email to override address: {recipient_email}")
-
-            recipient_list = [recipient_email]
-            
-            send_mail(
-                subject,
-                message,
-                settings.EMAIL_HOST_USER,
-                recipient_list,
-                fail_silently=False,
-            )
-            print(f"Email sent to {recipient_list[0]}")
-        except Exception as e:
-            print(f"Failed to send email: {e}")
-
-# 5. Notify Citizen when Complaint is Resolved
-@receiver(post_save, sender=Complaint)
-def notify_citizen_resolution(sender, instance, created, **kwargs):
-    # Check if status is RESOLVED and we have a reporter
-    if instance.status == Complaint.Status.RESOLVED and instance.reporter:
-        # In a real app, we should check if we just changed to RESOLVED to avoid duplicate emails.
-        # For this MVP, we assume the transition happens once via the resolve_complaint view.
-        
-        subject = f"[Jan Sevak] Good News! Your Complaint is Resolved: {instance.title}"
-        message = f"""
-        Dear {instance.reporter.username},
 
-        Great news! The complaint you reported has been marked as RESOLVED by the authorities.
+        # Determine Recipient
+        recipient_email = instance.ward.officer_email
+        if settings.EMAIL_OVERRIDE_ADDRESS:
+            recipient_email = settings.EMAIL_OVERRIDE_ADDRESS
+            print(f"Redirecting email to override address: {recipient_email}")
 
-        Title: {instance.title}
-        Ward: {instance.ward.name if instance.ward else 'N/A'}
-        
-        Please log in to your dashboard to CONFIRM that the issue is actually fixed.
-        Your confirmation helps us ensure quality.
+        # OPTIMIZATION: Stored in the outbox and sent by `send_outbox_emails`,
+        # so the verify request never waits on the SMTP server.
+        queue_email(subject, message, [recipient_email], complaint=instance)
+        Complaint.objects.filter(pk=instance.pk).update(officer_notified_at=timezone.now())
+        print(f"Email queued for {recipient_email}")
 
-        Thank you for being an active citizen!
-        
-        Regards,
-        Jan Sevak Team
-        """
-        
-        try:
-            # FOR TESTING: Send to dummy email
-            recipient_list = ["poojary.rupesh12@gmail.com"]
-            # In production: recipient_list = [instance.reporter.email]
-            
-            send_mail(
-                subject,
-                message,
-                settings.EMAIL_HOST_USER,
-                recipient_list,
-                fail_silently=False,
-            )
-            print(f"Resolution Email sent to {recipient_list[0]}")
-        except Exception as e:
-            print(f"Failed to send resolution email: {e}")
+def send_resolution_email(instance):
+    subject = f"[Jan Sevak] Good News! Your Complaint is Resolved: {instance.title}"
+    message = f"""
+    Dear {instance.reporter.username},
+
+    Great news! The complaint you reported has been marked as RESOLVED by the authorities.
+
+    Title: {instance.title}
+    Ward: {instance.ward.name if instance.ward else 'N/A'}
+
+    Please log in to your dashboard to CONFIRM that the issue is actually fixed.
+    Your confirmation helps us ensure quality.
+
+    Thank you for being an active citizen!
+
+    Regards,
+    Jan Sevak Team
+    """
+
+    # FOR TESTING: Send to dummy email
+    recipient_list = ["poojary.rupesh12@gmail.com"]
+    # In production: recipient_list = [instance.reporter.email]
+
+    queue_email(subject, message, recipient_list, complaint=instance)
+    print(f"Resolution Email queued for {recipient_list[0]}")
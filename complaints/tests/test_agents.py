@@ -76,3 +76,26 @@ class TestEscalationAgent:
         assert complaint.status == Complaint.Status.ESCALATED
         assert complaint.escalation_level == 1
         assert result["final_status"] == "ESCALATED"
+
+    @patch("complaints.agents.escalation_agent.ChatGoogleGenerativeAI")
+    def test_run_agent_command_shares_one_smtp_session(self, MockLLMClass, complaint, ward, settings):
+        """Test that run_agent escalates the given complaints over one mail connection."""
+        from django.core import mail
+        from django.core.management import call_command
+        from complaints import mailer
+
+        settings.EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
+        settings.EMAIL_OVERRIDE_ADDRESS = None
+        MockLLMClass.return_value.invoke.return_value = MagicMock(content="Drafted Legal Notice")
+        other = Complaint.objects.create(
+            title="Agent Test 2", description="Fix me too", category="POTHOLE", ward=ward,
+            latitude=18.9, longitude=72.8, urgency_score=9, status=Complaint.Status.NEW
+        )
+        Complaint.objects.filter(pk=other.pk).update(created_at=timezone.now() - timedelta(hours=25))
+
+        with patch.object(mailer, 'get_connection', wraps=mailer.get_connection) as get_connection:
+            call_command('run_agent', complaint.id, other.id)
+
+        assert get_connection.call_count == 1
+        assert len(mail.outbox) == 2
+        assert set(Complaint.objects.values_list('status', flat=True)) == {Complaint.Status.ESCALATED}
@@ -0,0 +1,538 @@
+import os
+import threading
+import pytest
+from unittest.mock import patch
+from complaints import ai_service
+
+
+class TestProviderRegistry:
+    @pytest.fixture(autouse=True)
+    def clean_registry(self):
+        ai_service.reset_providers()
+        ai_service.verdict_cache().clear()
+        with patch.object(ai_service, 'prefilter', return_value=None):
+            yield
+        ai_service.reset_providers()
+
+    @patch.dict(os.environ, {"AI_PROVIDER": "openai", "OPENAI_API_KEY": "test"})
+    def test_provider_is_created_once_per_process(self):
+        provider = ai_service.get_provider()
+        assert isinstance(provider, ai_service.OpenAIProvider)
+        assert ai_service.get_provider() is provider
+        assert ai_service.get_provider().client is provider.client
+
+    @patch.dict(os.environ, {"AI_PROVIDER": "grok", "GROK_API_KEY": "test"})
+    def test_concurrent_first_use_builds_one_client(self):
+        with patch.object(ai_service.GrokProvider, '__init__', autospec=True, return_value=None) as init:
+            barrier = threading.Barrier(8)
+            seen = []
+
+            def worker():
+                barrier.wait()
+                seen.append(ai_service.get_provider())
+
+            threads = [threading.Thread(target=worker) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        assert init.call_count == 1
+        assert len({id(provider) for provider in seen}) == 1
+
+    @patch.dict(os.environ, {"AI_PROVIDER": "openai", "OPENAI_API_KEY": "test"})
+    def test_forked_child_builds_its_own_client(self):
+        provider = ai_service.get_provider()
+        ai_service._reset_after_fork()  # what os.register_at_fork runs in the child
+        assert ai_service.get_provider() is not provider
+
+    @patch.dict(os.environ, {"AI_PROVIDER": "gemini", "GEMINI_API_KEY": "test"})
+    def test_gemini_is_configured_once(self):
+        with patch.object(ai_service.genai, 'configure') as configure, \
+                patch.object(ai_service.genai, 'GenerativeModel') as model:
+            model.return_value.generate_content.return_value.text = (
+                '{"is_safe": true, "is_civic_issue": true, "urgency_score": 5, "category_matches": true}'
+            )
+            for _ in range(3):
+                assert ai_service.analyze_complaint(None, "Garbage pile", "GARBAGE") == (True, None, 5, True)
+
+        assert configure.call_count == 1
+        assert model.call_count == 1
+
+
+class TestPrepareImage:
+    def make_photo(self, path, size=(4000, 3000), orientation=None):
+        from PIL import Image
+        image = Image.radial_gradient('L').convert('RGB').resize(size)
+        exif = Image.Exif()
+        if orientation:
+            exif[0x0112] = orientation
+        image.save(path, 'JPEG', quality=95, exif=exif)
+        return path
+
+    def test_phone_photo_is_downscaled(self, tmp_path):
+        from PIL import Image
+        import io
+
+        path = self.make_photo(tmp_path / "photo.jpg")
+        data, mime_type = ai_service.prepare_image(str(path))
+
+        assert mime_type == 'image/jpeg'
+        assert len(data) < os.path.getsize(path)
+        with Image.open(io.BytesIO(data)) as prepared:
+            assert prepared.size == (1024, 768)
+
+    def test_jpeg_is_decoded_in_draft_mode(self, tmp_path):
+        from PIL import JpegImagePlugin
+
+        path = self.make_photo(tmp_path / "photo.jpg")
+        with patch.object(JpegImagePlugin.JpegImageFile, 'draft', autospec=True,
+                          side_effect=JpegImagePlugin.JpegImageFile.draft) as draft:
+            ai_service.prepare_image(str(path))
+        draft.assert_called_once()
+
+    def test_upload_bytes_match_stored_file(self, tmp_path):
+        # Uploads are moderated before they are stored, from their bytes
+        path = self.make_photo(tmp_path / "photo.jpg")
+        raw = path.read_bytes()
+
+        assert ai_service.prepare_image(raw) == ai_service.prepare_image(str(path))
+        assert ai_service.verdict_cache_key(raw, "Pothole", "POTHOLE", "gemini") == \
+            ai_service.verdict_cache_key(str(path), "Pothole", "POTHOLE", "gemini")
+        assert ai_service.prepare_image(b"") is None
+
+    def test_exif_rotation_is_applied(self, tmp_path):
+        from PIL import Image
+        import io
+
+        path = self.make_photo(tmp_path / "rotated.jpg", orientation=6)  # portrait shot held sideways
+        data, _ = ai_service.prepare_image(str(path))
+        with Image.open(io.BytesIO(data)) as prepared:
+            assert prepared.size == (768, 1024)
+
+    def test_png_with_alpha(self, tmp_path):
+        from PIL import Image
+
+        path = tmp_path / "screenshot.png"
+        Image.new('RGBA', (2048, 2048), (255, 0, 0, 128)).save(path)
+        data, mime_type = ai_service.prepare_image(str(path))
+        assert mime_type == 'image/jpeg' and data
+
+    def test_missing_or_broken_image(self, tmp_path):
+        broken = tmp_path / "broken.jpg"
+        broken.write_bytes(b"not an image")
+        assert ai_service.prepare_image(None) is None
+        assert ai_service.prepare_image(str(tmp_path / "missing.jpg")) is None
+        assert ai_service.prepare_image(str(broken)) is None
+
+    @patch.dict(os.environ, {"AI_PROVIDER": "gemini", "GEMINI_API_KEY": "test"})
+    def test_gemini_sends_image_inline(self, tmp_path):
+        ai_service.reset_providers()
+        ai_service.verdict_cache().clear()
+        path = self.make_photo(tmp_path / "photo.jpg")
+        with patch.object(ai_service.genai, 'configure'), \
+                patch.object(ai_service.genai, 'upload_file') as upload_file, \
+                patch.object(ai_service.genai, 'GenerativeModel') as model:
+            model.return_value.generate_content.return_value.text = '{"urgency_score": 4, "category_matches": true}'
+            assert ai_service.analyze_complaint(str(path), "Big pothole near the bus stop", "POTHOLE") == (True, None, 4, True)
+        ai_service.reset_providers()
+
+        upload_file.assert_not_called()
+        parts = model.return_value.generate_content.call_args.args[0]
+        assert parts[0]["mime_type"] == 'image/jpeg'
+        assert len(parts[0]["data"]) < os.path.getsize(path)
+
+
+@pytest.mark.django_db
+class TestVerdictCache:
+    @pytest.fixture(autouse=True)
+    def clean_cache(self):
+        ai_service.verdict_cache().clear()
+        with patch.object(ai_service, 'prefilter', return_value=None):
+            yield
+        ai_service.verdict_cache().clear()
+
+    @pytest.fixture
+    def provider(self):
+        with patch.object(ai_service, 'get_provider') as get_provider:
+            get_provider.return_value.analyze.return_value = (True, None, 6, True)
+            yield get_provider.return_value
+
+    @patch.dict(os.environ, {"AI_PROVIDER": "openai"})
+    def test_same_content_skips_the_provider(self, provider, tmp_path):
+        first = tmp_path / "upload.jpg"
+        first.write_bytes(b"same photo bytes")
+        resubmitted = tmp_path / "upload_AbC123.jpg"
+        resubmitted.write_bytes(b"same photo bytes")
+
+        assert ai_service.analyze_complaint(str(first), "Big  pothole\n", "pothole") == (True, None, 6, True)
+        assert ai_service.analyze_complaint(str(resubmitted), "big pothole", "POTHOLE") == (True, None, 6, True)
+
+        assert provider.analyze.call_count == 1
+        assert ai_service.verdict_cache_stats() == {"hits": 1, "misses": 1, "hit_rate": 0.5}
+
+    @patch.dict(os.environ, {"AI_PROVIDER": "openai"})
+    def test_key_covers_image_category_and_provider(self, provider, tmp_path):
+        photo = tmp_path / "a.jpg"
+        photo.write_bytes(b"photo a")
+        other = tmp_path / "b.jpg"
+        other.write_bytes(b"photo b")
+
+        ai_service.analyze_complaint(str(photo), "Pothole", "POTHOLE")
+        ai_service.analyze_complaint(str(other), "Pothole", "POTHOLE")
+        ai_service.analyze_complaint(str(photo), "Pothole", "ROADS")
+        with patch.dict(os.environ, {"AI_PROVIDER": "grok"}):
+            ai_service.analyze_complaint(str(photo), "Pothole", "POTHOLE")
+
+        assert provider.analyze.call_count == 4
+
+    @patch.dict(os.environ, {"AI_PROVIDER": "openai"})
+    def test_rejections_are_cached_but_outages_are_not(self, provider):
+        provider.analyze.return_value = (False, "Selfie, not a civic issue", 0, False)
+        ai_service.analyze_complaint(None, "me", "OTHERS")
+        ai_service.analyze_complaint(None, "me", "OTHERS")
+        assert provider.analyze.call_count == 1
+
+        provider.analyze.return_value = (False, ai_service.SERVICE_UNAVAILABLE, 0, False)
+        ai_service.analyze_complaint(None, "Garbage", "GARBAGE")
+        ai_service.analyze_complaint(None, "Garbage", "GARBAGE")
+        assert provider.analyze.call_count == 3
+
+
+class FakeProvider:
+    def __init__(self, result=(True, None, 5, True), delay=0.0, error=None):
+        self.result, self.delay, self.error = result, delay, error
+        self.calls = 0
+
+    def analyze(self, image_path, description, category):
+        import time
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return self.result
+
+
+class TestFailoverChain:
+    @pytest.fixture(autouse=True)
+    def fast_timings(self, monkeypatch):
+        monkeypatch.setattr(ai_service, 'AI_CALL_DEADLINE', 0.5)
+        monkeypatch.setattr(ai_service, 'AI_TOTAL_DEADLINE', 1.0)
+        monkeypatch.setattr(ai_service, 'AI_HEDGE_DELAY', 0.1)
+        monkeypatch.setattr(ai_service, 'HEDGE_MIN_DELAY', 0.01)
+        ai_service._health.clear()
+        yield
+        ai_service._health.clear()
+
+    def run(self, providers, chain=None):
+        with patch.object(ai_service, 'get_provider', side_effect=lambda name: providers[name]):
+            return ai_service.analyze_with_failover(None, "Pothole", "POTHOLE", chain or list(providers))
+
+    def test_fails_over_on_errors_and_outages(self):
+        providers = {
+            'gemini': FakeProvider(error=RuntimeError("500")),
+            'openai': FakeProvider(result=(False, ai_service.SERVICE_UNAVAILABLE, 0, False)),
+            'grok': FakeProvider(result=(True, None, 7, True)),
+        }
+        assert self.run(providers) == (True, None, 7, True)
+        assert [p.calls for p in providers.values()] == [1, 1, 1]
+
+    def test_a_real_rejection_is_final(self):
+        providers = {'gemini': FakeProvider(result=(False, "Selfie", 0, False)), 'openai': FakeProvider()}
+        assert self.run(providers) == (False, "Selfie", 0, False)
+        assert providers['openai'].calls == 0
+
+    def test_slow_provider_is_hedged(self):
+        import time
+        providers = {'gemini': FakeProvider(delay=0.4), 'openai': FakeProvider(result=(True, None, 3, True))}
+        start = time.monotonic()
+        assert self.run(providers) == (True, None, 3, True)
+        assert time.monotonic() - start < 0.3
+        assert providers['gemini'].calls == providers['openai'].calls == 1
+
+    def test_deadline_bounds_a_hung_provider(self):
+        import time
+        providers = {'gemini': FakeProvider(delay=3)}
+        start = time.monotonic()
+        assert self.run(providers) == (False, ai_service.SERVICE_UNAVAILABLE, 0, False)
+        assert time.monotonic() - start < 1.5
+
+    def test_circuit_breaker_skips_a_failing_provider(self, monkeypatch):
+        providers = {'gemini': FakeProvider(error=RuntimeError("quota")), 'openai': FakeProvider()}
+        for _ in range(ai_service.BREAKER_FAILURE_THRESHOLD):
+            self.run(providers)
+        assert ai_service.provider_health('gemini').breaker.state == ai_service.CircuitBreaker.OPEN
+
+        self.run(providers)
+        assert providers['gemini'].calls == ai_service.BREAKER_FAILURE_THRESHOLD
+
+        # After the reset timeout one trial call is let through; success closes the circuit
+        breaker = ai_service.provider_health('gemini').breaker
+        breaker.opened_at -= ai_service.BREAKER_RESET_TIMEOUT
+        providers['gemini'].error = None
+        self.run(providers)
+        assert providers['gemini'].calls == ai_service.BREAKER_FAILURE_THRESHOLD + 1
+        assert breaker.state == ai_service.CircuitBreaker.CLOSED
+
+    def test_rate_limit_waits_are_not_provider_failures(self, monkeypatch):
+        limiter = ai_service.RateLimiter(rpm=600)
+        limiter.tokens = -2  # next token in 0.3s, longer than the hedge delay
+        monkeypatch.setitem(ai_service._rate_limiters, 'gemini', limiter)
+        providers = {'gemini': FakeProvider(result=(True, None, 4, True)), 'openai': FakeProvider()}
+        assert self.run(providers) == (True, None, 4, True)
+        assert providers['openai'].calls == 0
+
+        # No capacity before the deadline: skipped, but the breaker doesn't hold it against the provider
+        monkeypatch.setitem(ai_service._rate_limiters, 'gemini', ai_service.RateLimiter(rpm=1))
+        ai_service._rate_limiters['gemini'].tokens = 0
+        assert self.run(providers) == (True, None, 5, True)
+        assert providers['gemini'].calls == 1
+        assert ai_service.provider_health('gemini').breaker.failures == 0
+
+    def test_hedge_delay_tracks_p95(self):
+        health = ai_service.ProviderHealth()
+        assert health.hedge_delay() == ai_service.AI_HEDGE_DELAY
+        health.latencies.extend([0.2] * 95 + [5.0] * 5)
+        assert health.hedge_delay() == 0.2
+
+
+class TestRateLimiter:
+    def test_bucket_limits_rate(self):
+        import time
+        limiter = ai_service.RateLimiter(rpm=600)  # 10/s, bursts of 100
+        limiter.tokens = 1
+        start = time.monotonic()
+        for _ in range(4):
+            assert limiter.acquire()
+        assert time.monotonic() - start >= 0.25
+
+    def test_acquire_gives_up_after_timeout(self):
+        limiter = ai_service.RateLimiter(rpm=1)
+        assert limiter.acquire(timeout=0)
+        assert not limiter.acquire(timeout=0.01)
+
+
+@pytest.mark.django_db
+class TestPrefilter:
+    @pytest.fixture(autouse=True)
+    def clean_stats(self):
+        ai_service.verdict_cache().clear()
+        yield
+        ai_service.verdict_cache().clear()
+
+    def test_matcher_finds_whole_words_only(self):
+        matcher = ai_service.AhoCorasick({"ass": "abuse", "he": "x", "she": "y", "hers": "z"})
+        assert [label for _, _, label in matcher.find("first class service")] == []
+        assert sorted(label for _, _, label in matcher.find("she said hers")) == ["y", "z"]
+
+    @pytest.mark.parametrize("description", [
+        "Fix this road you bastard, nobody cares",
+        "Fuuuuck this pothole near the market",
+        "ये सड़क ठीक करो हरामखोर लोग कुछ नहीं करते",
+        "रस्ता दुरुस्त करा भडव्या लोकांनो लवकर",
+        "bhenchod road is broken since months",
+    ])
+    def test_abuse_is_rejected_locally(self, description):
+        with patch.object(ai_service, 'analyze_with_failover') as provider:
+            verdict = ai_service.analyze_complaint(None, description, "POTHOLE")
+        provider.assert_not_called()
+        assert verdict == (False, ai_service.PREFILTER_REASONS["abuse_lexicon"], 0, False)
+
+    @pytest.mark.parametrize("description, rule", [
+        ("help", "too_short"),
+        ("aaaaaaaaaaaaaaaaaaaaaa road", "repetition"),
+        ("road road road road road road broken", "repetition"),
+        ("Great deals at http://spam.example/x and www.cheap.xyz", "url_spam"),
+    ])
+    def test_structural_checks(self, description, rule):
+        assert ai_service.prefilter(description, "POTHOLE", has_image=False)[1] == ai_service.PREFILTER_REASONS[rule]
+        assert ai_service.prefilter_stats()[rule] == 1
+
+    def test_fast_track_is_off_by_default(self):
+        assert ai_service.AI_PREFILTER_FAST_TRACK is False
+        assert ai_service.prefilter("Kill all the people of that community, garbage dump here", "GARBAGE", False) is None
+        assert ai_service.prefilter_stats()["fast_track"] == 0
+
+    def test_refresh_skips_the_prefilter(self):
+        with patch.object(ai_service, 'analyze_with_failover', return_value=(True, None, 8, True)) as provider, \
+                patch.object(ai_service, 'AI_PREFILTER_FAST_TRACK', True):
+            assert ai_service.analyze_complaint(None, "Huge pothole outside the school gate", "POTHOLE", refresh=True) == (True, None, 8, True)
+        provider.assert_called_once()
+
+    @patch.object(ai_service, 'AI_PREFILTER_FAST_TRACK', True)
+    def test_clean_text_only_complaint_is_fast_tracked_when_enabled(self):
+        assert ai_service.prefilter("Huge pothole outside the school gate", "POTHOLE", has_image=False) == (True, None, 5, True)
+        assert ai_service.prefilter("सोसायटी के बाहर बिजली का झटका, करंट वाली तार और नाली", "DRAINAGE", has_image=False) == (True, None, 9, True)
+        assert ai_service.prefilter("रस्त्यावर मोठे खड्डे पडले आहेत", "pothole", has_image=False) == (True, None, 5, True)
+        assert ai_service.prefilter_stats()["fast_track"] == 3
+
+    def test_photos_and_unclear_text_still_go_to_the_llm(self):
+        assert ai_service.prefilter("Huge pothole outside the school gate", "POTHOLE", has_image=True) is None
+        assert ai_service.prefilter("Huge pothole outside the school gate", "GARBAGE", has_image=False) is None
+        assert ai_service.prefilter("Something is wrong in our lane", "OTHERS", has_image=False) is None
+        assert sum(ai_service.prefilter_stats().values()) == 0
+
+
+class TestRecordReplay:
+    @pytest.fixture(autouse=True)
+    def clean(self):
+        ai_service.reset_providers()
+        ai_service.verdict_cache().clear()
+        with patch.object(ai_service, 'prefilter', return_value=None):
+            yield
+        ai_service.reset_providers()
+
+    @pytest.fixture
+    def cassette(self, tmp_path):
+        """Records two verdicts from a (fake) real provider."""
+        path = tmp_path / "cassette.jsonl"
+        real = FakeProvider(result=(True, None, 8, True), delay=0.05)
+        recorder = ai_service.RecordingProvider(real, "gemini", str(path))
+        recorder.analyze(None, "Open manhole on the main road", "DRAINAGE")
+        real.result = (False, "Selfie, not a civic issue", 0, False)
+        recorder.analyze(None, "Look at my new haircut", "OTHERS")
+        real.result = (False, ai_service.SERVICE_UNAVAILABLE, 0, False)
+        recorder.analyze(None, "Outage, not recorded", "OTHERS")
+        return path
+
+    def test_record_mode_captures_verdicts_and_latency(self, cassette):
+        import json
+        entries = [json.loads(line) for line in cassette.read_text().splitlines()]
+        assert [entry["verdict"] for entry in entries] == [[True, None, 8, True], [False, "Selfie, not a civic issue", 0, False]]
+        assert all(entry["latency_ms"] >= 50 and entry["provider"] == "gemini" for entry in entries)
+
+    def test_get_provider_records_when_asked(self, tmp_path):
+        with patch.dict(os.environ, {"AI_PROVIDER": "openai", "OPENAI_API_KEY": "test", "AI_RECORD_CASSETTE": str(tmp_path / "c.jsonl")}):
+            assert isinstance(ai_service.get_provider(), ai_service.RecordingProvider)
+
+    def test_replay_returns_recorded_verdicts(self, cassette):
+        env = {"AI_PROVIDER": "replay", "AI_REPLAY_CASSETTE": str(cassette), "AI_REPLAY_LATENCY": "none"}
+        with patch.dict(os.environ, env):
+            assert ai_service.analyze_complaint(None, "Look at my  new haircut", "OTHERS") == (False, "Selfie, not a civic issue", 0, False)
+            # Unseen content still gets one of the recorded verdicts, always the same one
+            unseen = ai_service.get_provider().analyze(None, "Never recorded", "OTHERS")
+            assert unseen == ai_service.get_provider().analyze(None, "Never recorded", "OTHERS")
+            assert list(unseen) in ([True, None, 8, True], [False, "Selfie, not a civic issue", 0, False])
+
+    def test_replay_latency_and_errors(self, cassette):
+        import time
+        env = {
+            "AI_REPLAY_CASSETTE": str(cassette), "AI_REPLAY_LATENCY": "fixed:20",
+            "AI_REPLAY_SLOWDOWN": "2", "AI_REPLAY_ERROR_RATE": "1",
+        }
+        with patch.dict(os.environ, env):
+            provider = ai_service.ReplayProvider()
+        start = time.monotonic()
+        assert provider.analyze(None, "Open manhole on the main road", "DRAINAGE") == (False, ai_service.SERVICE_UNAVAILABLE, 0, False)
+        assert time.monotonic() - start >= 0.04
+
+    @pytest.mark.parametrize("spec", ["recorded", "none", "fixed:800", "uniform:200,1500", "lognormal:900,0.5"])
+    def test_latency_specs(self, spec):
+        import random
+        delay = ai_service.parse_latency_spec(spec)({"latency_ms": 700}, random.Random(1))
+        assert 0 <= delay < 10
+
+    def test_invalid_latency_spec(self):
+        with pytest.raises(ValueError):
+            ai_service.parse_latency_spec("gaussian:1")
+
+
+@pytest.mark.django_db
+class TestInstrumentation:
+    @pytest.fixture(autouse=True)
+    def clean(self):
+        ai_service.verdict_cache().clear()
+        ai_service._health.clear()
+        ai_service.ai_metrics._pending.clear()
+        yield
+        ai_service.verdict_cache().clear()
+
+    def test_every_call_is_recorded(self):
+        from complaints import ai_metrics
+
+        class TokenReportingProvider(FakeProvider):
+            MODEL_NAME = "fake-1"
+
+            def analyze(self, image_path, description, category):
+                ai_metrics.note_usage(120, 30)
+                ai_metrics.note_image_bytes(50_000)
+                return super().analyze(image_path, description, category)
+
+        providers = {'gemini': TokenReportingProvider(delay=0.02), 'openai': FakeProvider(error=RuntimeError("boom"))}
+        with patch.object(ai_service, 'get_provider', side_effect=lambda name: providers[name]):
+            for _ in range(3):
+                ai_service.analyze_with_failover(None, "Pothole", "POTHOLE", ['gemini'])
+            ai_service.analyze_with_failover(None, "Pothole", "POTHOLE", ['openai'])
+
+        gemini = ai_metrics.provider_metrics('gemini')
+        assert gemini["calls"] == 3
+        assert gemini["outcomes"]["accepted"] == 3
+        assert gemini["tokens"] == {"prompt": 360, "completion": 90}
+        assert gemini["image_bytes"]["avg"] == 50_000
+        assert 0 < gemini["latency_ms"]["p50"] <= 100
+        assert gemini["latency_ms"]["histogram"]["+Inf"] == 3
+        assert ai_metrics.provider_metrics('openai')["outcomes"]["exception"] == 1
+        assert gemini["models"] == {"fake-1": 3}
+
+    def test_pool_threads_never_write_metrics(self):
+        from complaints import ai_metrics
+
+        writers = []
+        add = ai_metrics.add
+
+        def spy(scope, deltas):
+            writers.append(threading.current_thread().name)
+            add(scope, deltas)
+
+        with patch.object(ai_service, 'get_provider', return_value=FakeProvider(delay=0.02)), \
+                patch.object(ai_metrics, 'add', side_effect=spy):
+            ai_service.analyze_with_failover(None, "Pothole", "POTHOLE", ['gemini'])
+
+        # Written once, by the caller; the pool thread only buffered the call
+        assert writers == [threading.current_thread().name]
+        assert ai_metrics.provider_metrics('gemini')["calls"] == 1
+
+    def test_counters_are_shared_and_never_evicted(self):
+        from django.core.cache import caches
+        from complaints import ai_metrics
+
+        for _ in range(2):  # the first call creates the counters, the second only bumps them
+            with ai_metrics.instrument_call('openai', 'gpt-4o-mini') as call:
+                call.result = (True, None, 5, True)
+        # Nothing lives in this process's caches: another process (ai_latency_report) sees the same rows
+        for alias in caches:
+            caches[alias].clear()
+        metrics = ai_metrics.provider_metrics('openai')
+        assert metrics["calls"] == 2
+        assert metrics["outcomes"]["accepted"] == 2
+
+    def test_parse_failures_are_counted(self):
+        from complaints import ai_metrics
+
+        with ai_metrics.instrument_call('grok', 'grok-beta') as call:
+            call.result = ai_service.GrokProvider._parse_response(None, "not json")
+        metrics = ai_metrics.provider_metrics('grok')
+        assert metrics["parse_failures"] == 1
+        assert metrics["outcomes"]["parse_error"] == 1
+
+    def test_percentile_from_histogram(self):
+        from complaints.ai_metrics import LATENCY_BUCKETS_MS, percentile
+
+        buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        buckets[3] = 90  # 500-1000 ms
+        buckets[5] = 10  # 2000-3000 ms
+        assert 500 < percentile(buckets, 0.5) < 1000
+        assert 2000 < percentile(buckets, 0.95) <= 3000
+        assert percentile([0] * len(buckets), 0.5) is None
+
+    def test_latency_report_command(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from complaints import ai_metrics
+
+        with ai_metrics.instrument_call('openai', 'gpt-4o-mini') as call:
+            call.result = (True, None, 5, True)
+        out = StringIO()
+        call_command('ai_latency_report', '--reset', stdout=out)
+        assert "openai" in out.getvalue() and "gpt-4o-mini" in out.getvalue()
+        assert ai_metrics.provider_metrics('openai')["calls"] == 0
@@ -1,6 +1,8 @@
 import pytest
-from complaints.models import Complaint, Ward
+from complaints.models import Complaint, Ward, Verification
+from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
+from django.core.management import call_command
 
 @pytest.mark.django_db
 class TestComplaintModel:
@@ -51,3 +53,413 @@ class TestComplaintModel:
             longitude=72.82
         )
         assert str(complaint) == f"{complaint.category} in {complaint.ward} ({complaint.status})"
+
+
+@pytest.mark.django_db
+class TestVerificationCounter:
+    @pytest.fixture
+    def complaint(self):
+        ward = Ward.objects.create(name="D", full_name="Grant Road", officer_email="ac.d@mcgm.gov.in")
+        return Complaint.objects.create(
+            title="Overflowing Drain",
+            description="Water on the road",
+            category="DRAINAGE",
+            ward=ward,
+            latitude=18.96,
+            longitude=72.81
+        )
+
+    def test_counter_follows_verifications(self, complaint):
+        """Test that verification_count is bumped on create and decremented on delete."""
+        users = [User.objects.create_user(username=f"citizen{i}", password="123") for i in range(3)]
+        verifications = [Verification.objects.create(complaint=complaint, user=u) for u in users]
+
+        complaint.refresh_from_db()
+        assert complaint.verification_count == 3
+
+        verifications[0].delete()
+        complaint.refresh_from_db()
+        assert complaint.verification_count == 2
+
+    def test_saving_a_stale_copy_keeps_the_counter(self, complaint):
+        """Test that complaint.save() of a copy loaded before an upvote doesn't write back the old count."""
+        from django.utils import timezone
+
+        stale = Complaint.objects.get(pk=complaint.pk)
+        Verification.objects.create(complaint=complaint, user=User.objects.create_user(username="citizen", password="123"))
+        Complaint.objects.filter(pk=complaint.pk).update(officer_notified_at=timezone.now())
+
+        stale.status = Complaint.Status.ESCALATED
+        stale.save()
+
+        complaint.refresh_from_db()
+        assert complaint.status == Complaint.Status.ESCALATED
+        assert complaint.verification_count == 1
+        assert complaint.officer_notified_at is not None
+
+    def test_rebuild_command_repairs_drift(self, complaint):
+        """Test that rebuild_verification_counts recomputes the column from the table."""
+        user = User.objects.create_user(username="citizen", password="123")
+        Verification.objects.create(complaint=complaint, user=user)
+        Complaint.objects.filter(pk=complaint.pk).update(verification_count=42)
+
+        other = Complaint.objects.create(title="Dry drain", description="Nothing yet", category="DRAINAGE", ward=complaint.ward)
+        Complaint.objects.filter(pk=other.pk).update(verification_count=3)
+
+        call_command('rebuild_verification_counts', chunk_size=1)
+
+        complaint.refresh_from_db()
+        other.refresh_from_db()
+        assert (complaint.verification_count, other.verification_count) == (1, 0)
+
+    def test_migration_backfills_counts_and_notified_officers(self, complaint):
+        """Test that complaints verified before the counter was maintained are counted and not re-sent to the officer."""
+        from importlib import import_module
+        from django.apps import apps
+
+        Verification.objects.create(complaint=complaint, user=User.objects.create_user(username="citizen", password="123"))
+        Complaint.objects.filter(pk=complaint.pk).update(verification_count=0, officer_notified_at=None)
+
+        import_module('complaints.migrations.0016_complaint_officer_notified_at').mark_already_notified(apps, None)
+        import_module('complaints.migrations.0019_backfill_verification_counts').backfill_verification_counts(apps, None)
+
+        complaint.refresh_from_db()
+        assert complaint.verification_count == 1
+        assert complaint.officer_notified_at is not None
+
+
+@pytest.mark.django_db
+class TestRescoreCommand:
+    @pytest.fixture
+    def complaints(self):
+        ward = Ward.objects.create(name="E", full_name="Byculla", officer_email="ac.e@mcgm.gov.in")
+        return Complaint.objects.bulk_create([
+            Complaint(title=f"Pothole {i}", description=f"Pothole number {i}", category="POTHOLE", ward=ward, urgency_score=1)
+            for i in range(7)
+        ])
+
+    def run(self, checkpoint, verdict, **options):
+        from io import StringIO
+        from unittest.mock import patch
+
+        with patch('complaints.ai_service.analyze_complaint', side_effect=verdict) as analyze:
+            call_command('rescore_complaints', checkpoint=str(checkpoint), chunk_size=3, rpm=0, stdout=StringIO(), **options)
+        return [call.args[1] for call in analyze.call_args_list]
+
+    def test_rescores_and_resumes_from_checkpoint(self, complaints, tmp_path):
+        """Test that an interrupted run picks up after the last written chunk."""
+        checkpoint = tmp_path / "rescore.json"
+        verdict = lambda image, description, category, refresh: (True, None, 9, True)
+
+        first = self.run(checkpoint, verdict, limit=3)
+        assert len(first) == 3
+        assert checkpoint.exists()
+
+        second = self.run(checkpoint, verdict)
+        assert sorted(first + second) == sorted(c.description for c in complaints)
+        assert set(Complaint.objects.values_list('urgency_score', flat=True)) == {9}
+        assert not checkpoint.exists()  # finished
+
+    def test_provider_failures_are_left_untouched(self, complaints, tmp_path):
+        from complaints.ai_service import SERVICE_UNAVAILABLE
+
+        def verdict(image, description, category, refresh):
+            if description.endswith("3"):
+                return False, SERVICE_UNAVAILABLE, 0, False
+            return True, None, 6, True
+
+        self.run(tmp_path / "rescore.json", verdict)
+        scores = dict(Complaint.objects.values_list('description', 'urgency_score'))
+        assert scores.pop("Pothole number 3") == 1
+        assert set(scores.values()) == {6}
+
+    def test_flagged_complaints_keep_their_scores(self, complaints, tmp_path):
+        def verdict(image, description, category, refresh):
+            if description.endswith("3"):
+                return False, "Not a civic issue", 0, False
+            return True, None, 6, True
+
+        self.run(tmp_path / "rescore.json", verdict)
+        scores = dict(Complaint.objects.values_list('description', 'urgency_score'))
+        assert scores.pop("Pothole number 3") == 1
+        assert set(scores.values()) == {6}
+
+
+@pytest.mark.django_db
+class TestUploadBenchmarkCommand:
+    def test_reports_io_per_submission_and_rolls_back(self):
+        from io import StringIO
+
+        out = StringIO()
+        call_command('benchmark_complaint_uploads', '--submissions', '2', stdout=out)
+        rows = [line.split() for line in out.getvalue().splitlines() if line.strip().startswith(('accepted', 'rejected'))]
+        # outcome, 3 words of flow label, DB writes, files written, KB, files deleted, ms
+        by_flow = {(row[0], row[1]): row[4:8] for row in rows}
+        assert by_flow[('rejected', 'moderate,')][:2] == ['0.0', '0.0']
+        assert by_flow[('accepted', 'moderate,')][:2] == ['1.0', '1.0']
+        assert not Complaint.objects.exists()
+        assert not User.objects.filter(username='upload-benchmark').exists()
+
+
+@pytest.mark.django_db
+class TestSignalBenchmarkCommand:
+    def test_dispatcher_needs_no_more_queries_and_rolls_back(self):
+        from io import StringIO
+
+        out = StringIO()
+        call_command('benchmark_signal_queries', stdout=out)
+        rows = {line.split()[0]: [int(n) for n in line.split()[2:]]
+                for line in out.getvalue().splitlines() if line.strip().startswith('per-')}
+        legacy, dispatcher = rows['per-receiver'], rows['per-model']
+        assert dispatcher[0] <= legacy[0] and dispatcher[1] <= legacy[1]
+        # Both pipelines queue the officer and the resolution email
+        assert legacy[3] == dispatcher[3] == 2
+        assert not Complaint.objects.exists()
+        assert not User.objects.filter(username__startswith='signal-benchmark').exists()
+
+
+@pytest.mark.django_db
+class TestEmailOutbox:
+    @pytest.fixture
+    def complaint(self):
+        ward = Ward.objects.create(name="F/N", full_name="Matunga", officer_email="ac.fn@mcgm.gov.in")
+        reporter = User.objects.create_user(username="reporter", password="pw")
+        return Complaint.objects.create(title="Garbage", description="Garbage pile", category="GARBAGE", ward=ward, reporter=reporter)
+
+    def test_verification_queues_officer_email(self, complaint, settings):
+        from django.core import mail
+        from complaints.models import OutboundEmail
+        from complaints.outbox import dispatch_due
+
+        settings.EMAIL_OVERRIDE_ADDRESS = None
+        settings.OFFICER_EMAIL_DIGEST = False
+        voter = User.objects.create_user(username="voter", password="pw")
+        Verification.objects.create(complaint=complaint, user=voter)
+
+        # Nothing is sent during the request, the email waits in the outbox
+        assert mail.outbox == []
+        email = OutboundEmail.objects.get()
+        assert email.recipients == ["ac.fn@mcgm.gov.in"]
+        assert email.complaint == complaint
+
+        [email] = dispatch_due()
+        assert email.state == OutboundEmail.State.SENT
+        assert mail.outbox[0].to == ["ac.fn@mcgm.gov.in"]
+        assert dispatch_due() == []
+
+    def test_email_is_rolled_back_with_its_change(self, complaint):
+        from django.db import transaction
+        from complaints.models import OutboundEmail, SideEffect
+
+        with pytest.raises(RuntimeError), transaction.atomic():
+            complaint.status = Complaint.Status.RESOLVED
+            complaint.save()
+            # Written with the change, not after it commits: a crash in between can't lose them
+            assert OutboundEmail.objects.count() == 1
+            assert SideEffect.objects.count() == 2
+            raise RuntimeError("resolve failed")
+        assert not OutboundEmail.objects.exists()
+        assert not SideEffect.objects.exists()
+
+    def test_failures_are_retried_with_backoff(self, complaint):
+        from unittest.mock import patch
+        from django.utils import timezone
+        from complaints import outbox
+        from complaints.models import OutboundEmail
+
+        outbox.queue_email("Subject", "Body", ["citizen@example.com"], complaint=complaint)
+        with patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError("SMTP down")):
+            for attempt in range(1, outbox.MAX_ATTEMPTS + 1):
+                [email] = outbox.dispatch_due()
+                assert email.attempts == attempt
+                assert email.last_error == "SMTP down"
+                if attempt < outbox.MAX_ATTEMPTS:
+                    assert email.state == OutboundEmail.State.QUEUED
+                    assert email.run_after > timezone.now()
+                    assert outbox.dispatch_due() == []  # not due yet
+                    OutboundEmail.objects.update(run_after=timezone.now())
+
+        assert email.state == OutboundEmail.State.FAILED
+
+    def test_dispatcher_command(self, complaint):
+        from io import StringIO
+        from django.core import mail
+        from complaints.outbox import queue_email
+
+        queue_email("One", "Body", ["a@example.com"], complaint=complaint)
+        queue_email("Two", "Body", ["b@example.com"])
+        out = StringIO()
+        call_command('send_outbox_emails', '--once', stdout=out)
+        assert [m.subject for m in mail.outbox] == ["One", "Two"]
+        assert "Sent 2 emails" in out.getvalue()
+
+
+@pytest.mark.django_db
+class TestMailSession:
+    @pytest.fixture
+    def smtp(self):
+        from complaints.management.commands.benchmark_smtp import FakeSMTPServer
+
+        servers = []
+
+        def start(**kwargs):
+            server = FakeSMTPServer(**kwargs)
+            servers.append(server)
+            return server
+        yield start
+        for server in servers:
+            server.stop()
+
+    def send(self, count, max_messages=50):
+        from complaints import mailer
+
+        with mailer.batch(max_messages=max_messages) as session:
+            for i in range(count):
+                mailer.send_mail(f"Subject {i}", "Body", "from@example.com", ["to@example.com"])
+        return session
+
+    def test_messages_share_a_session_up_to_the_cap(self, smtp):
+        server = smtp()
+        with server.email_settings():
+            session = self.send(7, max_messages=3)
+        assert server.messages == session.sent == 7
+        assert server.connections == server.logins == session.sessions == 3
+
+    def test_reconnects_when_the_server_hangs_up(self, smtp):
+        server = smtp(drop_after=2)
+        with server.email_settings():
+            self.send(5)
+        assert server.messages == 5
+        assert server.connections == 3
+
+    def test_escalation_run_uses_one_session(self, smtp, settings):
+        from datetime import timedelta
+        from io import StringIO
+        from django.utils import timezone
+
+        settings.EMAIL_OVERRIDE_ADDRESS = None
+        ward = Ward.objects.create(name="G/S", full_name="Worli", officer_email="ac.gs@mcgm.gov.in")
+        Complaint.objects.bulk_create([
+            Complaint(title=f"Flooding {i}", description="Flooded road", category="OTHERS", ward=ward, urgency_score=9)
+            for i in range(6)
+        ])
+        Complaint.objects.update(created_at=timezone.now() - timedelta(days=2))
+
+        server = smtp()
+        with server.email_settings():
+            call_command('check_escalation', stdout=StringIO())
+        assert server.messages == 6
+        assert server.connections == 1
+        assert Complaint.objects.filter(status=Complaint.Status.ESCALATED).count() == 6
+
+
+@pytest.mark.django_db
+class TestOfficerDigest:
+    @pytest.fixture
+    def wards(self, settings):
+        settings.EMAIL_OVERRIDE_ADDRESS = None
+        settings.OFFICER_EMAIL_DIGEST = True
+        settings.OFFICER_IMMEDIATE_URGENCY = 8
+        return [
+            Ward.objects.create(name="K/E", full_name="Andheri East", officer_email="ac.ke@mcgm.gov.in"),
+            Ward.objects.create(name="K/W", full_name="Andheri West", officer_email="ac.kw@mcgm.gov.in"),
+        ]
+
+    def verify(self, complaint, username):
+        Verification.objects.create(complaint=complaint, user=User.objects.create_user(username=username, password="pw"))
+
+    def test_low_urgency_waits_for_digest_high_urgency_is_immediate(self, wards, django_assert_num_queries):
+        from complaints.digest import queue_officer_digests
+        from complaints.models import OutboundEmail
+
+        complaints = [
+            Complaint.objects.create(title=f"Issue {i}", description="Broken", category="OTHERS",
+                                     ward=wards[i % 2], urgency_score=urgency)
+            for i, urgency in enumerate([3, 5, 9, 7, 2, 6])
+        ]
+        for i, complaint in enumerate(complaints):
+            self.verify(complaint, f"voter{i}")
+        unverified = Complaint.objects.create(title="Unverified", description="Broken", category="OTHERS", ward=wards[0])
+
+        # Only the urgency 9 complaint went out straight away
+        immediate = OutboundEmail.objects.get()
+        assert immediate.complaint == complaints[2]
+
+        # One query reads every ward's complaints; one email per ward; one UPDATE marks them
+        with django_assert_num_queries(6):  # savepoint, select, 2 outbox inserts, update, release
+            digests, covered = queue_officer_digests()
+        assert (digests, covered) == (2, 5)
+
+        east, west = OutboundEmail.objects.exclude(pk=immediate.pk).order_by('recipients')
+        assert east.recipients == ["ac.ke@mcgm.gov.in"]
+        # Ward K/E got urgencies 3, 2 (the 9 was immediate), sorted most urgent first
+        assert east.body.index(f"#{complaints[0].id} ") < east.body.index(f"#{complaints[4].id} ")
+        assert f"/api/resolve/{complaints[0].id}/{complaints[0].admin_token}/" in east.body
+        assert f"#{complaints[2].id} " not in east.body
+        assert f"#{unverified.id} " not in east.body
+        # K/W: 7, 6, 5
+        assert [west.body.index(f"#{complaints[i].id} ") for i in (3, 5, 1)] == sorted(
+            west.body.index(f"#{complaints[i].id} ") for i in (3, 5, 1))
+
+        # Nothing is reported twice
+        assert queue_officer_digests() == (0, 0)
+
+    def test_digest_command(self, wards):
+        from io import StringIO
+
+        for i in range(12):
+            complaint = Complaint.objects.create(title=f"Pothole {i}", description="Pothole", category="POTHOLE",
+                                                 ward=wards[0], urgency_score=4)
+            self.verify(complaint, f"voter{i}")
+        out = StringIO()
+        call_command('send_officer_digest', stdout=out)
+        assert "Queued 1 digest emails covering 12 complaints" in out.getvalue()
+
+
+@pytest.mark.django_db
+class TestResolutionSideEffects:
+    @pytest.fixture
+    def complaint(self):
+        ward = Ward.objects.create(name="H/W", full_name="Bandra West", officer_email="ac.hw@mcgm.gov.in")
+        reporter = User.objects.create_user(username="citizen", password="pw")
+        return Complaint.objects.create(title="Streetlight", description="Dark lane", category="STREET_LIGHT",
+                                        ward=ward, reporter=reporter)
+
+    def state(self, complaint):
+        from complaints.models import OutboundEmail, UserProfile
+        return (UserProfile.objects.get(user=complaint.reporter).points,
+                OutboundEmail.objects.filter(subject__contains="Resolved").count())
+
+    def test_only_the_transition_has_side_effects(self, complaint, django_assert_max_num_queries):
+        complaint = Complaint.objects.get(pk=complaint.pk)
+        complaint.status = Complaint.Status.RESOLVED
+        complaint.save()
+        assert self.state(complaint) == (50, 1)
+
+        # confirm_resolution, admin edits...: no points, no email, no ledger lookups
+        complaint = Complaint.objects.get(pk=complaint.pk)
+        complaint.user_confirmed = True
+        with django_assert_max_num_queries(1):
+            complaint.save()
+        complaint.save()
+        assert self.state(complaint) == (50, 1)
+
+    def test_reopened_and_resolved_again_emails_but_pays_once(self, complaint):
+        for status in (Complaint.Status.RESOLVED, Complaint.Status.REOPENED, Complaint.Status.RESOLVED):
+            complaint.status = status
+            complaint.save()
+        assert self.state(complaint) == (50, 2)
+
+    def test_status_loaded_deferred(self, complaint):
+        complaint = Complaint.objects.only('id', 'reporter').get(pk=complaint.pk)
+        complaint.status = Complaint.Status.RESOLVED
+        complaint.save()
+        assert self.state(complaint) == (50, 1)
+
+    def test_stale_copies_cannot_repeat_effects(self, complaint):
+        # Two requests (e.g. a double-clicked magic link) loaded the complaint before either saved
+        first, second = Complaint.objects.get(pk=complaint.pk), Complaint.objects.get(pk=complaint.pk)
+        for copy in (first, second):
+            copy.status = Complaint.Status.RESOLVED
+            copy.save()
+        assert self.state(complaint) == (50, 1)
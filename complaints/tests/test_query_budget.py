@@ -0,0 +1,151 @@
+import pytest
+from contextlib import contextmanager
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APIClient
+from complaints.models import Complaint, ComplaintImage, UserProfile, Verification, Ward
+
+# Generous enough for a slow CI box, tight enough to catch a query per row
+MAX_SQL_MS = 250
+
+TRANSACTION_CONTROL = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+
+
+@contextmanager
+def query_budget(max_queries, max_ms=MAX_SQL_MS):
+    """
+    Fails if the block runs more than `max_queries` SQL statements or spends
+    more than `max_ms` in the database, listing the slowest statements.
+    Savepoints are not counted (same as benchmark_signal_queries): they are
+    transaction control, BEGIN/COMMIT once the request really commits.
+    """
+    with CaptureQueriesContext(connection) as ctx:
+        yield ctx
+
+    queries = [q for q in ctx.captured_queries if not q['sql'].startswith(TRANSACTION_CONTROL)]
+    total_ms = sum(float(q['time']) for q in queries) * 1000
+    if len(queries) > max_queries or total_ms > max_ms:
+        slowest = sorted(queries, key=lambda q: float(q['time']), reverse=True)[:5]
+        report = "\n".join(f"  {float(q['time']) * 1000:7.2f}ms  {q['sql'][:300]}" for q in slowest)
+        pytest.fail(
+            f"Query budget exceeded: {len(queries)} queries (max {max_queries}), "
+            f"{total_ms:.1f}ms SQL (max {max_ms}ms). Slowest statements:\n{report}"
+        )
+
+
+@pytest.mark.django_db
+class TestQueryBudget:
+    @pytest.fixture(autouse=True)
+    def seed(self):
+        """40 complaints over 4 wards, 3 images each and up to 20 upvotes each."""
+        cache.clear()
+        wards = [
+            Ward.objects.create(name=f"W{i}", full_name=f"Ward {i}", officer_email=f"ward{i}@mcgm.gov.in")
+            for i in range(4)
+        ]
+        # bulk_create: no password hashing, profiles created explicitly below
+        self.users = User.objects.bulk_create([User(username=f"citizen{i}") for i in range(25)])
+        UserProfile.objects.bulk_create([UserProfile(user=user) for user in self.users])
+        self.reporter = self.users[0]
+        self.voter = self.users[-1]
+
+        complaints = Complaint.objects.bulk_create([
+            Complaint(
+                title=f"Complaint {i}", description="Seeded for query budgets " * 10,
+                category=Complaint.Category.POTHOLE, ward=wards[i % 4],
+                reporter=self.users[i % 5], latitude=19.0 + i / 1000, longitude=72.85,
+                urgency_score=i % 10, verification_count=min(i, 20),
+            )
+            for i in range(40)
+        ])
+        ComplaintImage.objects.bulk_create([
+            ComplaintImage(complaint=c, image=f"complaints/seed_{c.id}_{n}.jpg")
+            for c in complaints for n in range(3)
+        ])
+        Verification.objects.bulk_create([
+            Verification(complaint=c, user=self.users[1 + n])
+            for c in complaints for n in range(min(c.verification_count, 20))
+        ])
+        self.complaint = complaints[0]
+
+    @pytest.fixture
+    def client(self):
+        client = APIClient()
+        client.force_authenticate(user=self.voter)
+        return client
+
+    def test_complaint_list(self, client):
+        with query_budget(3):  # count, page, images prefetch
+            response = client.get('/api/complaints/')
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.data['results']) == 10
+
+    def test_complaint_list_compact(self, client):
+        with query_budget(2):  # count, page
+            response = client.get('/api/complaints/?view=compact')
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_complaint_list_cursor(self, client):
+        with query_budget(2):  # page, images prefetch (no count)
+            response = client.get('/api/complaints/?pagination=cursor')
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_complaint_detail(self, client):
+        with query_budget(2):  # complaint, images
+            response = client.get(f'/api/complaints/{self.complaint.id}/')
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_geojson(self, client):
+        with query_budget(1):
+            response = client.get('/api/complaints/geojson/')
+        assert response.status_code == status.HTTP_200_OK
+
+        with query_budget(0):  # served from the cached snapshot
+            client.get('/api/complaints/geojson/')
+
+    def test_my_complaints(self):
+        client = APIClient()
+        client.force_authenticate(user=self.reporter)
+        with query_budget(3):  # count, page, images prefetch
+            response = client.get('/api/complaints/my_complaints/')
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['count'] == 8
+
+    def test_verify(self, client):
+        complaint = Complaint.objects.filter(verification_count=0).first()
+        # complaint, already-verified check, insert, counter bump, counter read,
+        # voter's points (one UPDATE)
+        with query_budget(6):
+            response = client.post(f'/api/complaints/{complaint.id}/verify/')
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['total_verifications'] == 1
+
+    def test_resolve(self, client):
+        complaint = Complaint.objects.exclude(status=Complaint.Status.RESOLVED).first()
+        # complaint, update, resolution number, 2 ledger claims, reporter's points,
+        # reporter + ward in one query, email into the outbox
+        with query_budget(8):
+            response = client.get(f'/api/resolve/{complaint.id}/{complaint.admin_token}/')
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_wards_list(self, client):
+        with query_budget(1):
+            response = client.get('/api/wards/')
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_leaderboard(self, client):
+        for user in self.users:
+            UserProfile.objects.filter(user=user).update(points=user.id * 10)
+        with query_budget(1):
+            response = client.get('/api/leaderboard/')
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.data) == 10
+
+    def test_my_profile(self, client):
+        with query_budget(1):
+            response = client.get('/api/leaderboard/my_profile/')
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['username'] == self.voter.username
@@ -0,0 +1,94 @@
+import re
+import pytest
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.db import connection
+from django.utils import timezone
+from complaints.filters import ComplaintFilter
+from complaints.management.commands.check_escalation import Command as CheckEscalationCommand
+from complaints.models import Complaint, Ward
+
+TABLE = Complaint._meta.db_table
+
+
+def assert_no_full_scan(queryset):
+    """
+    Fail if the plan for `queryset` reads the whole complaints table.
+
+    On PostgreSQL sequential scans are disabled for the transaction first, so a
+    Seq Scan in the plan means no usable index exists (not just that the
+    planner preferred one on a small test table).
+    """
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+        plan = queryset.explain()
+        full_scan = f"Seq Scan on {TABLE}" in plan
+    else:
+        plan = queryset.explain()
+        # SQLite reports "SCAN <table>" for a full table scan and
+        # "SEARCH <table> USING INDEX ..." / "SCAN <table> USING INDEX ..." otherwise
+        full_scan = re.search(rf"SCAN {TABLE}\s*$", plan, re.MULTILINE) is not None
+    assert not full_scan, f"Full scan of {TABLE}:\n{plan}"
+
+
+@pytest.mark.django_db
+class TestComplaintQueryPlans:
+    @pytest.fixture
+    def reporter(self):
+        return User.objects.create_user(username="planner", password="123")
+
+    @pytest.fixture(autouse=True)
+    def seed(self, reporter):
+        wards = [
+            Ward.objects.create(name=f"W{i}", full_name=f"Ward {i}", officer_email=f"ward{i}@mcgm.gov.in")
+            for i in range(5)
+        ]
+        categories = [c for c, _ in Complaint.Category.choices]
+        statuses = [s for s, _ in Complaint.Status.choices]
+        Complaint.objects.bulk_create([
+            Complaint(
+                title=f"Seeded {i}",
+                description="Seeded for plan checks",
+                category=categories[i % len(categories)],
+                status=statuses[i % len(statuses)],
+                ward=wards[i % len(wards)],
+                reporter=reporter if i % 7 == 0 else None,
+                urgency_score=i % 11,
+                escalation_level=i % 3,
+                latitude=18.9,
+                longitude=72.8,
+            )
+            for i in range(500)
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def test_escalation_candidates(self):
+        assert_no_full_scan(CheckEscalationCommand().get_candidates())
+
+    def test_my_complaints(self, reporter):
+        queryset = Complaint.objects.filter(reporter=reporter).order_by('-created_at', '-id')
+        assert_no_full_scan(queryset)
+
+    @pytest.mark.parametrize("params", [
+        {'category': 'pothole'},
+        {'status': 'resolved'},
+        {'category': 'Garbage', 'status': 'new'},
+    ])
+    def test_complaint_filter(self, params):
+        queryset = ComplaintFilter(params, queryset=Complaint.objects.order_by('-created_at', '-id')).qs
+        assert_no_full_scan(queryset)
+
+    def test_complaint_filter_is_case_insensitive(self):
+        upper = ComplaintFilter({'category': 'POTHOLE'}, queryset=Complaint.objects.all()).qs
+        lower = ComplaintFilter({'category': 'pothole'}, queryset=Complaint.objects.all()).qs
+        assert upper.count() == lower.count() > 0
+
+    def test_escalation_candidates_still_correct(self):
+        old = timezone.now() - timedelta(days=2)
+        Complaint.objects.update(created_at=old)
+        expected = Complaint.objects.filter(
+            urgency_score__gte=8, escalation_level=0
+        ).exclude(status__in=[Complaint.Status.RESOLVED, Complaint.Status.REOPENED, Complaint.Status.PENDING])
+        assert set(CheckEscalationCommand().get_candidates()) == set(expected)
@@ -4,6 +4,7 @@ from rest_framework import status
 from django.contrib.auth import get_user_model
 from complaints.models import Complaint, Ward, Verification
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import cache
 
 User = get_user_model()
 
@@ -11,6 +12,8 @@ User = get_user_model()
 class TestComplaintViews:
     @pytest.fixture
     def api_client(self):
+        # Throttle history lives in the cache; start each test with a clean slate
+        cache.clear()
         return APIClient()
 
     @pytest.fixture
@@ -143,3 +146,387 @@ class TestComplaintViews:
         response = api_client.delete(f'/api/complaints/{complaint.id}/')
         assert response.status_code == status.HTTP_400_BAD_REQUEST # Or 403 depending on implementation
         assert Complaint.objects.count() == 1
+
+    def test_list_annotates_verifications(self, api_client, user, complaint, django_assert_max_num_queries):
+        """Test that upvote count and is_verified come from the queryset, not per-row queries."""
+        voters = [User.objects.create_user(username=f"voter{i}", password="123") for i in range(5)]
+        for voter in voters:
+            Verification.objects.create(complaint=complaint, user=voter)
+
+        api_client.force_authenticate(user=voters[0])
+        with django_assert_max_num_queries(4):
+            response = api_client.get('/api/complaints/')
+
+        assert response.status_code == status.HTTP_200_OK
+        result = response.data['results'][0]
+        assert result['verification_count'] == 5
+        assert result['is_verified'] is True
+
+    def test_list_cursor_pagination(self, api_client, user, ward):
+        """Test that ?pagination=cursor walks the feed with opaque cursors and no count."""
+        for i in range(15):
+            Complaint.objects.create(
+                title=f"Issue {i}", description="Fix this", category="GARBAGE",
+                ward=ward, latitude=18.9, longitude=72.8, reporter=user
+            )
+
+        response = api_client.get('/api/complaints/?pagination=cursor')
+        assert response.status_code == status.HTTP_200_OK
+        assert 'count' not in response.data
+        assert len(response.data['results']) == 10
+        assert response.data['results'][0]['title'] == "Issue 14"
+
+        response = api_client.get(response.data['next'])
+        assert len(response.data['results']) == 5
+        assert response.data['results'][-1]['title'] == "Issue 0"
+        assert response.data['next'] is None
+
+    def test_search_ranks_by_relevance(self, api_client, user, ward):
+        """Test that ?search= uses the full-text index and puts title matches first."""
+        from django.db import connection
+        from complaints.search import install_search_index
+        install_search_index(connection)
+
+        Complaint.objects.create(
+            title="Streetlight broken", description="Dark lane, also a small pothole nearby",
+            category="LIGHTING", ward=ward, latitude=18.9, longitude=72.8, reporter=user
+        )
+        Complaint.objects.create(
+            title="Huge pothole", description="Pothole near the station",
+            category="POTHOLE", ward=ward, latitude=18.9, longitude=72.8, reporter=user
+        )
+        Complaint.objects.create(
+            title="Garbage pile", description="Not cleared for a week",
+            category="GARBAGE", ward=ward, latitude=18.9, longitude=72.8, reporter=user
+        )
+
+        response = api_client.get('/api/complaints/?search=pothol')
+        assert response.status_code == status.HTTP_200_OK
+        titles = [c['title'] for c in response.data['results']]
+        assert titles == ["Huge pothole", "Streetlight broken"]
+
+        # Ward names are searchable too, and triggers keep the index in sync
+        ward.full_name = "Cuffe Parade"
+        ward.save()
+        response = api_client.get('/api/complaints/?search=cuffe')
+        assert response.data['count'] == 3
+
+    def test_geojson_streams_filtered_features(self, api_client, user, ward):
+        """Test that geojson streams a FeatureCollection and honours bbox/category/status."""
+        import json
+        Complaint.objects.create(
+            title="Colaba pothole", description="Fix this", category="POTHOLE",
+            ward=ward, latitude=18.91, longitude=72.81, reporter=user
+        )
+        Complaint.objects.create(
+            title="Andheri garbage", description="Fix this", category="GARBAGE",
+            ward=ward, latitude=19.12, longitude=72.85, reporter=user
+        )
+        Complaint.objects.create(
+            title="No location", description="Fix this", category="POTHOLE", reporter=user
+        )
+
+        response = api_client.get('/api/complaints/geojson/?since=2000-01-01')
+        assert response.status_code == status.HTTP_200_OK
+        assert response.streaming
+        data = json.loads(b''.join(response.streaming_content))
+        assert data['type'] == "FeatureCollection"
+        assert len(data['features']) == 2
+
+        response = api_client.get('/api/complaints/geojson/?bbox=72.7,18.8,72.9,19.0&category=pothole')
+        data = json.loads(b''.join(response.streaming_content))
+        assert [f['properties']['title'] for f in data['features']] == ["Colaba pothole"]
+        assert data['features'][0]['geometry']['coordinates'] == [72.81, 18.91]
+
+        response = api_client.get('/api/complaints/geojson/?status=resolved')
+        assert json.loads(b''.join(response.streaming_content))['features'] == []
+
+        response = api_client.get('/api/complaints/geojson/?bbox=nonsense')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+        response = api_client.get('/api/complaints/geojson/?urgency_min=abc')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'urgency_min' in response.data
+
+    def test_map_tiles_cluster_then_points(self, api_client, user, ward, django_capture_on_commit_callbacks):
+        """Test that tiles aggregate at low zoom, return points at high zoom and refresh on change."""
+        import math
+
+        def tile_for(lat, lng, z):
+            n = 2 ** z
+            rad = math.radians(lat)
+            return int((lng + 180) / 360 * n), int((1 - math.asinh(math.tan(rad)) / math.pi) / 2 * n)
+
+        for category in ["POTHOLE", "POTHOLE", "GARBAGE"]:
+            Complaint.objects.create(
+                title=f"{category} at Dadar", description="Fix this", category=category,
+                ward=ward, latitude=19.0178, longitude=72.8478, reporter=user
+            )
+
+        x, y = tile_for(19.0178, 72.8478, 10)
+        response = api_client.get(f'/api/complaints/tiles/10/{x}/{y}/')
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['points'] == []
+        [cluster] = response.data['clusters']
+        assert cluster['count'] == 3
+        assert cluster['categories'] == {"POTHOLE": 2, "GARBAGE": 1}
+        assert cluster['statuses'] == {"NEW": 3}
+        assert cluster['lat'] == pytest.approx(19.0178)
+
+        # Cached tile is refreshed when a complaint is saved (once the save commits)
+        with django_capture_on_commit_callbacks(execute=True):
+            Complaint.objects.create(
+                title="Drain at Dadar", description="Fix this", category="DRAINAGE",
+                ward=ward, latitude=19.0179, longitude=72.8479, reporter=user
+            )
+        response = api_client.get(f'/api/complaints/tiles/10/{x}/{y}/')
+        assert response.data['clusters'][0]['count'] == 4
+
+        # High-zoom points are served by the tile holding the center of their cell
+        from complaints.geo import dense_tile_precision, encode_geohash, geohash_center
+        lng, lat = geohash_center(encode_geohash(19.0178, 72.8478, dense_tile_precision(17)))
+        x, y = tile_for(lat, lng, 17)
+        response = api_client.get(f'/api/complaints/tiles/17/{x}/{y}/')
+        assert response.data['clusters'] == []
+        assert len(response.data['points']) == 4
+        assert response.data['points'][0]['properties']['ward_name'] == "A"
+
+        response = api_client.get('/api/complaints/tiles/3/8/0/')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_dense_high_zoom_tile_has_few_clusters(self, api_client, user, ward):
+        """Test that a high-zoom tile with too many points to list is clustered coarsely."""
+        from complaints.geo import MAX_TILE_POINTS, encode_geohash, tile_bounds
+
+        z, x, y = 16, 46029, 29240  # Dadar, ~600m across
+        min_lng, min_lat, max_lng, max_lat = tile_bounds(z, x, y)
+        # 27 x 27 complaints ~20m apart: each one in its own 5m geohash cell
+        grid = [(min_lat + (max_lat - min_lat) * (i + 0.5) / 27, min_lng + (max_lng - min_lng) * (j + 0.5) / 27)
+                for i in range(27) for j in range(27)]
+        Complaint.objects.bulk_create([
+            Complaint(title="Pothole", description="Fix this", category="POTHOLE", ward=ward, reporter=user,
+                      latitude=lat, longitude=lng, geohash=encode_geohash(lat, lng))
+            for lat, lng in grid
+        ])
+        assert len(grid) > MAX_TILE_POINTS
+
+        response = api_client.get(f'/api/complaints/tiles/{z}/{x}/{y}/')
+        assert response.data['points'] == []
+        assert len(response.data['clusters']) <= 25
+        # Cells centered across an edge belong to the neighbouring (sparse) tiles, which list their points
+        neighbours = [api_client.get(f'/api/complaints/tiles/{z}/{x + dx}/{y + dy}/').data
+                      for dx in (-1, 0, 1) for dy in (-1, 0, 1) if dx or dy]
+        assert all(tile['clusters'] == [] for tile in neighbours)
+        shown = sum(cluster['count'] for cluster in response.data['clusters']) + sum(len(tile['points']) for tile in neighbours)
+        assert shown == len(grid)
+
+    def test_cell_on_a_tile_edge_is_in_one_tile(self, api_client, user, ward):
+        """Test that a geohash cell straddling two tiles is returned, whole, by exactly one of them."""
+        from complaints.geo import cluster_precision, encode_geohash, tile_bounds
+
+        z, x, y = 10, 719, 456  # Mumbai
+        edge = tile_bounds(z, x, y)[1]  # between tile y and the tile south of it
+        lng = 72.8478
+        north, south = (edge + 0.002, lng), (edge - 0.002, lng)
+        assert encode_geohash(*north, cluster_precision(z)) == encode_geohash(*south, cluster_precision(z))
+        for lat, lng in [north, north, south]:
+            Complaint.objects.create(
+                title="Pothole", description="Fix this", category="POTHOLE",
+                ward=ward, latitude=lat, longitude=lng, reporter=user
+            )
+
+        tiles = [api_client.get(f'/api/complaints/tiles/{z}/{x}/{row}/').data for row in (y, y + 1)]
+        clusters = [cluster for tile in tiles for cluster in tile['clusters']]
+        [cluster] = clusters
+        assert cluster['count'] == 3
+
+    def test_geojson_snapshot_etag(self, api_client, user, ward, django_assert_num_queries,
+                                   django_capture_on_commit_callbacks):
+        """Test that repeat map loads hit the cached snapshot and revalidate with 304."""
+        import json
+        Complaint.objects.create(
+            title="Colaba pothole", description="Fix this", category="POTHOLE",
+            ward=ward, latitude=18.91, longitude=72.81, reporter=user
+        )
+
+        response = api_client.get('/api/complaints/geojson/')
+        assert response.status_code == status.HTTP_200_OK
+        etag = response['ETag']
+        assert len(json.loads(response.content)['features']) == 1
+
+        with django_assert_num_queries(0):
+            response = api_client.get('/api/complaints/geojson/', HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+        # A new complaint invalidates the snapshot (once the save commits)
+        with django_capture_on_commit_callbacks(execute=True):
+            Complaint.objects.create(
+                title="Andheri garbage", description="Fix this", category="GARBAGE",
+                ward=ward, latitude=19.12, longitude=72.85, reporter=user
+            )
+        response = api_client.get('/api/complaints/geojson/', HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_200_OK
+        assert response['ETag'] != etag
+        assert len(json.loads(response.content)['features']) == 2
+
+        # So does a delete
+        etag = response['ETag']
+        with django_capture_on_commit_callbacks(execute=True):
+            Complaint.objects.get(title="Andheri garbage").delete()
+        response = api_client.get('/api/complaints/geojson/', HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_200_OK
+        assert len(json.loads(response.content)['features']) == 1
+
+    def test_list_sparse_fieldsets(self, api_client, complaint, django_assert_max_num_queries):
+        """Test ?fields=, ?omit= and the compact list view."""
+        response = api_client.get('/api/complaints/?fields=id,title,ward_name')
+        assert response.status_code == status.HTTP_200_OK
+        assert set(response.data['results'][0]) == {'id', 'title', 'ward_name'}
+        assert response.data['results'][0]['ward_name'] == "A"
+
+        response = api_client.get('/api/complaints/?omit=description,uploaded_images')
+        result = response.data['results'][0]
+        assert 'description' not in result and 'uploaded_images' not in result
+        assert result['reporter_username'] == "testuser"
+
+        # Compact view: no description / nested images, and no images prefetch query
+        with django_assert_max_num_queries(2):
+            response = api_client.get('/api/complaints/?view=compact')
+        result = response.data['results'][0]
+        assert 'description' not in result and 'uploaded_images' not in result
+        assert result['title'] == "Test Pothole"
+
+        response = api_client.get('/api/complaints/?view=compact&fields=id,uploaded_images&pagination=cursor')
+        assert set(response.data['results'][0]) == {'id', 'uploaded_images'}
+
+    def test_create_complaint_async_moderation(self, api_client, user, ward, settings, tmp_path):
+        """With AI_MODERATION_ASYNC the API answers 202 and the worker applies the verdict."""
+        from unittest.mock import patch
+        from django.core.management import call_command
+        from complaints.models import ModerationJob
+
+        settings.AI_MODERATION_ASYNC = True
+        settings.MEDIA_ROOT = str(tmp_path)
+        api_client.force_authenticate(user=user)
+        data = {"title": "Async Issue", "description": "Garbage pile", "category": "GARBAGE", "ward": ward.id}
+
+        with patch('complaints.ai_service.analyze_complaint') as mock_ai:
+            response = api_client.post('/api/complaints/', data, format='multipart')
+            assert response.status_code == status.HTTP_202_ACCEPTED
+            mock_ai.assert_not_called()
+
+        complaint = Complaint.objects.get()
+        assert complaint.status == Complaint.Status.PENDING
+        job_url = f"/api/moderation-jobs/{response.data['moderation_job']}/"
+        # ComplaintForm polls up to 60 times: the 'user' quota (20/day) must not apply
+        for _ in range(60):
+            response = api_client.get(job_url)
+            assert response.status_code == status.HTTP_200_OK
+        assert response.data['state'] == 'QUEUED'
+
+        # Pending complaints are hidden from everyone but their reporter
+        assert api_client.get('/api/complaints/my_complaints/').data['count'] == 1
+        assert APIClient().get('/api/complaints/').data['results'] == []
+
+        with patch('complaints.ai_service.analyze_complaint') as mock_ai:
+            mock_ai.return_value = (True, None, 7, True)
+            call_command('run_moderation_worker', '--once', stdout=open('/dev/null', 'w'))
+
+        complaint.refresh_from_db()
+        assert complaint.status == Complaint.Status.NEW
+        assert complaint.urgency_score == 7
+        job = api_client.get(job_url).data
+        assert job['state'] == 'ACCEPTED'
+        assert job['urgency_score'] == 7
+        assert ModerationJob.objects.get().attempts == 1
+
+    def test_async_moderation_reject_and_retry(self, api_client, user, ward, settings, tmp_path):
+        from unittest.mock import patch
+        from complaints.models import ModerationJob
+        from complaints.moderation import claim_next_job, run_job
+
+        settings.AI_MODERATION_ASYNC = True
+        settings.MEDIA_ROOT = str(tmp_path)
+        api_client.force_authenticate(user=user)
+        data = {"title": "Async Issue", "description": "Nothing here", "category": "GARBAGE", "ward": ward.id}
+        api_client.post('/api/complaints/', data, format='multipart')
+
+        # A provider error puts the job back in the queue with a delay
+        with patch('complaints.ai_service.analyze_complaint', side_effect=RuntimeError("quota")):
+            job = run_job(claim_next_job())
+        assert job.state == ModerationJob.State.QUEUED
+        assert claim_next_job() is None  # not due yet
+
+        ModerationJob.objects.update(run_after=job.created_at)
+        with patch('complaints.ai_service.analyze_complaint') as mock_ai:
+            mock_ai.return_value = (False, "Not a civic issue", 0, False)
+            job = run_job(claim_next_job())
+
+        assert job.state == ModerationJob.State.REJECTED
+        assert job.reason == "Not a civic issue"
+        assert job.attempts == 2
+        assert not Complaint.objects.exists()
+
+    def test_create_complaint_ai_outage_is_not_a_rejection(self, api_client, user, ward):
+        from unittest.mock import patch
+        from complaints.ai_service import SERVICE_UNAVAILABLE
+
+        api_client.force_authenticate(user=user)
+        data = {"title": "Outage", "description": "Garbage pile", "category": "GARBAGE", "ward": ward.id}
+        with patch('complaints.ai_service.analyze_complaint', return_value=(False, SERVICE_UNAVAILABLE, 0, False)):
+            response = api_client.post('/api/complaints/', data, format='multipart')
+
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert not Complaint.objects.exists()
+
+    def test_create_moderates_upload_before_storage(self, api_client, user, ward, settings, tmp_path):
+        """Rejected uploads never reach MEDIA_ROOT; accepted ones are inserted once, with scores."""
+        import os
+        from unittest.mock import patch
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        settings.MEDIA_ROOT = str(tmp_path)
+        api_client.force_authenticate(user=user)
+        gif = (
+            b'\x47\x49\x46\x38\x39\x61\x01\x00\x01\x00\x80\x00\x00\x05\x04\x04'
+            b'\x00\x00\x00\x2c\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02\x44'
+            b'\x01\x00\x3b'
+        )
+
+        def post(verdict):
+            data = {"title": "Upload", "description": "Garbage pile", "category": "GARBAGE", "ward": ward.id,
+                    "image": SimpleUploadedFile("test.gif", gif, content_type="image/gif")}
+            with patch('complaints.ai_service.analyze_complaint', return_value=verdict) as mock_ai, \
+                    CaptureQueriesContext(connection) as queries:
+                response = api_client.post('/api/complaints/', data, format='multipart')
+            # The AI got the upload itself (bytes, nothing was stored yet)
+            assert mock_ai.call_args.args[0] == gif
+            writes = [q['sql'].split()[0] for q in queries.captured_queries
+                      if 'complaints_complaint"' in q['sql'] and not q['sql'].startswith('SELECT')]
+            return response, writes
+
+        response, writes = post((False, "Not a civic issue", 0, False))
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert writes == []
+        assert not Complaint.objects.exists()
+        assert not os.path.exists(tmp_path / 'complaints')
+
+        response, writes = post((True, None, 9, True))
+        assert response.status_code == status.HTTP_201_CREATED
+        assert writes == ['INSERT']
+        complaint = Complaint.objects.get()
+        assert (complaint.urgency_score, complaint.ai_verified_category) == (9, True)
+        assert response.data['urgency_score'] == 9
+        assert os.listdir(tmp_path / 'complaints') == [os.path.basename(complaint.image.name)]
+
+    def test_ai_metrics_endpoint_is_admin_only(self, api_client, user):
+        api_client.force_authenticate(user=user)
+        assert api_client.get('/api/metrics/ai/').status_code == status.HTTP_403_FORBIDDEN
+
+        admin = User.objects.create_user(username="admin", password="password123", is_staff=True)
+        api_client.force_authenticate(user=admin)
+        response = api_client.get('/api/metrics/ai/')
+        assert response.status_code == status.HTTP_200_OK
+        assert {row['provider'] for row in response.data['providers']} >= {'gemini', 'openai', 'grok'}
+        assert 'hit_rate' in response.data['verdict_cache']
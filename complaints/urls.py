@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import ComplaintViewSet, WardViewSet, LeaderboardViewSet
+from .views import ComplaintViewSet, WardViewSet, LeaderboardViewSet, ModerationJobViewSet
 from . import views
 
 # Create a router and register our viewsets with it.
@@ -8,9 +8,11 @@ router = DefaultRouter()
 router.register(r'complaints', ComplaintViewSet)
 router.register(r'wards', WardViewSet)
 router.register(r'leaderboard', LeaderboardViewSet)
+router.register(r'moderation-jobs', ModerationJobViewSet, basename='moderation-job')
 
 # The API URLs are now determined automatically by the router.
 urlpatterns = [
     path('', include(router.urls)),
     path('resolve/<int:pk>/<str:token>/', views.resolve_complaint, name='resolve_complaint'),
+    path('metrics/ai/', views.ai_metrics_view, name='ai_metrics'),
 ]
\ No newline at end of file
@@ -1,8 +1,11 @@
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
+from rest_framework.exceptions import APIException
 from rest_framework.response import Response
+from rest_framework.throttling import ScopedRateThrottle
+from django.db import transaction
 from .models import Complaint, Ward, Verification
-from .serializers import ComplaintSerializer, WardSerializer
+from .serializers import ComplaintSerializer, ComplaintListSerializer, WardSerializer
 class WardViewSet(viewsets.ReadOnlyModelViewSet):
     """
     API endpoint that allows wards to be viewed.
@@ -11,16 +14,22 @@ class WardViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = WardSerializer
     pagination_class = None
 
+class AIServiceUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "AI Service Unavailable. Please try again later."
+
 class ComplaintViewSet(viewsets.ModelViewSet):
     """
     API endpoint that allows complaints to be viewed or edited.
     """
     # OPTIMIZATION:
-    # 1. select_related('ward'): Performs a SQL JOIN to fetch Ward data in the same query.
+    # 1. select_related('ward', 'reporter'): Performs a SQL JOIN to fetch Ward and reporter data in the same query.
     #    Without this, Django would run a separate query for every complaint to get the ward name.
-    # 2. prefetch_related('verifications'): Efficiently fetches the upvotes in a second query.
-    # 3. order_by('-created_at'): Ensures the newest complaints show up first.
-    queryset = Complaint.objects.select_related('ward').prefetch_related('verifications').all().order_by('-created_at')
+    # 2. prefetch_related('images'): Fetches the extra images of the whole page in a second query.
+    # 3. order_by('-created_at', '-id'): Ensures the newest complaints show up first (id breaks ties).
+    # Upvote counts are NOT prefetched (a viral complaint would load thousands of rows),
+    # they are computed in SQL by get_queryset() below.
+    queryset = Complaint.objects.select_related('ward', 'reporter').prefetch_related('images').defer('search_vector').order_by('-created_at', '-id')
     
     serializer_class = ComplaintSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
@@ -29,13 +38,100 @@ class ComplaintViewSet(viewsets.ModelViewSet):
     # which includes both JWTCookieAuthentication (for browser) and JWTAuthentication (for API)
     
     # Add Search and Filter Capability
+    # ComplaintSearchFilter uses the full-text index (tsvector/GIN or SQLite FTS5), ranked by relevance
     from rest_framework import filters
     from django_filters.rest_framework import DjangoFilterBackend
     from .filters import ComplaintFilter
+    from .search import ComplaintSearchFilter
     
-    filter_backends = [filters.SearchFilter, DjangoFilterBackend]
+    filter_backends = [ComplaintSearchFilter, DjangoFilterBackend, filters.OrderingFilter]
     search_fields = ['title', 'description', 'ward__name', 'ward__full_name']
     filterset_class = ComplaintFilter
+    ordering_fields = ['created_at', 'urgency_score', 'verification_count']
+
+    # Rate bucket for the tiles action (a single map view fetches a dozen tiles)
+    throttle_scope = 'map_tiles'
+
+    @property
+    def paginator(self):
+        """
+        Opt-in keyset pagination: `?pagination=cursor` (or following a `cursor`
+        link) switches from numbered pages to ComplaintCursorPagination.
+        """
+        if not hasattr(self, '_paginator'):
+            from .pagination import ComplaintCursorPagination
+
+            params = self.request.query_params
+            if params.get('pagination') == 'cursor' or 'cursor' in params:
+                self._paginator = ComplaintCursorPagination()
+            else:
+                self._paginator = self.pagination_class() if self.pagination_class else None
+        return self._paginator
+
+    def get_serializer_class(self):
+        # `?view=compact` -> lean feed representation (unless specific `?fields=` were asked for)
+        params = self.request.query_params
+        if self.action in ('list', 'my_complaints') and params.get('view') == 'compact' and not params.get('fields'):
+            return ComplaintListSerializer
+        return super().get_serializer_class()
+
+    def get_queryset(self):
+        """
+        Annotates each complaint with whether the current user has upvoted it,
+        so a page costs the same number of queries no matter how many
+        verifications each complaint has. The upvote count itself is the
+        denormalized Complaint.verification_count column.
+
+        For feeds, only the columns/relations the serializer will output are loaded.
+        Complaints still awaiting AI moderation are only visible to their reporter.
+        """
+        from django.db.models import Exists, OuterRef, Q, Value, BooleanField
+
+        queryset = super().get_queryset()
+        user = self.request.user
+        if self.action == 'list' or not user.is_authenticated:
+            queryset = queryset.exclude(status=Complaint.Status.PENDING)
+        elif self.action != 'my_complaints':
+            queryset = queryset.filter(~Q(status=Complaint.Status.PENDING) | Q(reporter=user))
+
+        if self.action in ('list', 'my_complaints'):
+            queryset = self._only_serialized_columns(queryset)
+        elif self.action not in ('retrieve', 'update', 'partial_update'):
+            # verify/confirm_resolution/destroy never render the extra images
+            queryset = queryset.prefetch_related(None)
+
+        if user.is_authenticated:
+            user_verifications = Verification.objects.filter(complaint=OuterRef('pk'), user=user)
+            return queryset.annotate(user_has_verified=Exists(user_verifications))
+        return queryset.annotate(user_has_verified=Value(False, output_field=BooleanField()))
+
+    def _only_serialized_columns(self, queryset):
+        """
+        Restricts the SELECT to what the (possibly trimmed) serializer needs:
+        heavy columns like description are deferred with only(), and the
+        images prefetch is skipped when uploaded_images isn't returned.
+        """
+        from rest_framework.serializers import SerializerMethodField
+
+        # Ordering/cursor columns are read back from the rows, so always load them
+        paths = {'id', *self.ordering_fields}
+        prefetch = False
+        for field in self.get_serializer().fields.values():
+            if field.write_only or field.source == '*' or isinstance(field, SerializerMethodField):
+                continue
+            if field.source == 'images':
+                prefetch = True
+                continue
+            path = field.source.replace('.', '__')
+            paths.add(path)
+            if '__' in path:
+                paths.add(path.split('__')[0])
+
+        relations = [name for name in ('ward', 'reporter') if any(p.startswith(name + '__') for p in paths)]
+        queryset = queryset.select_related(None).select_related(*relations).only(*paths)
+        if not prefetch:
+            queryset = queryset.prefetch_related(None)
+        return queryset
 
     # Custom Action: Verify (Upvote) a Complaint
     # URL will be: POST /api/complaints/{id}/verify/
@@ -55,12 +151,14 @@ class ComplaintViewSet(viewsets.ModelViewSet):
         if Verification.objects.filter(complaint=complaint, user=request.user).exists():
             return Response({'message': 'You have already verified this issue.'}, status=status.HTTP_400_BAD_REQUEST)
         
-        # 3. Add Verification
-        Verification.objects.create(complaint=complaint, user=request.user)
+        # 3. Add Verification (signals bump the counter and refresh it on this same complaint instance)
+        # One transaction, so the points and officer email the signals write commit (or not) with the vote
+        with transaction.atomic():
+            Verification.objects.create(complaint=complaint, user=request.user)
         
         return Response({
             'status': 'verified', 
-            'total_verifications': complaint.verifications.count()
+            'total_verifications': complaint.verification_count
         })
 
     # Custom Action: Get User's Complaints (Dashboard)
@@ -71,8 +169,8 @@ class ComplaintViewSet(viewsets.ModelViewSet):
              return Response({'error': 'Please login to view your dashboard.'}, status=status.HTTP_401_UNAUTHORIZED)
         
         # Filter complaints by the current user
-        # We use self.queryset to keep the select_related/prefetch_related optimizations
-        my_complaints = self.queryset.filter(reporter=request.user)
+        # We use get_queryset() to keep the select_related/annotation optimizations
+        my_complaints = self.get_queryset().filter(reporter=request.user)
         
         # Apply Pagination
         page = self.paginate_queryset(my_complaints)
@@ -84,45 +182,57 @@ class ComplaintViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
     # Custom Action: Get GeoJSON Data for Map
-    # URL: GET /api/complaints/geojson/
+    # URL: GET /api/complaints/geojson/?bbox=minLon,minLat,maxLon,maxLat&category=&status=&since=
     @action(detail=False, methods=['get'])
     def geojson(self, request):
-        # Fetch all complaints (optimize query)
-        # Fetch all complaints (optimize query)
-        complaints = Complaint.objects.select_related('ward').all()
-        
-        features = []
-        for c in complaints:
-            # Skip if coordinates are missing
-            if c.latitude is None or c.longitude is None:
-                continue
-                
-            features.append({
-                "type": "Feature",
-                "geometry": {
-                    "type": "Point",
-                    "coordinates": [c.longitude, c.latitude] # GeoJSON is [lon, lat]
-                },
-                "properties": {
-                    "id": c.id,
-                    "title": c.title,
-                    "category": c.category,
-                    "status": c.status,
-                    "urgency_score": c.urgency_score,
-                    "ward_name": c.ward.name if c.ward else "Unknown",
-                    "image": c.image.url if c.image else None
-                }
-            })
-        
-        data = {
-            "type": "FeatureCollection",
-            "features": features
-        }
-        data = {
-            "type": "FeatureCollection",
-            "features": features
-        }
-        return Response(data)
+        from django.http import HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+        from django.utils.cache import patch_cache_control
+        from django.utils.http import parse_etags
+        from .filters import ComplaintFilter
+        from .geo import FEATURE_COLUMNS, filter_map_queryset, get_geojson_snapshot, iter_feature_collection
+
+        # The plain map view (no filters) is served from a cached snapshot with an ETag.
+        # `no-cache` makes browsers revalidate every time, which then costs a 304 only.
+        if not request.query_params:
+            etag, body = get_geojson_snapshot(Complaint.objects.exclude(status=Complaint.Status.PENDING).filter(latitude__isnull=False, longitude__isnull=False))
+            client_etags = parse_etags(request.headers.get('If-None-Match', ''))
+            if etag in client_etags or '*' in client_etags:
+                response = HttpResponseNotModified()
+            else:
+                response = HttpResponse(body, content_type='application/json')
+            response['ETag'] = etag
+            patch_cache_control(response, no_cache=True)
+            return response
+
+        # Validate the query params before streaming starts (errors must still be a 400)
+        filterset = ComplaintFilter(request.query_params, queryset=Complaint.objects.exclude(status=Complaint.Status.PENDING))
+        if not filterset.is_valid():
+            from rest_framework.exceptions import ValidationError
+            raise ValidationError(filterset.errors)
+        queryset = filterset.qs
+        queryset = filter_map_queryset(queryset, request.query_params)
+
+        # OPTIMIZATION: Only the columns the map needs, as tuples, streamed from a
+        # cursor and encoded chunk by chunk, so memory stays flat as the table grows.
+        rows = queryset.order_by().values_list(*FEATURE_COLUMNS).iterator(chunk_size=2000)
+        return StreamingHttpResponse(iter_feature_collection(rows), content_type='application/json')
+
+    # Custom Action: Clustered Map Tiles
+    # URL: GET /api/complaints/tiles/{z}/{x}/{y}/
+    # Low zoom -> cluster counts per geohash cell (by category and status), high zoom -> points.
+    @action(detail=False, methods=['get'], url_path=r'tiles/(?P<z>\d+)/(?P<x>\d+)/(?P<y>\d+)',
+            throttle_classes=[ScopedRateThrottle])
+    def tiles(self, request, z, x, y):
+        from django.utils.cache import patch_cache_control
+        from .geo import MAX_ZOOM, get_tile
+
+        z, x, y = int(z), int(x), int(y)
+        if z > MAX_ZOOM or x >= 2 ** z or y >= 2 ** z:
+            return Response({'error': 'Tile out of range.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        response = Response(get_tile(Complaint.objects.exclude(status=Complaint.Status.PENDING), z, x, y))
+        patch_cache_control(response, public=True, max_age=60)
+        return response
 
     # Custom Action: User Confirms Resolution
     # URL: POST /api/complaints/{id}/confirm_resolution/
@@ -139,46 +249,47 @@ class ComplaintViewSet(viewsets.ModelViewSet):
         
         return Response({'status': 'confirmed'})
 
+    def create(self, request, *args, **kwargs):
+        from django.conf import settings
+        from .moderation import enqueue
+
+        if not settings.AI_MODERATION_ASYNC:
+            return super().create(request, *args, **kwargs)
+
+        # Async moderation: store the complaint as PENDING, queue the AI check and
+        # answer straight away. The client polls /api/moderation-jobs/{id}/.
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        complaint = serializer.save(
+            reporter=request.user if request.user.is_authenticated else None,
+            status=Complaint.Status.PENDING,
+        )
+        job = enqueue(complaint)
+
+        data = dict(serializer.data)
+        data['moderation_job'] = job.id
+        return Response(data, status=status.HTTP_202_ACCEPTED, headers={'Location': f'/api/moderation-jobs/{job.id}/'})
+
     def perform_create(self, serializer):
-        # Save the complaint first to get the image path
-        complaint = serializer.save(reporter=self.request.user if self.request.user.is_authenticated else None)
-        
         # Trigger AI Analysis (Synchronous for Moderation)
         # We analyze description even if no image is present
-        from .ai_service import analyze_complaint
+        from .moderation import CATEGORY_MISMATCH_REASON, ModerationUnavailable, moderate_upload
         from rest_framework.exceptions import ValidationError
-        import os
-        
-        image_path = complaint.image.path if complaint.image else None
-        
-        # Call AI
-        is_valid, reason, score, verified = analyze_complaint(image_path, complaint.description, complaint.category)
-            
-        if not is_valid:
-            # Delete the invalid complaint and file
-            if complaint.image:
-                image_path = complaint.image.path
-                if os.path.exists(image_path):
-                    os.remove(image_path)
-            
-            complaint.delete()
+
+        # OPTIMIZATION: Moderate the upload before anything is written. Rejected
+        # submissions never touch the database or MEDIA_ROOT, and accepted ones
+        # are inserted once with their scores (no INSERT + UPDATE).
+        try:
+            accepted, reason, fields = moderate_upload(serializer.validated_data)
+        except ModerationUnavailable as e:
+            # Every AI provider is down: not the citizen's fault, so no rejection (503, try again)
+            raise AIServiceUnavailable({"error": str(e)})
+        if not accepted:
+            if reason == CATEGORY_MISMATCH_REASON:
+                raise ValidationError({"error": f"Complaint rejected: {reason}"})
             raise ValidationError({"error": f"Complaint rejected by AI: {reason}"})
-        
-        # NEW: Enforce Category Match
-        if not verified:
-             # Delete the invalid complaint and file
-            if complaint.image:
-                image_path = complaint.image.path
-                if os.path.exists(image_path):
-                    os.remove(image_path)
-            
-            complaint.delete()
-            raise ValidationError({"error": "Complaint rejected: The image/description does not match the selected category."})
-
-        # If valid, update scores
-        complaint.urgency_score = score
-        complaint.ai_verified_category = verified
-        complaint.save()
+
+        serializer.save(reporter=self.request.user if self.request.user.is_authenticated else None, **fields)
 
     def perform_destroy(self, instance):
         # Check ownership
@@ -186,8 +297,8 @@ class ComplaintViewSet(viewsets.ModelViewSet):
             from rest_framework.exceptions import PermissionDenied
             raise PermissionDenied("You can only delete your own complaints.")
 
-        # Allow deletion only if status is NEW
-        if instance.status != Complaint.Status.NEW:
+        # Allow deletion only if status is NEW (or still waiting for moderation)
+        if instance.status not in (Complaint.Status.NEW, Complaint.Status.PENDING):
             from rest_framework.exceptions import ValidationError
             raise ValidationError("You can only delete complaints that are 'New'. Processed complaints cannot be deleted.")
         
@@ -206,17 +317,46 @@ class LeaderboardViewSet(viewsets.ReadOnlyModelViewSet):
     """
     API endpoint for the Leaderboard.
     """
-    queryset = UserProfile.objects.all().order_by('-points')[:10]
+    queryset = UserProfile.objects.select_related('user').order_by('-points')[:10]
     serializer_class = UserProfileSerializer
     permission_classes = [permissions.AllowAny]
     pagination_class = None
 
     @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated])
     def my_profile(self, request):
-        profile, _ = UserProfile.objects.get_or_create(user=request.user)
+        profile, _ = UserProfile.objects.select_related('user').get_or_create(user=request.user)
         serializer = self.get_serializer(profile)
         return Response(serializer.data)
 
+from .models import ModerationJob
+from .serializers import ModerationJobSerializer
+
+class ModerationJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    API endpoint to poll the AI moderation of your own submissions
+    (only used when AI_MODERATION_ASYNC is on).
+    """
+    serializer_class = ModerationJobSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = None
+    # Polled every 2s after a submission: must not spend the 'user' quota
+    throttle_classes = [ScopedRateThrottle]
+    throttle_scope = 'moderation_jobs'
+
+    def get_queryset(self):
+        return ModerationJob.objects.filter(reporter=self.request.user).select_related('complaint').order_by('-created_at')
+
+from rest_framework.decorators import api_view, permission_classes
+
+# AI provider metrics (admins only): per provider call counts, outcomes,
+# latency percentiles/histogram, tokens and image bytes, plus cache and pre-filter hits.
+# URL: GET /api/metrics/ai/
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def ai_metrics_view(request):
+    from .ai_metrics import all_metrics
+    return Response(all_metrics())
+
 from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
 
@@ -228,9 +368,10 @@ def resolve_complaint(request, pk, token):
     if str(complaint.admin_token) != str(token):
         return HttpResponse("Invalid Token", status=403)
     
-    # Mark as Resolved
+    # Mark as Resolved (points and the citizen's email are written in the same transaction)
     complaint.status = Complaint.Status.RESOLVED
-    complaint.save()
+    with transaction.atomic():
+        complaint.save()
     
     # Award Points (Trigger Signal) - This happens automatically via post_save signal
     
@@ -74,7 +74,10 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_THROTTLE_RATES': {
         'anon': '5/hour',
-        'user': '20/day'
+        'user': '20/day',
+        'map_tiles': '2000/hour',
+        # ComplaintForm polls a moderation job up to 60 times; enough for every daily submission ('user')
+        'moderation_jobs': '1200/day',
     }
 }
 
@@ -161,6 +164,35 @@ DATABASES = {
     )
 }
 
+# Caches
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# 'ai_verdicts' holds AI moderation verdicts keyed by content hash (see
+# complaints/ai_service.py). LocMemCache evicts the least recently used entries
+# beyond MAX_ENTRIES; point it at Redis to share verdicts between workers.
+# 'default' holds the map caches and their version stamp (complaints/geo.py).
+# Set REDIS_URL so every web worker and management command shares them;
+# with the per-process LocMemCache a change made elsewhere shows up on the
+# map only when the cached tiles/snapshot expire.
+AI_VERDICT_CACHE_TTL = int(os.getenv('AI_VERDICT_CACHE_TTL', 7 * 24 * 3600))
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'ai_verdicts': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'ai-verdicts',
+        'TIMEOUT': AI_VERDICT_CACHE_TTL,
+        'OPTIONS': {'MAX_ENTRIES': 5000, 'CULL_FREQUENCY': 10},
+    },
+}
+
+if os.getenv('REDIS_URL'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('REDIS_URL'),
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -224,11 +256,21 @@ EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD')
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 
+# Batched senders (outbox dispatcher, escalations) reuse one SMTP login for up
+# to this many messages before reconnecting (see complaints/mailer.py)
+EMAIL_MAX_MESSAGES_PER_SESSION = int(os.getenv('EMAIL_MAX_MESSAGES_PER_SESSION', 50))
+
 # SAFETY CATCH:
 # If this is set, ALL emails (to officials and citizens) will be redirected here.
 # This prevents accidental spamming of real officials during testing.
 EMAIL_OVERRIDE_ADDRESS = os.getenv('EMAIL_OVERRIDE_ADDRESS')
 
+# Ward officers get one daily digest of newly verified complaints
+# (`python manage.py send_officer_digest`, run it from cron) instead of an email
+# per complaint. Complaints at or above this urgency are still emailed at once.
+OFFICER_EMAIL_DIGEST = os.getenv('OFFICER_EMAIL_DIGEST', 'True') == 'True'
+OFFICER_IMMEDIATE_URGENCY = int(os.getenv('OFFICER_IMMEDIATE_URGENCY', 8))
+
 # Senior Officials for Escalation
 SENIOR_OFFICIALS = {
     'MC': 'mc@mcgm.gov.in',               # Municipal Commissioner
@@ -237,3 +279,10 @@ SENIOR_OFFICIALS = {
     'AMC_ES': 'amc.es@mcgm.gov.in',       # Addl. MC (Eastern Suburbs)
     'DMC_ZONE_1': 'dmc.z1@mcgm.gov.in',   # Deputy MC (Zone 1) - Example
 }
+
+# AI Moderation
+# False: new complaints are checked by the AI inside the request (slow, but the
+#        citizen gets the verdict straight away).
+# True:  the complaint is saved as PENDING and the API answers 202 at once;
+#        `python manage.py run_moderation_worker` applies the verdict.
+AI_MODERATION_ASYNC = os.getenv('AI_MODERATION_ASYNC', 'False') == 'True'